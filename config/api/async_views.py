@@ -0,0 +1,117 @@
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.core.exceptions import ObjectDoesNotExist, ValidationError
+from django.http import Http404
+from rest_framework import status
+from rest_framework.response import Response
+from base.mail import asend_order_confirmations
+from .serializers import aprefetch_products, create_orders
+from .values import ValuesSerializer
+from .views import ProductViewSet, OrderCreateView, order_response_data
+
+
+class AsyncAPIViewMixin:
+    '''
+    Runs async handlers of an APIView or a viewset natively under ASGI.
+    Authentication, permission and throttling checks may query the database, they run together
+    in one sync_to_async call before the handler. Requests for sync handlers (e.g. writes of a viewset)
+    are dispatched as a whole by the regular APIView.dispatch in one sync_to_async call.
+    '''
+    @classmethod
+    def as_view(cls, *args, **initkwargs):
+        view = super().as_view(*args, **initkwargs)
+        # Viewset views are plain functions, Django has to know they return coroutines
+        return markcoroutinefunction(view)
+
+
+    def get_handler(self, request):
+        if request.method.lower() in self.http_method_names:
+            return getattr(self, request.method.lower(), self.http_method_not_allowed)
+        return self.http_method_not_allowed
+
+
+    async def dispatch(self, request, *args, **kwargs):
+        if not iscoroutinefunction(self.get_handler(request)):
+            return await sync_to_async(super().dispatch)(request, *args, **kwargs)
+
+        # APIView.dispatch with awaited checks and handler
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+
+        try:
+            await sync_to_async(self.initial)(request, *args, **kwargs)
+            response = await self.get_handler(request)(request, *args, **kwargs)
+        except Exception as exc:
+            response = self.handle_exception(exc)
+
+        self.response = self.finalize_response(request, response, *args, **kwargs)
+        return self.response
+
+
+    async def aget_object(self):
+        '''
+        GenericAPIView.get_object with the async ORM
+        '''
+        # Filters may look up related objects (e.g. category names)
+        queryset = await sync_to_async(self.filter_queryset)(self.get_queryset())
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        try:
+            obj = await queryset.aget(**{self.lookup_field: self.kwargs[lookup_url_kwarg]})
+        except (ObjectDoesNotExist, TypeError, ValueError, ValidationError):
+            raise Http404
+        self.check_object_permissions(self.request, obj)
+        return obj
+
+
+class AsyncProductViewSet(AsyncAPIViewMixin, ProductViewSet):
+    '''
+    ProductViewSet with async list and retrieve, other actions are synchronous
+    '''
+    async def list(self, request, *args, **kwargs):
+        return await self.acached_response(self.alist, request, *args, **kwargs)
+
+
+    async def retrieve(self, request, *args, **kwargs):
+        return await self.acached_response(self.aretrieve, request, *args, **kwargs)
+
+
+    async def alist(self, request, *args, **kwargs):
+        values_serializer = ValuesSerializer(self.get_serializer())
+        queryset = await sync_to_async(self.filter_queryset)(self.get_queryset())
+        queryset = self.values_queryset(values_serializer, queryset)
+
+        page = await self.paginator.apaginate_queryset(queryset, request, view=self)
+        if page is not None:
+            return self.get_paginated_response(values_serializer.serialize(page))
+        return Response(values_serializer.serialize([row async for row in queryset]))
+
+
+    async def aretrieve(self, request, *args, **kwargs):
+        instance = await self.aget_object()
+        return Response(self.get_serializer(instance).data)
+
+
+class AsyncOrderCreateView(AsyncAPIViewMixin, OrderCreateView):
+    '''
+    OrderCreateView with products loaded by the async ORM and the confirmation email awaited
+    '''
+    async def post(self, request, *args, **kwargs):
+        # Products of all lines with one query, validation does not touch the database afterwards
+        context = self.get_serializer_context()
+        lines = request.data.get('products') if isinstance(request.data, dict) else None
+        if isinstance(lines, list):
+            await aprefetch_products(context, [item.get('product') for item in lines if isinstance(item, dict)])
+        else:
+            context['products'] = {}
+
+        serializer = self.get_serializer(data=request.data, context=context)
+        serializer.is_valid(raise_exception=True)
+
+        # transaction.atomic has no async form, the inserts run together in a worker thread
+        orders = await sync_to_async(create_orders)(request.user, [serializer.validated_data])
+        await asend_order_confirmations(orders)
+
+        # Response data
+        return Response(order_response_data(orders[0]), status=status.HTTP_201_CREATED)
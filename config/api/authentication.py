@@ -0,0 +1,63 @@
+import copy
+import hashlib
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.authentication import TokenAuthentication
+from .lru import LRUCache
+
+
+DEFAULTS = {
+    # Entries kept in the in-process cache
+    'MAX_SIZE': 10000,
+    # Seconds after which a token is checked in the database again.
+    # It also bounds how long other processes may accept a revoked token.
+    'TIMEOUT': 60,
+    # Store tokens in Django's cache framework as a second, shared level
+    'USE_DJANGO_CACHE': False,
+}
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'TOKEN_AUTH_CACHE', {})}
+
+
+token_cache = LRUCache(max_size=get_config()['MAX_SIZE'], ttl=get_config()['TIMEOUT'])
+
+
+def token_cache_key(key):
+    # Raw tokens are not used as cache keys
+    return 'auth-token:' + hashlib.sha256(key.encode()).hexdigest()
+
+
+def invalidate_tokens(keys):
+    keys = list(keys)
+    for key in keys:
+        token_cache.delete(key)
+    if get_config()['USE_DJANGO_CACHE']:
+        cache.delete_many([token_cache_key(key) for key in keys])
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    '''
+    Drop-in replacement of TokenAuthentication which caches the token with its user,
+    so warm requests do not query Token and User. See settings.TOKEN_AUTH_CACHE.
+    Entries are invalidated by api.signals when the token is deleted or its user is changed.
+    '''
+    def authenticate_credentials(self, key):
+        config = get_config()
+        token = token_cache.get(key)
+
+        if token is None and config['USE_DJANGO_CACHE']:
+            token = cache.get(token_cache_key(key))
+            if token is not None:
+                token_cache.set(key, token)
+
+        if token is None:
+            # Validates the token and the user (raises AuthenticationFailed)
+            user, token = super().authenticate_credentials(key)
+            token_cache.set(key, token)
+            if config['USE_DJANGO_CACHE']:
+                cache.set(token_cache_key(key), token, config['TIMEOUT'])
+
+        # Every request gets its own user object, so per-request state is never shared
+        return (copy.copy(token.user), token)
@@ -0,0 +1,207 @@
+import csv
+import json
+from itertools import islice
+from django.conf import settings
+from django.db import transaction
+from rest_framework import serializers
+from base.fields import thumbnails_deferred
+from base.models import Product, ProductCategory
+
+
+IMPORT_CHUNK_SIZE = 500
+EXPORT_CHUNK_SIZE = 2000
+# Error report is cut after this many rows, the number of failed rows is always complete
+MAX_REPORTED_ERRORS = 1000
+
+EXPORT_FIELDS = ['id', 'name', 'description', 'price', 'category']
+
+
+class ProductImportSerializer(serializers.Serializer):
+    '''
+    Single imported row - with id the product is updated, without it is created
+    '''
+    id = serializers.IntegerField(required=False, allow_null=True, min_value=1)
+    name = serializers.CharField(max_length=100)
+    description = serializers.CharField()
+    price = serializers.DecimalField(max_digits=10, decimal_places=2)
+    category = serializers.CharField(max_length=100)
+
+
+def decoded_lines(file):
+    '''
+    Lines of an uploaded file decoded one by one, so an invalid line is reported with its row
+    (a leading byte order mark is dropped)
+    '''
+    for number, line in enumerate(file):
+        line = line.decode('utf-8')
+        yield line.removeprefix('\ufeff') if number == 0 else line
+
+
+def unreadable(error):
+    # Row error of a file which cannot be read further
+    if isinstance(error, UnicodeDecodeError):
+        return 'Invalid file encoding, expected UTF-8. Following rows were not read.'
+    return f'Invalid CSV: {error}. Following rows were not read.'
+
+
+def read_csv(file):
+    '''
+    Yield (row number, row, error) of an uploaded CSV file with a header line
+    '''
+    number = 0
+    try:
+        for number, row in enumerate(csv.DictReader(decoded_lines(file)), start=1):
+            # Empty cells of optional columns mean "not set"
+            yield number, {key: value for key, value in row.items() if key is not None and value != ''}, None
+    except (UnicodeDecodeError, csv.Error) as error:
+        yield number + 1, None, unreadable(error)
+
+
+def read_jsonl(file):
+    '''
+    Yield (row number, row, error) of an uploaded JSON Lines file, blank lines are skipped
+    '''
+    number = 0
+    try:
+        for line in decoded_lines(file):
+            if not line.strip():
+                continue
+            number += 1
+            try:
+                row = json.loads(line)
+            except ValueError as error:
+                yield number, None, f'Invalid JSON: {error}'
+                continue
+            if not isinstance(row, dict):
+                yield number, None, 'Expected an object.'
+                continue
+            yield number, row, None
+    except UnicodeDecodeError as error:
+        yield number + 1, None, unreadable(error)
+
+
+def resolve_categories(names):
+    '''
+    Map category names to categories with one query, missing categories are bulk created
+    '''
+    categories = {category.name: category for category in ProductCategory.objects.filter(name__in=names)}
+    missing = set(names) - categories.keys()
+    if missing:
+        # Categories created concurrently are skipped thanks to the unique name
+        ProductCategory.objects.bulk_create(
+            [ProductCategory(name=name) for name in missing], 
+            ignore_conflicts=True
+        )
+        categories.update(
+            (category.name, category) for category in ProductCategory.objects.filter(name__in=missing)
+        )
+    return categories
+
+
+class ImportReport:
+    def __init__(self):
+        self.created = 0
+        self.updated = 0
+        self.failed = 0
+        self.errors = []
+
+
+    def error(self, row, errors):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({'row': row, 'errors': errors})
+
+
+    def as_dict(self):
+        return {
+            'created': self.created,
+            'updated': self.updated,
+            'failed': self.failed,
+            'errors': self.errors,
+        }
+
+
+def import_chunk(rows, report):
+    # Validate rows
+    valid = []
+    for number, row, error in rows:
+        if error is not None:
+            report.error(number, {'non_field_errors': [error]})
+            continue
+        serializer = ProductImportSerializer(data=row)
+        if serializer.is_valid():
+            valid.append((number, serializer.validated_data))
+        else:
+            report.error(number, serializer.errors)
+    if not valid:
+        return
+
+    with transaction.atomic():
+        categories = resolve_categories({data['category'] for _, data in valid})
+        existing = Product.objects.in_bulk([data['id'] for _, data in valid if data.get('id')])
+
+        created, updated = [], []
+        for number, data in valid:
+            data = {**data, 'category': categories[data['category']]}
+            product_id = data.pop('id', None)
+            if product_id is None:
+                # Imported products have the default image, in deferred mode the generate_thumbnails worker
+                # replaces the placeholder thumbnail
+                created.append(Product(
+                    **data, thumbnail=settings.THUMBNAIL_PLACEHOLDER, thumbnail_pending=thumbnails_deferred()
+                ))
+            elif product_id in existing:
+                product = existing[product_id]
+                for field, value in data.items():
+                    setattr(product, field, value)
+                updated.append(product)
+            else:
+                report.error(number, {'id': [f'Invalid pk "{product_id}" - object does not exist.']})
+
+        Product.objects.bulk_create(created)
+        Product.objects.bulk_update(updated, ['name', 'description', 'price', 'category'])
+
+    report.created += len(created)
+    report.updated += len(updated)
+
+
+def import_products(rows, chunk_size=IMPORT_CHUNK_SIZE):
+    '''
+    Create or update products from (row number, row, error) triples of read_csv / read_jsonl.
+    Rows are consumed lazily in chunks, each chunk is validated and written with bulk operations
+    in its own transaction. Returns ImportReport with per-row errors.
+    '''
+    report = ImportReport()
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            return report
+        import_chunk(chunk, report)
+
+
+class Echo:
+    # File-like object returning what is written, so csv.writer can produce lines lazily
+    def write(self, value):
+        return value
+
+
+def export_csv(queryset):
+    writer = csv.writer(Echo())
+    yield writer.writerow(EXPORT_FIELDS)
+    for row in export_rows(queryset):
+        yield writer.writerow(row)
+
+
+def export_jsonl(queryset):
+    for row in export_rows(queryset):
+        yield json.dumps(dict(zip(EXPORT_FIELDS, row)), ensure_ascii=False) + '\n'
+
+
+def export_rows(queryset):
+    '''
+    Stream products as tuples of EXPORT_FIELDS without building model instances
+    '''
+    rows = queryset.values_list('id', 'name', 'description', 'price', 'category__name')
+    for product_id, name, description, price, category in rows.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        yield product_id, name, description, str(price), category
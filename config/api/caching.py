@@ -0,0 +1,179 @@
+import hashlib
+import time
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date, quote_etag, urlencode
+from .lru import LRUCache
+
+
+# Bumped by api.signals whenever a product or category changes
+CATALOG_VERSION_KEY = 'catalog-version'
+# Bumped by api.signals whenever an order is changed outside the API (e.g. in the admin panel)
+STATISTICS_VERSION_KEY = 'statistics-version'
+# Bumped whenever orders are placed through the API
+ORDERS_VERSION_KEY = 'orders-version'
+
+
+def get_version(key):
+    '''
+    Timestamp of the last change - part of the keys of cached data depending on it
+    '''
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, time.time(), None)
+        version = cache.get(key)
+    return version
+
+
+async def aget_version(key):
+    version = await cache.aget(key)
+    if version is None:
+        await cache.aadd(key, time.time(), None)
+        version = await cache.aget(key)
+    return version
+
+
+def bump_version(key):
+    # Old entries are never read again and expire on their own
+    cache.set(key, time.time(), None)
+
+
+def get_catalog_version():
+    return get_version(CATALOG_VERSION_KEY)
+
+
+async def aget_catalog_version():
+    return await aget_version(CATALOG_VERSION_KEY)
+
+
+def bump_catalog_version():
+    bump_version(CATALOG_VERSION_KEY)
+
+
+def get_statistics_version():
+    return get_version(STATISTICS_VERSION_KEY)
+
+
+def bump_statistics_version():
+    bump_version(STATISTICS_VERSION_KEY)
+
+
+def get_orders_version():
+    return get_version(ORDERS_VERSION_KEY)
+
+
+def bump_orders_version():
+    bump_version(ORDERS_VERSION_KEY)
+
+
+class CatalogLRUCache(LRUCache):
+    '''
+    In-process LRUCache of catalog objects, keyed on the catalog version like the cached responses.
+    Changes made by other workers invalidate it as soon as they bump the version in a shared cache.
+    '''
+    def get(self, key, default=None):
+        return super().get((get_catalog_version(), key), default)
+
+
+    def set(self, key, value):
+        super().set((get_catalog_version(), key), value)
+
+
+    def delete(self, key):
+        super().delete((get_catalog_version(), key))
+
+
+class CachedResponseMixin:
+    '''
+    Caches rendered JSON responses of cached_actions per URL (host, path and query string) for
+    settings.RESPONSE_CACHE_TIMEOUT seconds.
+    Entries are keyed on the catalog version, so a product or category change invalidates all of them.
+    Responses carry ETag and Last-Modified headers, conditional requests are answered with 304.
+    '''
+    cached_actions = ('list', 'retrieve')
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(super().list, request, *args, **kwargs)
+
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(super().retrieve, request, *args, **kwargs)
+
+
+    def response_cacheable(self, request):
+        # Browsable API pages differ per user, only JSON is shared
+        return self.action in self.cached_actions and request.accepted_renderer.format == 'json'
+
+
+    def response_cache_key(self, request, version):
+        # Bodies hold absolute next/previous links, responses of other hosts differ
+        query = urlencode(sorted(request.query_params.lists()), doseq=True)
+        url = f'{request.scheme}://{request.get_host()}{request.path}?{query}:{request.accepted_media_type}'
+        return f'response:{version}:' + hashlib.md5(url.encode()).hexdigest()
+
+
+    def cached_response(self, handler, request, *args, **kwargs):
+        if not self.response_cacheable(request):
+            return handler(request, *args, **kwargs)
+
+        version = get_catalog_version()
+        key = self.response_cache_key(request, version)
+        cached = cache.get(key)
+
+        if cached is None:
+            response = self.finalize_response(request, handler(request, *args, **kwargs), *args, **kwargs)
+            if response.status_code != 200:
+                return response
+            cached = self.cache_entry(response, version)
+            cache.set(key, cached, settings.RESPONSE_CACHE_TIMEOUT)
+
+        return self.conditional_response(request, cached)
+
+
+    async def acached_response(self, handler, request, *args, **kwargs):
+        '''
+        cached_response for async views, handler is a coroutine function
+        '''
+        if not self.response_cacheable(request):
+            return await handler(request, *args, **kwargs)
+
+        version = await aget_catalog_version()
+        key = self.response_cache_key(request, version)
+        cached = await cache.aget(key)
+
+        if cached is None:
+            response = self.finalize_response(request, await handler(request, *args, **kwargs), *args, **kwargs)
+            if response.status_code != 200:
+                return response
+            cached = self.cache_entry(response, version)
+            await cache.aset(key, cached, settings.RESPONSE_CACHE_TIMEOUT)
+
+        return self.conditional_response(request, cached)
+
+
+    def cache_entry(self, response, version):
+        response.render()
+        return {
+            'content': response.content,
+            'content_type': response['Content-Type'],
+            'etag': quote_etag(hashlib.md5(response.content).hexdigest()),
+            'last_modified': int(version),
+        }
+
+
+    def conditional_response(self, request, cached):
+        response = HttpResponse(cached['content'], content_type=cached['content_type'])
+        response['ETag'] = cached['etag']
+        response['Last-Modified'] = http_date(cached['last_modified'])
+        # Clients may keep the response but have to revalidate it
+        patch_cache_control(response, no_cache=True)
+        patch_vary_headers(response, ['Accept'])
+
+        return get_conditional_response(
+            request,
+            etag=cached['etag'],
+            last_modified=cached['last_modified'],
+            response=response,
+        )
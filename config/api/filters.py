@@ -0,0 +1,115 @@
+import copy
+import django_filters
+from django import forms
+from rest_framework.filters import BaseFilterBackend, OrderingFilter
+from base.models import Product, ProductCategory
+from base.search import search_products
+from .serializers import category_cache
+
+
+class ProductSearchFilter(BaseFilterBackend):
+    '''
+    Full-text search: ?search=<words>
+    Results are ordered by relevance, unless ordering is requested explicitly.
+    '''
+    search_param = 'search'
+
+    def filter_queryset(self, request, queryset, view):
+        text = request.query_params.get(self.search_param, '').strip()
+        if not text:
+            return queryset
+        ordering_param = getattr(view, 'ordering_param', OrderingFilter.ordering_param)
+        rank = not request.query_params.get(ordering_param)
+        return search_products(queryset, text, rank=rank)
+
+
+class NumberInFilter(django_filters.BaseInFilter, django_filters.NumberFilter):
+    pass
+
+
+class CharInFilter(django_filters.BaseInFilter, django_filters.CharFilter):
+    pass
+
+
+def resolve_category_ids(values):
+    '''
+    Category ids from a list of ids and names. Names are taken from category_cache,
+    the missing ones are loaded with one query on the unique name index.
+    Numeric values match both the category with that id and the one with that name (e.g. "2024").
+    '''
+    ids, names = set(), []
+    for value in values:
+        if value.isdigit():
+            ids.add(int(value))
+        category = category_cache.get(value)
+        if category is not None:
+            ids.add(category.id)
+        else:
+            names.append(value)
+
+    if names:
+        for category in ProductCategory.objects.filter(name__in=names):
+            category_cache.set(category.name, copy.copy(category))
+            ids.add(category.id)
+    return ids
+
+
+def prefix_upper_bound(prefix):
+    # Smallest string greater than all strings starting with prefix
+    last = ord(prefix[-1])
+    if last >= 0x10FFFF:
+        return None
+    return prefix[:-1] + chr(last + 1)
+
+
+class ProductFilterForm(forms.Form):
+    # Multi-value filters are limited, so a request cannot build an unbounded IN (...) list
+    MAX_IN_VALUES = 100
+    in_filters = ['id__in', 'category__in']
+
+    def clean(self):
+        cleaned_data = super().clean()
+        for name in self.in_filters:
+            values = cleaned_data.get(name)
+            if values and len(values) > self.MAX_IN_VALUES:
+                self.add_error(name, f'Ensure this value has at most {self.MAX_IN_VALUES} items.')
+        return cleaned_data
+
+
+class ProductFilter(django_filters.FilterSet):
+    '''
+    Product list filters, each one is answered from an index:
+    - price, price__gte, price__lte - product_price_idx
+    - category, category__in (comma separated ids or names) - category foreign key index
+    - id__in (comma separated) - primary key
+    - name__startswith (case-sensitive) - range condition on product_name_idx
+    '''
+    id__in = NumberInFilter(field_name='id', lookup_expr='in')
+    category__in = CharInFilter(method='filter_categories')
+    name__startswith = django_filters.CharFilter(method='filter_name_prefix')
+
+    class Meta:
+        model = Product
+        form = ProductFilterForm
+        fields = {
+            'name': ['exact'],
+            'category': ['exact'],
+            'description': ['exact'],
+            'price': ['exact', 'gte', 'lte'],
+        }
+
+
+    def filter_categories(self, queryset, name, value):
+        values = [item.strip() for item in value if item.strip()]
+        return queryset.filter(category_id__in=resolve_category_ids(values))
+
+
+    def filter_name_prefix(self, queryset, name, value):
+        # LIKE 'prefix%' is case-insensitive on SQLite and cannot use the index, a range can
+        if not value:
+            return queryset
+        queryset = queryset.filter(name__gte=value)
+        upper_bound = prefix_upper_bound(value)
+        if upper_bound is not None:
+            queryset = queryset.filter(name__lt=upper_bound)
+        return queryset
@@ -0,0 +1,368 @@
+import json
+import platform
+import shutil
+import statistics
+import subprocess
+import tempfile
+import time
+from collections import Counter, namedtuple
+from contextlib import ExitStack, contextmanager
+from datetime import timedelta
+from pathlib import Path
+import django
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction, DEFAULT_DB_ALIAS
+from django.test import Client, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from api import urls as api_urls
+from api.authentication import token_cache
+from api.serializers import category_cache
+from base.models import Product, Order, OrderProducts
+from base import search
+
+
+# name - unique in the results, url_name - pattern of api/urls.py, role - None (anonymous), 'vendor', 'customer' or 'staff'.
+# Writes are rolled back, so every run measures the same dataset. limit caps the requests of slow scenarios.
+Scenario = namedtuple('Scenario', ['name', 'url_name', 'method', 'role', 'args', 'data', 'write', 'limit'])
+
+PERCENTILES = (50, 90, 95, 99)
+
+
+def scenario(name, url_name, method='get', role=None, args=(), data=None, write=False, limit=None):
+    return Scenario(name, url_name, method, role, args, data, write, limit)
+
+
+@contextmanager
+def rolled_back():
+    with transaction.atomic():
+        yield
+        transaction.set_rollback(True)
+
+
+@contextmanager
+def count_queries():
+    # Queries of all connections (e.g. the read replica), without DEBUG query logging
+    counter = Counter()
+
+    def count(execute, sql, params, many, context):
+        counter['queries'] += 1
+        return execute(sql, params, many, context)
+
+    with ExitStack() as stack:
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(count))
+        yield counter
+
+
+def uncovered_endpoints(scenarios):
+    # Names of the patterns of api/urls.py which no scenario requests
+    names = {pattern.name for pattern in api_urls.urlpatterns if pattern.name}
+    return names - {item.url_name for item in scenarios}
+
+
+def reset_caches():
+    cache.clear()
+    token_cache.clear()
+    category_cache.clear()
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure latency percentiles and query counts of every API endpoint in process (no server), '
+        'on the configured database or on several databases of different sizes (--database, see generate_data). '
+        'Results are written as JSON (--output) and can be compared with the results of another commit (--compare).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--database', action='append', dest='databases', default=[],
+            help='SQLite database file to benchmark, repeat it for several data sizes (default: the configured database)'
+        )
+        parser.add_argument('--requests', type=int, default=50, help='Measured requests per endpoint')
+        parser.add_argument('--warmup', type=int, default=3, help='Requests per endpoint before measuring')
+        parser.add_argument(
+            '--cache', choices=['cold', 'warm'], default='cold',
+            help='cold - caches are cleared before every request, warm - cached responses and tokens are reused'
+        )
+        parser.add_argument('--password', default='testing321', help='Password of the vendor account for the token endpoint')
+        parser.add_argument('--only', action='append', default=[], help='Run only scenarios with this name')
+        parser.add_argument('--output', help='Write the results as JSON to this file')
+        parser.add_argument('--compare', help='Results of a previous run (JSON) to compare with')
+        parser.add_argument(
+            '--tolerance', type=float, default=1.25,
+            help='With --compare: fail when p50 latency grows by more than this factor or queries are added'
+        )
+
+    def handle(self, *args, **options):
+        if options['requests'] < 1 or options['warmup'] < 0:
+            raise CommandError('--requests must be positive and --warmup must not be negative')
+        self.options = options
+
+        with tempfile.TemporaryDirectory() as media_root, ExitStack() as stack:
+            # Thumbnails of created products do not end up in the project media, confirmations are not sent
+            default_image = Product._meta.get_field('image').default
+            shutil.copyfile(Path(settings.MEDIA_ROOT) / default_image, Path(media_root) / default_image)
+            stack.enter_context(override_settings(
+                MEDIA_ROOT=media_root,
+                ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver'],
+                EMAIL_BACKEND='django.core.mail.backends.dummy.EmailBackend',
+            ))
+
+            databases = options['databases'] or [None]
+            results = {
+                'commit': self.commit(),
+                'created': timezone.now().isoformat(),
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'settings': {
+                    'DB_PROFILE': settings.DB_PROFILE,
+                    'ASYNC_VIEWS': settings.ASYNC_VIEWS,
+                    'DEBUG': settings.DEBUG,
+                },
+                'options': {name: options[name] for name in ('requests', 'warmup', 'cache')},
+                'databases': [self.benchmark_database(path) for path in databases],
+            }
+
+        if options['output']:
+            with open(options['output'], 'w') as file:
+                json.dump(results, file, indent=2)
+            self.stdout.write(f'Results written to {options["output"]}')
+        if options['compare']:
+            self.compare(results, options['compare'], options['tolerance'])
+
+    def commit(self):
+        try:
+            return subprocess.run(
+                ['git', 'rev-parse', 'HEAD'], cwd=settings.BASE_DIR, capture_output=True, text=True, check=True
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+    @contextmanager
+    def use_database(self, path):
+        if path is None:
+            yield str(connections[DEFAULT_DB_ALIAS].settings_dict['NAME'])
+            return
+        if not Path(path).is_file():
+            raise CommandError(f'Database file does not exist: {path}')
+
+        # Connections are reopened on the other file, the read replica included
+        names = {}
+        for alias in connections:
+            connection = connections[alias]
+            connection.close()
+            names[alias] = connection.settings_dict['NAME']
+            read_only = 'mode=ro' in str(names[alias])
+            connection.settings_dict['NAME'] = f'file:{path}?mode=ro' if read_only else path
+        search._available.clear()
+        try:
+            yield path
+        finally:
+            for alias, name in names.items():
+                connections[alias].close()
+                connections[alias].settings_dict['NAME'] = name
+            search._available.clear()
+            reset_caches()
+
+    def benchmark_database(self, path):
+        with self.use_database(path) as name:
+            reset_caches()
+            sizes = {
+                'products': Product.objects.count(),
+                'orders': Order.objects.count(),
+                'order lines': OrderProducts.objects.count(),
+                'users': User.objects.count(),
+            }
+            self.stdout.write(f'{name}: ' + ', '.join(f'{count} {table}' for table, count in sizes.items()))
+
+            self.prepare()
+            scenarios = self.scenarios()
+            missing = uncovered_endpoints(scenarios)
+            if missing:
+                self.stderr.write(f'Endpoints without a scenario: {", ".join(sorted(missing))}')
+
+            endpoints = []
+            for item in scenarios:
+                if self.options['only'] and item.name not in self.options['only']:
+                    continue
+                endpoints.append(self.run(item))
+                self.report(endpoints[-1])
+            return {'database': name, 'sizes': sizes, 'endpoints': endpoints}
+
+    def prepare(self):
+        # Accounts of every role (their tokens are created when missing), product and time window used by the requests
+        self.users = {
+            'vendor': User.objects.filter(groups__name='Vendors', is_active=True).order_by('id').first(),
+            'customer': User.objects.filter(groups__name='Customers', is_active=True).order_by('id').first(),
+            'staff': User.objects.filter(is_staff=True, is_active=True).order_by('id').first(),
+        }
+        self.tokens = {
+            role: Token.objects.get_or_create(user=user)[0].key
+            for role, user in self.users.items() if user is not None
+        }
+
+        count = Product.objects.count()
+        if not count:
+            raise CommandError('The database has no products, see generate_data')
+        # Products from the middle of the catalog
+        self.product = Product.objects.select_related('category').order_by('id')[count // 2]
+        self.order_products = list(Product.objects.order_by('id').values_list('id', flat=True)[count // 2:count // 2 + 2])
+        self.now = timezone.now()
+
+    def scenarios(self):
+        product, category = self.product, self.product.category
+        order = {
+            'customer_name': 'Benchmark',
+            'delivery_address': '1234 Elm Street',
+            'products': [{'product': product_id, 'quantity': 1} for product_id in self.order_products],
+        }
+        date_format = '%Y-%m-%d %H:%M:%S'
+        past_window = {
+            'start_date': (self.now - timedelta(days=60)).strftime(date_format),
+            'end_date': (self.now - timedelta(days=30)).strftime(date_format),
+            'num_products': 5,
+            'metric': 'revenue',
+        }
+        open_window = {
+            'start_date': (self.now - timedelta(days=30)).strftime(date_format),
+            'end_date': (self.now + timedelta(days=1)).strftime(date_format),
+            'num_products': 5,
+        }
+        csv_file = (
+            'id,name,description,price,category\n'
+            f',Benchmark laptop,Imported product,2999.99,{category.name}\n'
+            f'{product.id},{product.name},Updated description,{product.price},{category.name}\n'
+        )
+        return [
+            scenario('api root', 'api-root'),
+            # Password hashing dominates
+            scenario('token', 'api_token_auth', 'post', data={
+                'username': self.users['vendor'] and self.users['vendor'].username, 'password': self.options['password']
+            }, limit=5),
+            scenario('product list', 'product-list'),
+            scenario('product list filtered', 'product-list', data={'category': category.id, 'ordering': 'price'}),
+            scenario('product list price range', 'product-list', data={'price__gte': '100', 'price__lte': '500', 'ordering': '-price'}),
+            scenario('product list search', 'product-list', data={'search': product.name.split()[0]}),
+            scenario('product list cursor', 'product-list', data={'pagination': 'cursor', 'ordering': 'name', 'page_size': 50}),
+            scenario('product list compact', 'product-list', data={'representation': 'compact', 'page_size': 100}),
+            scenario('product detail', 'product-detail', args=[product.id]),
+            scenario('product create', 'product-list', 'post', 'vendor', data={
+                'name': 'Benchmark laptop', 'description': 'Created product', 'price': '2999.99', 'category': category.name
+            }, write=True),
+            scenario('product update', 'product-detail', 'patch', 'vendor', [product.id], {'price': '1999.99'}, write=True),
+            scenario('product delete', 'product-detail', 'delete', 'vendor', [product.id], write=True),
+            scenario('product import', 'product-import', 'post', 'vendor', data=csv_file, write=True),
+            # Streams the whole category
+            scenario('product export', 'product-export', data={'category': category.id}, limit=5),
+            scenario('order', 'order-product', 'post', 'customer', data=order, write=True),
+            scenario('order batch', 'order-batch', 'post', 'customer', data=[order] * 10, write=True),
+            scenario('statistics past window', 'statistics-most-ordered', role='vendor', data=past_window),
+            scenario('statistics open window', 'statistics-most-ordered', role='vendor', data=open_window),
+            scenario('statistics series', 'statistics-series', role='vendor', data={
+                'start_date': past_window['start_date'], 'end_date': open_window['end_date'], 'bucket': 'day',
+            }),
+            scenario('metrics', 'metrics', role='staff'),
+        ]
+
+    def request(self, client, item):
+        url = reverse(item.url_name, args=item.args)
+        headers = {}
+        if item.role is not None and item.role in self.tokens:
+            headers['Authorization'] = f'Token {self.tokens[item.role]}'
+
+        if item.url_name == 'product-import':
+            upload = SimpleUploadedFile('products.csv', item.data.encode())
+            return client.post(url, {'file': upload}, headers=headers)
+        if item.method == 'get':
+            return client.get(url, item.data, headers=headers)
+        if item.method == 'post' and item.url_name == 'api_token_auth':
+            return client.post(url, item.data, headers=headers)
+        return getattr(client, item.method)(url, json.dumps(item.data), content_type='application/json', headers=headers)
+
+    def send(self, client, item):
+        with ExitStack() as stack:
+            if self.options['cache'] == 'cold':
+                reset_caches()
+            if item.write:
+                stack.enter_context(rolled_back())
+            counter = stack.enter_context(count_queries())
+
+            start = time.perf_counter()
+            response = self.request(client, item)
+            # Streamed responses do their work while they are consumed
+            if response.streaming:
+                b''.join(response.streaming_content)
+            elapsed = time.perf_counter() - start
+        return response.status_code, elapsed, counter['queries']
+
+    def run(self, item):
+        client = Client()
+        requests = min(self.options['requests'], item.limit or self.options['requests'])
+        for _ in range(min(self.options['warmup'], requests)):
+            self.send(client, item)
+
+        latencies, queries, statuses = [], [], Counter()
+        for _ in range(requests):
+            status, elapsed, count = self.send(client, item)
+            latencies.append(elapsed * 1000)
+            queries.append(count)
+            statuses[status] += 1
+
+        quantiles = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else latencies * 99
+        return {
+            'name': item.name,
+            'endpoint': item.url_name,
+            'method': item.method.upper(),
+            'requests': requests,
+            'statuses': {str(status): count for status, count in sorted(statuses.items())},
+            'queries': max(queries),
+            'latency ms': {
+                **{f'p{percentile}': round(quantiles[percentile - 1], 3) for percentile in PERCENTILES},
+                'mean': round(statistics.fmean(latencies), 3),
+                'max': round(max(latencies), 3),
+            },
+        }
+
+    def report(self, result):
+        latency = result['latency ms']
+        statuses = ', '.join(f'{status}: {count}' for status, count in result['statuses'].items())
+        self.stdout.write(
+            f'  {result["name"]:<26} p50 {latency["p50"]:8.2f} ms  p95 {latency["p95"]:8.2f} ms  '
+            f'queries {result["queries"]:3}  ({statuses})'
+        )
+
+    def compare(self, results, path, tolerance):
+        with open(path) as file:
+            baseline = json.load(file)
+        previous = {
+            (Path(database['database']).name, endpoint['name']): endpoint
+            for database in baseline['databases']
+            for endpoint in database['endpoints']
+        }
+
+        self.stdout.write(f'Compared with {path} (commit {baseline.get("commit")}):')
+        regressions = []
+        for database in results['databases']:
+            for endpoint in database['endpoints']:
+                key = (Path(database['database']).name, endpoint['name'])
+                if key not in previous:
+                    continue
+                before = previous[key]
+                ratio = endpoint['latency ms']['p50'] / max(before['latency ms']['p50'], 0.001)
+                added_queries = endpoint['queries'] - before['queries']
+                regressed = ratio > tolerance or added_queries > 0
+                self.stdout.write(
+                    f'  {key[0]} {key[1]:<26} p50 x{ratio:.2f}  queries {added_queries:+d}'
+                    + ('  REGRESSION' if regressed else '')
+                )
+                if regressed:
+                    regressions.append(key)
+
+        if regressions:
+            raise CommandError(f'{len(regressions)} endpoint(s) regressed')
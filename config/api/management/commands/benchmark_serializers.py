@@ -0,0 +1,55 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+from base.models import Product
+from api.serializers import ProductSerializer
+from api.values import ValuesSerializer
+from api.renderers import FastJSONRenderer, orjson
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare ProductSerializer with JSONRenderer against ValuesSerializer with FastJSONRenderer '
+        'on product list pages (query, serialization and rendering)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--page-size', type=int, default=100)
+        parser.add_argument('--repeat', type=int, default=50)
+
+    def handle(self, *args, **options):
+        page_size, repeat = options['page_size'], options['repeat']
+        request = Request(APIRequestFactory().get('/api/product/', SERVER_NAME='localhost'))
+        context = {'request': request}
+        products = Product.objects.select_related('category').order_by('-id')
+        if not products.exists():
+            raise CommandError('No products, create some first (e.g. with the product import endpoint)')
+
+        def model_serializer():
+            page = list(products[:page_size])
+            return JSONRenderer().render(ProductSerializer(page, many=True, context=context).data)
+
+        values_serializer = ValuesSerializer(ProductSerializer(context=context))
+
+        def fast_serializer():
+            page = list(products.values(*values_serializer.lookups)[:page_size])
+            return FastJSONRenderer().render(values_serializer.serialize(page))
+
+        if model_serializer() != fast_serializer():
+            raise CommandError('Serializers output differs')
+
+        baseline = self.measure(model_serializer, repeat)
+        fast = self.measure(fast_serializer, repeat)
+        self.stdout.write(f'ProductSerializer + JSONRenderer: {baseline:.2f} ms per page')
+        self.stdout.write(
+            f'ValuesSerializer + FastJSONRenderer ({"orjson" if orjson else "json"}): {fast:.2f} ms per page'
+        )
+        self.stdout.write(self.style.SUCCESS(f'Speedup: {baseline / fast:.1f}x'))
+
+    def measure(self, render, repeat):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            render()
+        return (time.perf_counter() - start) / repeat * 1000
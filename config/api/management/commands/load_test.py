@@ -0,0 +1,72 @@
+import http.client
+import statistics
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = (
+        'Send concurrent requests to a running server and report requests per second and latency. '
+        'Run it against the same database served under WSGI and under ASGI (ASYNC_VIEWS=TRUE) to compare them.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('urls', nargs='+', help='e.g. http://localhost:8000/api/product/?page_size=20')
+        parser.add_argument('--concurrency', type=int, default=20, help='Number of concurrent clients')
+        parser.add_argument('--requests', type=int, default=1000, help='Number of requests per URL')
+        parser.add_argument('--token', help='Authentication token sent with every request')
+
+    def handle(self, *args, **options):
+        headers = {'Accept': 'application/json'}
+        if options['token']:
+            headers['Authorization'] = f'Token {options["token"]}'
+
+        for url in options['urls']:
+            parts = urlsplit(url)
+            if parts.scheme not in ('http', 'https') or not parts.netloc:
+                raise CommandError(f'Invalid URL: {url}')
+            elapsed, latencies, statuses = self.run(parts, headers, options['requests'], options['concurrency'])
+            self.report(url, elapsed, latencies, statuses)
+
+    def run(self, parts, headers, requests, concurrency):
+        path = parts.path + (f'?{parts.query}' if parts.query else '')
+        connection_class = http.client.HTTPSConnection if parts.scheme == 'https' else http.client.HTTPConnection
+        # One keep-alive connection per client thread
+        local = threading.local()
+        statuses = Counter()
+
+        def request(_):
+            connection = getattr(local, 'connection', None)
+            if connection is None:
+                connection = local.connection = connection_class(parts.netloc, timeout=30)
+            start = time.perf_counter()
+            try:
+                connection.request('GET', path, headers=headers)
+                response = connection.getresponse()
+                response.read()
+                status = response.status
+            except (OSError, http.client.HTTPException) as error:
+                connection.close()
+                local.connection = None
+                status = type(error).__name__
+            statuses[status] += 1
+            return time.perf_counter() - start
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            latencies = list(executor.map(request, range(requests)))
+        return time.perf_counter() - start, latencies, statuses
+
+    def report(self, url, elapsed, latencies, statuses):
+        quantiles = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else latencies * 99
+        self.stdout.write(url)
+        self.stdout.write(f'  requests/s: {len(latencies) / elapsed:.1f}')
+        self.stdout.write(
+            f'  latency ms: p50 {quantiles[49] * 1000:.1f}, p95 {quantiles[94] * 1000:.1f}, '
+            f'p99 {quantiles[98] * 1000:.1f}, max {max(latencies) * 1000:.1f}'
+        )
+        self.stdout.write(f'  responses: {", ".join(f"{status}: {count}" for status, count in sorted(statuses.items(), key=str))}')
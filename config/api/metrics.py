@@ -0,0 +1,172 @@
+import threading
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from time import perf_counter
+
+
+# Metrics of the request being handled, set by api.middleware.PerformanceMiddleware.
+# Context variables follow the request into the sync_to_async threads of async views.
+current_request = ContextVar('current_request_metrics', default=None)
+
+# The slow request log keeps at most this many statements of a request
+MAX_LOGGED_QUERIES = 200
+
+
+class RequestMetrics:
+    __slots__ = ('start', 'queries', 'db_time', 'serialize_time', 'render_start', 'render_time', 'statements')
+
+    def __init__(self, capture_sql=False):
+        self.start = perf_counter()
+        self.queries = 0
+        self.db_time = 0.0
+        self.serialize_time = 0.0
+        self.render_start = None
+        self.render_time = 0.0
+        # (sql, seconds) of the queries, collected only for the slow request log
+        self.statements = [] if capture_sql else None
+
+
+def record_query(execute, sql, params, many, context):
+    '''
+    Database execute wrapper counting and timing the queries of the current request.
+    Installed on every connection by api.signals, queries outside of requests pass straight through.
+    '''
+    metrics = current_request.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+
+    start = perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        duration = perf_counter() - start
+        metrics.queries += 1
+        metrics.db_time += duration
+        if metrics.statements is not None and len(metrics.statements) < MAX_LOGGED_QUERIES:
+            metrics.statements.append((sql, duration))
+
+
+@contextmanager
+def measure_serialization():
+    '''
+    Add the time of the block to the serialization time of the current request.
+    Queries run in the block (e.g. of lazily loaded relations) are left in the database time.
+    '''
+    metrics = current_request.get()
+    if metrics is None:
+        yield
+        return
+
+    start, db_time = perf_counter(), metrics.db_time
+    try:
+        yield
+    finally:
+        metrics.serialize_time += perf_counter() - start - (metrics.db_time - db_time)
+
+
+def escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+class Histogram:
+    '''
+    Prometheus histogram kept in process memory - one series per combination of label values.
+    Observing is a bisect and an increment under a lock.
+    '''
+    def __init__(self, name, documentation, buckets, label_names):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(buckets)
+        self.label_names = tuple(label_names)
+        # label values -> [observations per bucket (+Inf last), sum]
+        self.series = {}
+        self.lock = threading.Lock()
+
+
+    def observe(self, value, *label_values):
+        index = bisect_left(self.buckets, value)
+        with self.lock:
+            series = self.series.get(label_values)
+            if series is None:
+                series = self.series[label_values] = [[0] * (len(self.buckets) + 1), 0]
+            series[0][index] += 1
+            series[1] += value
+
+
+    def clear(self):
+        with self.lock:
+            self.series.clear()
+
+
+    def expose(self):
+        with self.lock:
+            series = [(labels, list(counts), total) for labels, (counts, total) in self.series.items()]
+
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        for label_values, counts, total in sorted(series):
+            labels = ','.join(f'{name}="{escape(value)}"' for name, value in zip(self.label_names, label_values))
+            # Prometheus buckets are cumulative
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f'{self.name}_sum{{{labels}}} {total}')
+            lines.append(f'{self.name}_count{{{labels}}} {cumulative}')
+        return lines
+
+
+LABELS = ('view', 'method', 'status')
+SECONDS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+REQUEST_DURATION = Histogram(
+    'http_request_duration_seconds', 'Wall time of requests.', SECONDS, LABELS
+)
+DB_QUERIES = Histogram(
+    'http_request_db_queries', 'Database queries per request.', (0, 1, 2, 5, 10, 20, 50, 100), LABELS
+)
+DB_DURATION = Histogram(
+    'http_request_db_duration_seconds', 'Time spent in database queries per request.', SECONDS, LABELS
+)
+SERIALIZE_DURATION = Histogram(
+    'http_request_serialization_duration_seconds',
+    'Time spent converting objects to response data (serializers), without its queries.',
+    SECONDS,
+    LABELS
+)
+RENDER_DURATION = Histogram(
+    'http_request_render_duration_seconds', 'Time spent rendering response data to bodies (JSON).', SECONDS, LABELS
+)
+RESPONSE_SIZE = Histogram(
+    'http_response_size_bytes',
+    'Size of response bodies, streamed responses are not observed.',
+    (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304),
+    LABELS
+)
+
+HISTOGRAMS = [REQUEST_DURATION, DB_QUERIES, DB_DURATION, SERIALIZE_DURATION, RENDER_DURATION, RESPONSE_SIZE]
+
+
+def observe_request(labels, duration, metrics, size):
+    REQUEST_DURATION.observe(duration, *labels)
+    DB_QUERIES.observe(metrics.queries, *labels)
+    DB_DURATION.observe(metrics.db_time, *labels)
+    SERIALIZE_DURATION.observe(metrics.serialize_time, *labels)
+    RENDER_DURATION.observe(metrics.render_time, *labels)
+    if size is not None:
+        RESPONSE_SIZE.observe(size, *labels)
+
+
+def clear():
+    for histogram in HISTOGRAMS:
+        histogram.clear()
+
+
+def expose():
+    '''
+    Metrics of this process in the Prometheus text exposition format
+    '''
+    lines = []
+    for histogram in HISTOGRAMS:
+        lines.extend(histogram.expose())
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,104 @@
+import logging
+from time import perf_counter
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from .metrics import RequestMetrics, current_request, observe_request
+
+
+logger = logging.getLogger('api.performance')
+
+
+class PerformanceMiddleware:
+    '''
+    Records wall time, database queries and time, serialization and render time and response size of every request
+    into the histograms of api.metrics, adds a Server-Timing header and logs the SQL of slow requests.
+    Queries are counted by an execute wrapper, so DEBUG query logging is not needed.
+    '''
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.server_timing = getattr(settings, 'PERFORMANCE_SERVER_TIMING', True)
+        self.slow_threshold = getattr(settings, 'SLOW_REQUEST_THRESHOLD', None)
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        metrics = RequestMetrics(capture_sql=self.slow_threshold is not None)
+        token = current_request.set(metrics)
+        try:
+            response = self.get_response(request)
+        finally:
+            current_request.reset(token)
+        return self.finish(request, response, metrics)
+
+
+    async def __acall__(self, request):
+        metrics = RequestMetrics(capture_sql=self.slow_threshold is not None)
+        token = current_request.set(metrics)
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_request.reset(token)
+        return self.finish(request, response, metrics)
+
+
+    def process_template_response(self, request, response):
+        # DRF responses are rendered right after the template response hooks
+        metrics = current_request.get()
+        if metrics is not None:
+            metrics.render_start = perf_counter()
+            response.add_post_render_callback(lambda response: self.rendered(metrics))
+        return response
+
+
+    def rendered(self, metrics):
+        metrics.render_time = perf_counter() - metrics.render_start
+
+
+    def finish(self, request, response, metrics):
+        duration = perf_counter() - metrics.start
+        match = request.resolver_match
+        labels = (match.view_name if match else 'unmatched', request.method, str(response.status_code))
+        size = None if response.streaming else len(response.content)
+        observe_request(labels, duration, metrics, size)
+
+        if self.server_timing:
+            response['Server-Timing'] = server_timing(duration, metrics)
+        if self.slow_threshold is not None and duration >= self.slow_threshold:
+            log_slow_request(request, labels, duration, metrics)
+        return response
+
+
+def server_timing(duration, metrics):
+    # Durations in milliseconds, app is the time spent outside the database, serializers and rendering
+    app = duration - metrics.db_time - metrics.serialize_time - metrics.render_time
+    return ', '.join([
+        f'db;dur={metrics.db_time * 1000:.1f};desc="{metrics.queries} queries"',
+        f'serialize;dur={metrics.serialize_time * 1000:.1f}',
+        f'render;dur={metrics.render_time * 1000:.1f}',
+        f'app;dur={max(app, 0) * 1000:.1f}',
+        f'total;dur={duration * 1000:.1f}',
+    ])
+
+
+def log_slow_request(request, labels, duration, metrics):
+    statements = '\n'.join(f'  {seconds * 1000:.1f} ms  {sql}' for sql, seconds in metrics.statements)
+    logger.warning(
+        'Slow request %s %s (%s, status %s): %.1f ms, %d queries in %.1f ms, serialize %.1f ms, render %.1f ms\n%s',
+        request.method,
+        request.get_full_path(),
+        labels[0],
+        labels[2],
+        duration * 1000,
+        metrics.queries,
+        metrics.db_time * 1000,
+        metrics.serialize_time * 1000,
+        metrics.render_time * 1000,
+        statements,
+    )
@@ -1,8 +1,229 @@
-from rest_framework import pagination
+import base64
+import json
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.core.paginator import InvalidPage
+from django.db.models import Q
+from rest_framework import pagination, filters
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param, remove_query_param
 
 
 class CustomPagination(pagination.PageNumberPagination):
     page_size = 5
     page_size_query_param = 'page_size'
-    max_page_size = 50
-    page_query_param = 'p'
\ No newline at end of file
+    max_page_size = 100
+    page_query_param = 'p'
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        '''
+        paginate_queryset for async views - the count and the page are read with the async ORM
+        '''
+        page_size = self.get_page_size(request)
+        if not page_size:
+            return None
+
+        paginator = self.django_paginator_class(queryset, page_size)
+        # Paginator.count is a cached property, the awaited count takes its place
+        paginator.count = await queryset.acount()
+        page_number = self.get_page_number(request, paginator)
+
+        try:
+            self.page = paginator.page(page_number)
+        except InvalidPage as exc:
+            msg = self.invalid_page_message.format(page_number=page_number, message=str(exc))
+            raise NotFound(msg)
+
+        if paginator.num_pages > 1 and self.template is not None:
+            self.display_page_controls = True
+
+        self.request = request
+        self.page.object_list = [obj async for obj in self.page.object_list]
+        return self.page.object_list
+
+
+class KeysetPagination(pagination.BasePagination):
+    '''
+    Cursor pagination for the view ordering fields with id as a tiebreaker.
+    Pages are read with WHERE (field, id) > (value, last id) instead of OFFSET and no COUNT query,
+    so deep pages cost the same as the first one.
+    Opt-in with ?pagination=cursor, following pages are linked in `next` / `previous`.
+    Search results ranked by relevance have no cursor position, with ?search= an ordering is required.
+    '''
+    page_size = CustomPagination.page_size
+    page_size_query_param = CustomPagination.page_size_query_param
+    max_page_size = CustomPagination.max_page_size
+    cursor_query_param = 'cursor'
+    mode_query_param = 'pagination'
+    search_query_param = 'search'
+    # Ordering field -> model field compared in the cursor condition
+    cursor_fields = {
+        'id': 'id',
+        'name': 'name',
+        'price': 'price',
+        'category': 'category_id',
+    }
+    invalid_cursor_message = 'Invalid cursor'
+    search_ordering_message = 'Cursor pagination of search results requires the ordering parameter.'
+
+    @classmethod
+    def requested(cls, request):
+        params = request.query_params
+        return params.get(cls.mode_query_param) == 'cursor' or cls.cursor_query_param in params
+
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if page_size <= 0:
+            return self.page_size
+        return min(page_size, self.max_page_size)
+
+
+    def get_ordering(self, request, queryset, view):
+        # First ordering term accepted by the OrderingFilter of the view
+        ordering = filters.OrderingFilter().get_ordering(request, queryset, view) or ['-id']
+        term = ordering[0]
+        descending = term.startswith('-')
+        field = self.cursor_fields.get(term.lstrip('-'))
+        if field is None:
+            field, descending = 'id', True
+        return field, descending
+
+
+    def check_search(self, request, view):
+        # Relevance order of ProductSearchFilter is only used without an explicit ordering
+        params = request.query_params
+        ordering_param = getattr(view, 'ordering_param', filters.OrderingFilter.ordering_param)
+        if params.get(self.search_query_param, '').strip() and not params.get(ordering_param):
+            raise ValidationError({ordering_param: [self.search_ordering_message]})
+
+
+    def encode_cursor(self, value, last_id, reverse):
+        data = json.dumps({'v': value, 'id': last_id, 'r': reverse}, separators=(',', ':'))
+        return base64.urlsafe_b64encode(data.encode()).decode()
+
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+        try:
+            data = json.loads(base64.urlsafe_b64decode(encoded.encode()))
+            return data['v'], int(data['id']), bool(data['r'])
+        except (TypeError, ValueError, KeyError):
+            raise NotFound(self.invalid_cursor_message)
+
+
+    def cursor_value(self, queryset, value):
+        # Tampered cursors must not reach the query - the value is converted like a form value of the field
+        if value is None:
+            raise NotFound(self.invalid_cursor_message)
+        try:
+            return queryset.model._meta.get_field(self.field).to_python(value)
+        except (DjangoValidationError, TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+
+
+    def paginate_queryset(self, queryset, request, view=None):
+        return self.set_page(list(self.page_queryset(queryset, request, view)))
+
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        # Async views read the page with the async ORM
+        return self.set_page([obj async for obj in self.page_queryset(queryset, request, view)])
+
+
+    def page_queryset(self, queryset, request, view):
+        self.request = request
+        self.check_search(request, view)
+        self.page_size = self.get_page_size(request)
+        self.field, self.descending = self.get_ordering(request, queryset, view)
+        cursor = self.decode_cursor(request)
+        self.has_cursor = cursor is not None
+        self.reverse = cursor[2] if cursor else False
+
+        # Previous pages are read backwards and flipped afterwards
+        descending = self.descending != self.reverse
+        if cursor is not None:
+            value, last_id, _ = cursor
+            lookup = 'lt' if descending else 'gt'
+            if self.field == 'id':
+                condition = Q(**{f'id__{lookup}': last_id})
+            else:
+                value = self.cursor_value(queryset, value)
+                condition = (
+                    Q(**{f'{self.field}__{lookup}': value})
+                    | Q(**{self.field: value, f'id__{lookup}': last_id})
+                )
+            queryset = queryset.filter(condition)
+
+        prefix = '-' if descending else ''
+        order_by = [prefix + self.field] if self.field == 'id' else [prefix + self.field, prefix + 'id']
+        # One extra row tells whether there is a following page
+        return queryset.order_by(*order_by)[:self.page_size + 1]
+
+
+    def set_page(self, page):
+        has_more = len(page) > self.page_size
+        page = page[:self.page_size]
+
+        if self.reverse:
+            page.reverse()
+            self.has_next, self.has_previous = self.has_cursor, has_more
+        else:
+            self.has_next, self.has_previous = has_more, self.has_cursor
+        self.page = page
+        return page
+
+
+    def position(self, obj):
+        # Pages hold model instances or .values() rows
+        value = obj[self.field] if isinstance(obj, dict) else getattr(obj, self.field)
+        # Decimal prices are kept exact as strings
+        return value if isinstance(value, (int, str)) else str(value)
+
+
+    def get_link(self, obj, reverse):
+        if obj is None:
+            return None
+        url = self.request.build_absolute_uri()
+        last_id = obj['id'] if isinstance(obj, dict) else obj.id
+        cursor = self.encode_cursor(self.position(obj), last_id, reverse)
+        return replace_query_param(url, self.cursor_query_param, cursor)
+
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.get_link(self.page[-1], reverse=False)
+
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return remove_query_param(self.request.build_absolute_uri(), self.cursor_query_param)
+        return self.get_link(self.page[0], reverse=True)
+
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
@@ -1,15 +1,42 @@
+from django.conf import settings
+from django.core.cache import cache
 from rest_framework.permissions import BasePermission, SAFE_METHODS
 
 
+def groups_cache_key(user_id):
+    return f'user-groups:{user_id}'
+
+
+def get_group_names(request):
+    '''
+    Names of the groups of the request user.
+    Resolved once per request and cached across requests for settings.GROUPS_CACHE_TIMEOUT seconds,
+    so warm checks do not hit the database. api.signals clears the cache of changed memberships.
+    '''
+    group_names = getattr(request, '_group_names', None)
+    if group_names is None:
+        user = request.user
+        if not user or not user.is_authenticated:
+            group_names = frozenset()
+        else:
+            key = groups_cache_key(user.pk)
+            group_names = cache.get(key)
+            if group_names is None:
+                group_names = frozenset(user.groups.values_list('name', flat=True))
+                cache.set(key, group_names, settings.GROUPS_CACHE_TIMEOUT)
+        request._group_names = group_names
+    return group_names
+
+
 class IsVendor(BasePermission):
     def has_permission(self, request, view):
-        if request.user.groups.filter(name='Vendors').exists():
+        if 'Vendors' in get_group_names(request):
             return super().has_permission(request, view)
         
 
 class IsCustomer(BasePermission):
     def has_permission(self, request, view):
-        if request.user.groups.filter(name='Customers').exists():
+        if 'Customers' in get_group_names(request):
             return super().has_permission(request, view)
 
 
@@ -0,0 +1,58 @@
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class FastJSONRenderer(JSONRenderer):
+    '''
+    JSONRenderer which encodes compact responses with orjson when it is installed.
+    Output is the same as the stdlib renderer: values orjson does not know (Decimal, datetimes, lazy strings)
+    go through the DRF encoder and data orjson cannot encode falls back to the stdlib renderer.
+    '''
+    def __init__(self):
+        self.encoder = self.encoder_class()
+
+
+    def orjson_supported(self, accepted_media_type, renderer_context):
+        return (
+            orjson is not None 
+            and self.compact 
+            and not self.ensure_ascii 
+            and self.get_indent(accepted_media_type, renderer_context or {}) is None
+        )
+
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None or not self.orjson_supported(accepted_media_type, renderer_context):
+            return super().render(data, accepted_media_type, renderer_context)
+
+        try:
+            ret = orjson.dumps(
+                data, 
+                default=self.encoder.default, 
+                option=orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS,
+            )
+        except orjson.JSONEncodeError:
+            # e.g. integers over 64 bits
+            return super().render(data, accepted_media_type, renderer_context)
+
+        # Same escaping as JSONRenderer - the output stays a strict javascript subset
+        return ret.replace('\u2028'.encode(), b'\\u2028').replace('\u2029'.encode(), b'\\u2029')
+
+
+class PrometheusRenderer(BaseRenderer):
+    '''
+    Renders the text exposition format of api.metrics
+    '''
+    media_type = 'text/plain'
+    format = 'prometheus'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        # Errors (e.g. failed authentication) are rendered as their message
+        if isinstance(data, dict):
+            data = f"{data.get('detail', data)}\n"
+        return data.encode(self.charset)
@@ -1,44 +1,265 @@
+import copy
 from rest_framework import serializers
+from rest_framework.permissions import SAFE_METHODS
+from django.conf import settings
 from django.core.exceptions import ObjectDoesNotExist
+from django.db import transaction
 from django.utils.encoding import smart_text
+from .statistics import (
+    METRIC_CHOICES, 
+    METRIC_FREQUENCY, 
+    BUCKET_CHOICES, 
+    BUCKET_DAY, 
+    GROUP_CHOICES, 
+    GROUP_PRODUCT, 
+    bucket_ranges,
+)
+from .caching import bump_orders_version, CatalogLRUCache
+from .metrics import measure_serialization
 from base.models import (
     Product, 
     ProductCategory,
     Order, 
     OrderProducts,
+    DailyProductSales,
 )
+from base.mail import queue_order_confirmations
+
+
+# name -> ProductCategory of the current catalog version, cleared by api.signals on category changes
+category_cache = CatalogLRUCache(max_size=1000, ttl=settings.CATEGORY_CACHE_TIMEOUT)
 
 
 class CreatableSlugRelatedField(serializers.SlugRelatedField):
+    def __init__(self, cache=None, **kwargs):
+        # Optional LRUCache of already resolved objects
+        self.cache = cache
+        super().__init__(**kwargs)
+
+
     def to_internal_value(self, data):
+        if self.cache is not None and isinstance(data, str):
+            obj = self.cache.get(data)
+            if obj is not None:
+                # Every caller gets its own instance
+                return copy.copy(obj)
+
         try:
-            return self.get_queryset().get_or_create(**{self.slug_field: data})[0]
+            obj = self.get_queryset().get_or_create(**{self.slug_field: data})[0]
         except ObjectDoesNotExist:
             self.fail('does_not_exist', slug_name=self.slug_field, value=smart_text(data))
         except (TypeError, ValueError):
             self.fail('invalid')
 
+        if self.cache is not None and isinstance(data, str):
+            self.cache.set(data, copy.copy(obj))
+        return obj
+
+
+def split_param(value):
+    return {name.strip() for name in (value or '').split(',') if name.strip()}
+
+
+class SparseFieldsMixin:
+    '''
+    Reads return only the requested fields: ?fields=id,name,price or ?omit=description
+    and restrict_queryset() loads only the columns these fields need.
+    '''
+    fields_param = 'fields'
+    omit_param = 'omit'
+    # Serializer field -> model fields it reads, other fields read the model field of the same name
+    field_sources = {}
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        selected = self.selected_fields(self.context.get('request'))
+        for name in set(self.fields) - set(selected):
+            self.fields.pop(name)
+
+
+    @classmethod
+    def selected_fields(cls, request):
+        names = list(cls.Meta.fields)
+        # Writes always use all fields
+        if request is None or request.method not in SAFE_METHODS:
+            return names
+
+        requested = split_param(request.query_params.get(cls.fields_param))
+        omitted = split_param(request.query_params.get(cls.omit_param))
+        unknown = (requested | omitted) - set(names)
+        if unknown:
+            param = cls.fields_param if unknown & requested else cls.omit_param
+            raise serializers.ValidationError(
+                {param: [f'Unknown fields: {", ".join(sorted(unknown))}. Available: {", ".join(names)}.']}
+            )
+        return [name for name in names if (not requested or name in requested) and name not in omitted]
+
+
+    @classmethod
+    def restrict_queryset(cls, queryset, request, extra_fields=()):
+        '''
+        Defer the columns of fields which are not serialized (extra_fields are always loaded)
+        '''
+        model_fields = {'id', *extra_fields}
+        for name in cls.selected_fields(request):
+            model_fields.update(cls.field_sources.get(name, [name]))
+        # Related rows which are not needed are not joined
+        if not any('__' in name for name in model_fields):
+            queryset = queryset.select_related(None)
+        return queryset.only(*model_fields)
+
 
-class ProductSerializer(serializers.ModelSerializer):
+class MeasuredDataMixin:
+    '''
+    Time of building .data is recorded as serialization time of the request (api.metrics)
+    '''
+    @property
+    def data(self):
+        with measure_serialization():
+            return super().data
+
+
+class ProductSerializer(MeasuredDataMixin, SparseFieldsMixin, serializers.ModelSerializer):
     category = CreatableSlugRelatedField(
         slug_field='name',
-        queryset=ProductCategory.objects.all()
+        queryset=ProductCategory.objects.all(),
+        cache=category_cache
     )
+    field_sources = {'category': ['category', 'category__name']}
 
     class Meta:
         model = Product
         fields = ['id', 'name', 'description', 'price', 'category', 'image']
 
 
+class ProductCompactSerializer(MeasuredDataMixin, SparseFieldsMixin, serializers.ModelSerializer):
+    '''
+    Lightweight list representation - no description and the thumbnail instead of the full image
+    '''
+    class Meta:
+        model = Product
+        fields = ['id', 'name', 'price', 'thumbnail']
+        read_only_fields = fields
+
+
+def missing_products(context, product_ids):
+    # Ids which were not looked up yet, invalid ids are left to validation
+    products = context.setdefault('products', {})
+    missing = set()
+    for product_id in product_ids:
+        try:
+            missing.add(int(product_id))
+        except (TypeError, ValueError):
+            continue
+    return missing - products.keys()
+
+
+def store_products(context, missing, found):
+    # Ids which do not exist are remembered too (None), so they are not looked up again
+    products = context['products']
+    products.update(dict.fromkeys(missing))
+    products.update(found)
+    return products
+
+
+def prefetch_products(context, product_ids):
+    '''
+    Load all not yet known products with a single id__in query into context['products']
+    '''
+    missing = missing_products(context, product_ids)
+    if missing:
+        store_products(context, missing, Product.objects.in_bulk(missing))
+    return context['products']
+
+
+async def aprefetch_products(context, product_ids):
+    '''
+    prefetch_products for async views
+    '''
+    missing = missing_products(context, product_ids)
+    if missing:
+        store_products(context, missing, await Product.objects.ain_bulk(missing))
+    return context['products']
+
+
+class PrefetchedPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    def to_internal_value(self, data):
+        # Fall back to a single object lookup when nothing was prefetched
+        products = self.context.get('products')
+        if products is None:
+            return super().to_internal_value(data)
+        try:
+            product = products.get(int(data))
+        except (TypeError, ValueError):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        if product is None:
+            self.fail('does_not_exist', pk_value=data)
+        return product
+
+
+class OrderProductsListSerializer(serializers.ListSerializer):
+    def to_internal_value(self, data):
+        # Resolve every referenced product at once instead of one query per line
+        if isinstance(data, list):
+            prefetch_products(
+                self.context, 
+                [item.get('product') for item in data if isinstance(item, dict)]
+            )
+        return super().to_internal_value(data)
+
+
 class OrderProductsSerializer(serializers.ModelSerializer):
-    product = serializers.PrimaryKeyRelatedField(queryset=Product.objects.all())
+    product = PrefetchedPrimaryKeyRelatedField(queryset=Product.objects.all())
 
     class Meta:
         model = OrderProducts
         fields = ['product', 'quantity']
+        list_serializer_class = OrderProductsListSerializer
+
+
+def create_orders(user, orders_data):
+    '''
+    Insert validated orders of the user with all their lines using bulk operations in one transaction
+    '''
+    orders = []
+    for validated_data in orders_data:
+        # Pop products from validated data
+        validated_data = dict(validated_data)
+        products_data = validated_data.pop('products')
+
+        order = Order(user=user, **validated_data)
+        order.set_dates()
+
+        # Lines keep the current prices of their products
+        lines = [OrderProducts(order=order, **item) for item in products_data]
+        for line in lines:
+            line.set_prices()
+
+        # Same sum as Order.objects.update_totals(), without reading the lines back
+        order.total_price = sum(line.line_total for line in lines)
+        orders.append((order, lines))
+
+    with transaction.atomic():
+        # Create orders without products - type of products is dictonary
+        Order.objects.bulk_create([order for order, _ in orders])
+
+        # Insert all OrderProducts joined with their Order in a single query
+        OrderProducts.objects.bulk_create([line for _, lines in orders for line in lines])
+
+        # Keep the daily statistics rollup up to date
+        DailyProductSales.objects.record_orders(orders)
 
+        # Outbox rows are committed together with their orders (queued email mode)
+        queue_order_confirmations([order for order, _ in orders])
 
-class OrderSerializer(serializers.ModelSerializer):
+    # Cached statistics of periods including the present are stale now
+    if orders:
+        bump_orders_version()
+
+    return [order for order, _ in orders]
+
+
+class OrderSerializer(MeasuredDataMixin, serializers.ModelSerializer):
     products = OrderProductsSerializer(many = True)
 
     class Meta:
@@ -50,29 +271,30 @@ class OrderSerializer(serializers.ModelSerializer):
         # Retrieve the user associated with the authentication token
         user = self.context['request'].user
 
-        # Set the customer field to the authenticated user
-        validated_data['user'] = user
-
-        # Pop products from validated data
-        products_data = validated_data.pop('products')
-
-        # Calculate total price based on products in the order
-        validated_data['total_price'] = sum(item['product'].price * item['quantity'] for item in products_data)
-
         # deserialize data for further processing
         self.data
 
-        # Create order without products - type of products is dictonary
-        order = Order.objects.create(**validated_data)
-
-        # For each item from dictonary of OrderProducts create object (save to db) and join with our Order
-        for item in products_data:
-            OrderProducts.objects.create(order = order, **item)
-
-        return order
+        return create_orders(user, [validated_data])[0]
     
 
 class OrderStatisticsSerializer(serializers.Serializer):
     start_date = serializers.DateTimeField(format="%Y-%m-%d %H:%M:%S")
     end_date = serializers.DateTimeField(format="%Y-%m-%d %H:%M:%S")
-    num_products = serializers.IntegerField()
\ No newline at end of file
+    num_products = serializers.IntegerField(min_value=0)
+    metric = serializers.ChoiceField(choices=METRIC_CHOICES, default=METRIC_FREQUENCY)
+
+
+class OrderStatisticsSeriesSerializer(serializers.Serializer):
+    start_date = serializers.DateTimeField(format="%Y-%m-%d %H:%M:%S")
+    end_date = serializers.DateTimeField(format="%Y-%m-%d %H:%M:%S")
+    bucket = serializers.ChoiceField(choices=BUCKET_CHOICES, default=BUCKET_DAY)
+    group_by = serializers.ChoiceField(choices=GROUP_CHOICES, default=GROUP_PRODUCT)
+
+    def validate(self, data):
+        if data['start_date'] > data['end_date']:
+            raise serializers.ValidationError({'end_date': 'Ensure this value is not before start_date.'})
+        try:
+            bucket_ranges(data['start_date'], data['end_date'], data['bucket'])
+        except ValueError as error:
+            raise serializers.ValidationError({'bucket': str(error)})
+        return data
@@ -0,0 +1,80 @@
+from django.contrib.auth.models import User, Group
+from django.core.cache import cache
+from django.db.backends.signals import connection_created
+from django.db.models.signals import m2m_changed, post_save, pre_delete, post_delete
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+from base.models import Product, ProductCategory, Order, OrderProducts
+from base.thumbnails import thumbnails_saved
+from .authentication import invalidate_tokens
+from .caching import bump_catalog_version, bump_statistics_version
+from .metrics import record_query
+from .serializers import category_cache
+from .permissions import groups_cache_key
+
+
+def clear_group_names(user_ids):
+    cache.delete_many([groups_cache_key(user_id) for user_id in user_ids])
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+def user_groups_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    if not reverse:
+        # user.groups.add(...) - instance is the user
+        clear_group_names([instance.pk])
+    elif pk_set is not None:
+        # group.user_set.add(...) - pk_set holds user ids
+        clear_group_names(pk_set)
+    else:
+        # group.user_set.clear() - members are read before they are removed
+        clear_group_names(instance.user_set.values_list('pk', flat=True))
+
+
+@receiver(post_save, sender=Group)
+@receiver(pre_delete, sender=Group)
+def group_changed(sender, instance, **kwargs):
+    # Renamed or deleted group
+    clear_group_names(instance.user_set.values_list('pk', flat=True))
+
+
+@receiver(post_delete, sender=Token)
+def token_deleted(sender, instance, **kwargs):
+    invalidate_tokens([instance.key])
+
+
+@receiver(post_save, sender=User)
+def user_changed(sender, instance, created, update_fields, **kwargs):
+    # Deactivated user or changed password - last login updates are ignored
+    if created or (update_fields is not None and set(update_fields) == {'last_login'}):
+        return
+    invalidate_tokens(Token.objects.filter(user=instance).values_list('key', flat=True))
+
+
+@receiver([post_save, post_delete], sender=Product)
+@receiver([post_save, post_delete], sender=ProductCategory)
+@receiver(thumbnails_saved)
+def catalog_changed(sender, **kwargs):
+    bump_catalog_version()
+
+
+@receiver([post_save, post_delete], sender=ProductCategory)
+def category_changed(sender, **kwargs):
+    # Renamed or deleted category must not be resolved from the cache any more
+    category_cache.clear()
+
+
+@receiver([post_save, post_delete], sender=Order)
+@receiver([post_save, post_delete], sender=OrderProducts)
+def orders_changed(sender, **kwargs):
+    # Orders edited after the fact may change cached statistics of closed periods.
+    # Orders placed through the API are bulk inserted (no signals) and only affect the current period.
+    bump_statistics_version()
+
+
+@receiver(connection_created)
+def install_query_metrics(sender, connection, **kwargs):
+    # Wrappers stay on the connection object, which reconnects without being recreated
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
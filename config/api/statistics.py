@@ -0,0 +1,301 @@
+import hashlib
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Sum, Q
+from django.db.models.functions import Trunc
+from django.utils import timezone
+from base.models import Product, OrderProducts, DailyProductSales, day_start
+from .caching import get_catalog_version, get_statistics_version, get_orders_version
+
+
+# Aggregate computed per product for each supported metric
+METRIC_FREQUENCY = 'frequency'
+METRIC_QUANTITY = 'quantity'
+METRIC_REVENUE = 'revenue'
+
+METRIC_CHOICES = [
+    (METRIC_FREQUENCY, 'Number of order lines'),
+    (METRIC_QUANTITY, 'Number of ordered items'),
+    (METRIC_REVENUE, 'Total revenue'),
+]
+
+# Key under which the metric value is returned for every product
+METRIC_KEYS = {
+    METRIC_FREQUENCY: 'count',
+    METRIC_QUANTITY: 'quantity',
+    METRIC_REVENUE: 'revenue',
+}
+
+METRIC_TITLES = {
+    METRIC_FREQUENCY: 'Most frequently ordered products',
+    METRIC_QUANTITY: 'Most ordered products',
+    METRIC_REVENUE: 'Highest revenue products',
+}
+
+
+def metric_aggregate(metric):
+    if metric == METRIC_FREQUENCY:
+        return Count('id')
+    if metric == METRIC_QUANTITY:
+        return Sum('quantity')
+    if metric == METRIC_REVENUE:
+        # Lines store their total at the price of the order time
+        return Sum('line_total')
+    raise ValueError(f'Unknown metric: {metric}')
+
+
+def rollup_aggregate(metric):
+    if metric == METRIC_FREQUENCY:
+        return Sum('order_count')
+    if metric == METRIC_QUANTITY:
+        return Sum('quantity')
+    if metric == METRIC_REVENUE:
+        return Sum('revenue')
+    raise ValueError(f'Unknown metric: {metric}')
+
+
+def rollup_days(start_date, end_date):
+    '''
+    Whole days inside [start_date, end_date] that can be answered from the daily rollup.
+    Today is never complete, so it is always read from raw order lines.
+    Returns (first_day, last_day) or None when there is no such day.
+    '''
+    first_day = timezone.localdate(start_date)
+    if start_date > day_start(first_day):
+        first_day += timedelta(days=1)
+
+    # The day before end_date's day ends at a midnight <= end_date
+    last_day = min(timezone.localdate(end_date), timezone.localdate()) - timedelta(days=1)
+
+    if first_day > last_day:
+        return None
+    return first_day, last_day
+
+
+def format_metric(metric, value):
+    if metric == METRIC_REVENUE:
+        return str(Decimal(value).quantize(Decimal('0.01')))
+    return value
+
+
+def grouped(queryset, aggregate):
+    # Products are not joined, names are looked up for the top products only
+    return (
+        queryset
+        .values('product_id')
+        .annotate(value=aggregate)
+        .order_by('-value', 'product_id')
+    )
+
+
+def most_ordered_products(start_date, end_date, num_products, metric=METRIC_FREQUENCY):
+    '''
+    Top products ordered between start_date and end_date.
+    Whole past days are read from the DailyProductSales rollup, partial days at both ends
+    and today from raw order lines. Grouping, sorting and limiting run in the database.
+    '''
+    days = rollup_days(start_date, end_date)
+
+    if days is None:
+        raw_lines = OrderProducts.objects.filter(order__order_date__range=[start_date, end_date])
+        rows = list(grouped(raw_lines, metric_aggregate(metric))[:num_products])
+    else:
+        first_day, last_day = days
+        raw_lines = OrderProducts.objects.filter(
+            Q(order__order_date__gte=start_date, order__order_date__lt=day_start(first_day))
+            | Q(order__order_date__gte=day_start(last_day + timedelta(days=1)), order__order_date__lte=end_date)
+        )
+        rollup = DailyProductSales.objects.filter(date__range=[first_day, last_day])
+
+        # The raw tail covers at most two partial days, so it is cheap to read whole
+        tail = list(grouped(raw_lines, metric_aggregate(metric)))
+        if not tail:
+            rows = list(grouped(rollup, rollup_aggregate(metric))[:num_products])
+        else:
+            totals = {}
+            for row in list(grouped(rollup, rollup_aggregate(metric))) + tail:
+                product = totals.setdefault(row['product_id'], {**row, 'value': 0})
+                product['value'] += row['value']
+            rows = sorted(totals.values(), key=lambda row: (-row['value'], row['product_id']))[:num_products]
+
+    names = dict(Product.objects.filter(id__in=[row['product_id'] for row in rows]).values_list('id', 'name'))
+    key = METRIC_KEYS[metric]
+    return [
+        {
+            'id': row['product_id'],
+            'name': names.get(row['product_id']),
+            key: format_metric(metric, row['value']),
+        }
+        for row in rows
+    ]
+
+
+def cached_most_ordered_products(start_date, end_date, num_products, metric=METRIC_FREQUENCY):
+    '''
+    Memoized most_ordered_products -> (products, closed).
+    Periods ending in the past (closed) never change and are cached for settings.STATISTICS_CLOSED_CACHE_TIMEOUT
+    seconds or until orders are edited after the fact or the catalog changes. Periods including the present are cached for settings.STATISTICS_OPEN_CACHE_TIMEOUT
+    seconds and until a new order is placed.
+    '''
+    closed = end_date < timezone.now()
+    versions = [get_statistics_version(), get_catalog_version()]
+    if not closed:
+        versions.append(get_orders_version())
+
+    params = f'{start_date.isoformat()}:{end_date.isoformat()}:{num_products}:{metric}'
+    key = f'statistics-most-ordered:{":".join(map(str, versions))}:' + hashlib.md5(params.encode()).hexdigest()
+    products = cache.get(key)
+    if products is None:
+        products = most_ordered_products(start_date, end_date, num_products, metric)
+        timeout = settings.STATISTICS_CLOSED_CACHE_TIMEOUT if closed else settings.STATISTICS_OPEN_CACHE_TIMEOUT
+        cache.set(key, products, timeout)
+    return products, closed
+
+
+# Time series: bucket sizes and grouping
+BUCKET_HOUR = 'hour'
+BUCKET_DAY = 'day'
+BUCKET_WEEK = 'week'
+BUCKET_MONTH = 'month'
+
+BUCKET_CHOICES = [
+    (BUCKET_HOUR, 'Hour'),
+    (BUCKET_DAY, 'Day'),
+    (BUCKET_WEEK, 'Week (from Monday)'),
+    (BUCKET_MONTH, 'Month'),
+]
+
+GROUP_PRODUCT = 'product'
+GROUP_CATEGORY = 'category'
+
+GROUP_CHOICES = [
+    (GROUP_PRODUCT, 'Product'),
+    (GROUP_CATEGORY, 'Category'),
+]
+
+# Grouping -> (id lookup, name lookup) of order lines and the key of the groups in the response
+GROUP_FIELDS = {
+    GROUP_PRODUCT: ('product_id', 'product__name', 'products'),
+    GROUP_CATEGORY: ('product__category_id', 'product__category__name', 'categories'),
+}
+
+SERIES_MAX_BUCKETS = 1000
+
+
+def bucket_start(moment, bucket):
+    # Start of the bucket containing moment, in the current time zone (the same as Trunc)
+    local = timezone.localtime(moment).replace(minute=0, second=0, microsecond=0)
+    if bucket != BUCKET_HOUR:
+        local = local.replace(hour=0)
+    if bucket == BUCKET_WEEK:
+        local -= timedelta(days=local.weekday())
+    if bucket == BUCKET_MONTH:
+        local = local.replace(day=1)
+    return timezone.make_aware(local.replace(tzinfo=None))
+
+
+def next_bucket(start, bucket):
+    if bucket == BUCKET_HOUR:
+        return start + timedelta(hours=1)
+    local = timezone.localtime(start).replace(tzinfo=None)
+    if bucket == BUCKET_DAY:
+        local += timedelta(days=1)
+    elif bucket == BUCKET_WEEK:
+        local += timedelta(weeks=1)
+    else:
+        local = local.replace(year=local.year + local.month // 12, month=local.month % 12 + 1)
+    return timezone.make_aware(local)
+
+
+def bucket_ranges(start_date, end_date, bucket):
+    '''
+    (start, end) of every bucket overlapping [start_date, end_date], end is exclusive.
+    Raises ValueError when there are more than SERIES_MAX_BUCKETS buckets.
+    '''
+    ranges = []
+    start = bucket_start(start_date, bucket)
+    while start <= end_date:
+        if len(ranges) == SERIES_MAX_BUCKETS:
+            raise ValueError(f'Ensure the period has at most {SERIES_MAX_BUCKETS} buckets.')
+        end = next_bucket(start, bucket)
+        ranges.append((start, end))
+        start = end
+    return ranges
+
+
+def series_cache_key(version, bucket, group_by, start):
+    return f'statistics-series:{version}:{group_by}:{bucket}:{start.isoformat()}'
+
+
+def series_rows(start_date, end_date, bucket, group_by):
+    '''
+    Statistics of order lines in [start_date, end_date) grouped by bucket and product (or category)
+    in a single query -> {bucket start: [group, ...]}
+    '''
+    id_lookup, name_lookup, _ = GROUP_FIELDS[group_by]
+    rows = (
+        OrderProducts.objects
+        .filter(order__order_date__gte=start_date, order__order_date__lt=end_date)
+        .annotate(bucket=Trunc('order__order_date', bucket))
+        .values('bucket', id_lookup, name_lookup)
+        # Annotation names must not shadow the aggregated fields
+        .annotate(
+            count_total=metric_aggregate(METRIC_FREQUENCY),
+            quantity_total=metric_aggregate(METRIC_QUANTITY),
+            revenue_total=metric_aggregate(METRIC_REVENUE),
+        )
+        .order_by('bucket', id_lookup)
+    )
+
+    buckets = defaultdict(list)
+    for row in rows:
+        buckets[row['bucket']].append({
+            'id': row[id_lookup],
+            'name': row[name_lookup],
+            'count': row['count_total'],
+            'quantity': row['quantity_total'],
+            'revenue': format_metric(METRIC_REVENUE, row['revenue_total']),
+        })
+    return buckets
+
+
+def sales_series(start_date, end_date, bucket=BUCKET_DAY, group_by=GROUP_PRODUCT):
+    '''
+    Number of order lines, ordered items and revenue per product (or category)
+    in every hour/day/week/month bucket of [start_date, end_date].
+    Closed buckets lying wholly inside the period never change and are cached (for
+    settings.STATISTICS_CLOSED_CACHE_TIMEOUT seconds or until orders are edited after the fact or the catalog changes), the other ones are computed with one grouped query.
+    '''
+    now = timezone.now()
+    # end_date is inclusive
+    period_end = end_date + timedelta(microseconds=1)
+    version = f'{get_statistics_version()}:{get_catalog_version()}'
+
+    # (bucket start, counted from, counted to, cache key - None for buckets which may still change)
+    spans = []
+    for start, end in bucket_ranges(start_date, end_date, bucket):
+        closed = start >= start_date and end <= period_end and end <= now
+        key = series_cache_key(version, bucket, group_by, start) if closed else None
+        spans.append((start, max(start, start_date), min(end, period_end), key))
+
+    cached = cache.get_many([key for *_, key in spans if key is not None])
+    missing = [span for span in spans if span[3] not in cached]
+    computed = {}
+    if missing:
+        computed = series_rows(missing[0][1], missing[-1][2], bucket, group_by)
+        cache.set_many(
+            {key: computed.get(start, []) for start, _, _, key in missing if key is not None}, 
+            settings.STATISTICS_CLOSED_CACHE_TIMEOUT
+        )
+
+    groups_key = GROUP_FIELDS[group_by][2]
+    return [
+        {
+            'start': start,
+            groups_key: cached[key] if key in cached else computed.get(start, []),
+        }
+        for start, _, _, key in spans
+    ]
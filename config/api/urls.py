@@ -1,14 +1,26 @@
+from django.conf import settings
 from django.urls import path
 from . import views
 from rest_framework.authtoken.views import obtain_auth_token
 from rest_framework.routers import DefaultRouter
 
+from .async_views import AsyncProductViewSet, AsyncOrderCreateView
+
+# Async views of the busiest endpoints when the project runs under ASGI
+if settings.ASYNC_VIEWS:
+    ProductViewSet, OrderCreateView = AsyncProductViewSet, AsyncOrderCreateView
+else:
+    ProductViewSet, OrderCreateView = views.ProductViewSet, views.OrderCreateView
+
 urlpatterns = [
     path('token/', obtain_auth_token, name='api_token_auth',),
-    path('order/', views.OrderCreateView.as_view(), name='order-product'),
+    path('order/', OrderCreateView.as_view(), name='order-product'),
+    path('order/batch/', views.OrderBatchCreateView.as_view(), name='order-batch'),
     path('order/statistics/most-ordered/', views.OrderStatisticsView.as_view(), name='statistics-most-ordered'),
+    path('order/statistics/series/', views.OrderStatisticsSeriesView.as_view(), name='statistics-series'),
+    path('metrics/', views.MetricsView.as_view(), name='metrics'),
 ]
 
 router = DefaultRouter()
-router.register(r'product', views.ProductViewSet, basename='product')
+router.register(r'product', ProductViewSet, basename='product')
 urlpatterns += router.urls
\ No newline at end of file
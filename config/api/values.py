@@ -0,0 +1,91 @@
+from rest_framework import serializers
+from rest_framework.settings import api_settings
+from rest_framework.response import Response
+from .metrics import measure_serialization
+
+
+class ValuesSerializer:
+    '''
+    Read-only equivalent of a ModelSerializer instance working on .values() rows.
+    Source lookups and representation functions of the fields are resolved once,
+    so serializing a row is a dict comprehension without model instances or field objects.
+    Supports the field types of the product serializers, the output equals ModelSerializer output.
+    '''
+    # Fields whose to_representation returns database values unchanged
+    identity_fields = (serializers.IntegerField, serializers.CharField, serializers.BooleanField)
+
+    def __init__(self, serializer):
+        request = serializer.context.get('request')
+        self.accessors = [
+            (name, *self.accessor(field, request))
+            for name, field in serializer.fields.items() if not field.write_only
+        ]
+
+
+    def accessor(self, field, request):
+        # Returns the .values() lookup and the representation function (None - value as is)
+        if isinstance(field, serializers.SlugRelatedField):
+            return f'{field.source}__{field.slug_field}', None
+        if isinstance(field, serializers.RelatedField):
+            raise TypeError(f'{field.__class__.__name__} is not supported')
+        if isinstance(field, serializers.FileField):
+            return field.source, self.file_url(field, request)
+        if isinstance(field, self.identity_fields):
+            return field.source, None
+        return field.source, field.to_representation
+
+
+    def file_url(self, field, request):
+        storage = field.parent.Meta.model._meta.get_field(field.source).storage
+        use_url = getattr(field, 'use_url', api_settings.UPLOADED_FILES_USE_URL)
+
+        def to_representation(name):
+            if not name:
+                return None
+            if not use_url:
+                return name
+            url = storage.url(name)
+            return request.build_absolute_uri(url) if request is not None else url
+        return to_representation
+
+
+    @property
+    def lookups(self):
+        return [lookup for _, lookup, _ in self.accessors]
+
+
+    def to_representation(self, row):
+        return {
+            name: row[lookup] if convert is None or row[lookup] is None else convert(row[lookup])
+            for name, lookup, convert in self.accessors
+        }
+
+
+    def serialize(self, rows):
+        to_representation = self.to_representation
+        with measure_serialization():
+            return [to_representation(row) for row in rows]
+
+
+class ValuesListMixin:
+    '''
+    Serves list responses from .values() rows with ValuesSerializer instead of model instances.
+    Lookups of get_values_extra_lookups() are read too (e.g. for pagination cursors) but not returned.
+    '''
+    def get_values_extra_lookups(self):
+        return ['id']
+
+
+    def values_queryset(self, values_serializer, queryset):
+        lookups = list(dict.fromkeys([*values_serializer.lookups, *self.get_values_extra_lookups()]))
+        return queryset.values(*lookups)
+
+
+    def list(self, request, *args, **kwargs):
+        values_serializer = ValuesSerializer(self.get_serializer())
+        queryset = self.values_queryset(values_serializer, self.filter_queryset(self.get_queryset()))
+
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(values_serializer.serialize(page))
+        return Response(values_serializer.serialize(queryset))
@@ -1,35 +1,148 @@
-from rest_framework import viewsets, filters, generics, status
+from rest_framework import viewsets, filters, generics, status, views
+from rest_framework.decorators import action
+from rest_framework.parsers import MultiPartParser
 from rest_framework.response import Response
-from base.models import Product, Order, OrderProducts
+from django.http import StreamingHttpResponse
+from django.utils.cache import patch_cache_control
+from base.models import Product, Order
 from .serializers import (
     ProductSerializer, 
+    ProductCompactSerializer,
     OrderSerializer, 
     OrderStatisticsSerializer,
+    OrderStatisticsSeriesSerializer,
+    create_orders,
+    prefetch_products,
 )
-from .paginations import CustomPagination
+from .paginations import CustomPagination, KeysetPagination
+from .caching import CachedResponseMixin, bump_catalog_version
+from .bulk import import_products, read_csv, read_jsonl, export_csv, export_jsonl
+from .statistics import cached_most_ordered_products, sales_series, METRIC_TITLES
+from .filters import ProductSearchFilter, ProductFilter
+from .values import ValuesListMixin
+from .renderers import PrometheusRenderer
+from . import metrics
 from django_filters.rest_framework import DjangoFilterBackend
-from django.core.mail import send_mail
-from django.template.loader import render_to_string
-from django.utils.html import strip_tags
-from django.contrib.auth.models import User
+from base.mail import send_order_confirmation, send_order_confirmations
+from django.conf import settings
 
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAuthenticated, IsAdminUser
 from .permissions import IsVendor, IsCustomer, ReadOnly
-from collections import defaultdict
 
-class ProductViewSet(viewsets.ModelViewSet):
-    queryset = Product.objects.all()
+class ProductViewSet(CachedResponseMixin, ValuesListMixin, viewsets.ModelViewSet):
+    # Category is joined, so rendering its name never costs a query per product
+    queryset = Product.objects.select_related('category')
     serializer_class = ProductSerializer
     pagination_class = CustomPagination
     ordering = ['-id']
 
-    filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
-    filterset_fields = ['name', 'category', 'description', 'price']
+    filter_backends = [DjangoFilterBackend, filters.OrderingFilter, ProductSearchFilter]
+    filterset_class = ProductFilter
 
     ordering_fields = ['name', 'category', 'price']
 
     permission_classes = [(IsAuthenticated&IsVendor)|ReadOnly]
 
+    @property
+    def paginator(self):
+        # Keyset (cursor) pagination on request: ?pagination=cursor
+        if not hasattr(self, '_paginator'):
+            if KeysetPagination.requested(self.request):
+                self._paginator = KeysetPagination()
+            else:
+                self._paginator = self.pagination_class()
+        return self._paginator
+
+    # ?representation=compact lists products with ProductCompactSerializer
+    representation_param = 'representation'
+    compact_representation = 'compact'
+
+    def get_serializer_class(self):
+        if self.action == 'list' and self.request.query_params.get(self.representation_param) == self.compact_representation:
+            return ProductCompactSerializer
+        return super().get_serializer_class()
+
+
+    def get_ordering_fields(self, queryset):
+        ordering = filters.OrderingFilter().get_ordering(self.request, queryset, self) or []
+        return [term.lstrip('-') for term in ordering]
+
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action in ('list', 'retrieve'):
+            # Only the columns of serialized fields (?fields= / ?omit=) and of the ordering are read
+            ordering_fields = self.get_ordering_fields(queryset)
+            queryset = self.get_serializer_class().restrict_queryset(queryset, self.request, ordering_fields)
+        return queryset
+
+
+    def get_values_extra_lookups(self):
+        # List pages are built from .values() rows, cursor links need the ordering value
+        cursor_fields = KeysetPagination.cursor_fields
+        ordering_fields = self.get_ordering_fields(self.queryset)
+        return ['id', *(cursor_fields[field] for field in ordering_fields if field in cursor_fields)]
+
+    # Bulk import / export formats: name -> (reader, writer, content type)
+    bulk_formats = {
+        'csv': (read_csv, export_csv, 'text/csv'),
+        'jsonl': (read_jsonl, export_jsonl, 'application/jsonl'),
+    }
+
+
+    @action(detail=False, methods=['post'], url_path='import', url_name='import', parser_classes=[MultiPartParser])
+    def import_products(self, request):
+        '''
+        Create (rows without id) or update (rows with id) products from an uploaded CSV or JSON Lines `file`.
+        Columns: id (optional), name, description, price, category (name)
+        '''
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response({'file': ['No file was submitted.']}, status=status.HTTP_400_BAD_REQUEST)
+
+        file_format = request.data.get('type') or upload.name.rsplit('.', 1)[-1].lower()
+        if file_format == 'ndjson':
+            file_format = 'jsonl'
+        if file_format not in self.bulk_formats:
+            return Response(
+                {'type': [f'Unsupported file type, use one of: {", ".join(self.bulk_formats)}.']}, 
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        reader = self.bulk_formats[file_format][0]
+        report = import_products(reader(upload))
+
+        # Bulk operations do not send model signals
+        bump_catalog_version()
+
+        return Response(report.as_dict(), status=status.HTTP_200_OK)
+
+
+    @action(detail=False, methods=['get'], url_path='export', url_name='export')
+    def export_products(self, request):
+        '''
+        Stream the whole catalog (filters and ordering apply) as CSV or JSON Lines - ?type=csv|jsonl
+        '''
+        file_format = request.query_params.get('type', 'csv')
+        if file_format not in self.bulk_formats:
+            return Response(
+                {'type': [f'Unsupported file type, use one of: {", ".join(self.bulk_formats)}.']}, 
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        _, writer, content_type = self.bulk_formats[file_format]
+        queryset = self.filter_queryset(self.get_queryset())
+        response = StreamingHttpResponse(writer(queryset), content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="products.{file_format}"'
+        return response
+
+
+def order_response_data(order):
+    return {
+        'total price': order.total_price,
+        'payment date': order.payment_date.strftime("%d-%m-%Y, %H:%M:%S"),
+    }
+
 
 class OrderCreateView(generics.CreateAPIView):
     queryset = Order.objects.all()
@@ -46,70 +159,143 @@ class OrderCreateView(generics.CreateAPIView):
         self.send_confirmation_email(serializer.instance)
         
         # Response data
-        response_data = {
-            'total price': serializer.instance.total_price,
-            'payment date': serializer.instance.payment_date.strftime("%d-%m-%Y, %H:%M:%S"),
-        }
+        response_data = order_response_data(serializer.instance)
 
         headers = self.get_success_headers(serializer.data)
         return Response(response_data, status=status.HTTP_201_CREATED, headers=headers)
 
 
     def send_confirmation_email(self, instance):
-        subject = 'Order Confirmation'
-        message = render_to_string('base/order_confirmation_email.html', {'order': instance})
-        plain_message = strip_tags(message)
-        from_email = User.objects.filter(username="admin").first().email
-        to_email = instance.user.email
-
-        send_mail(
-            subject, 
-            plain_message, 
-            from_email, 
-            [to_email], 
-            fail_silently=False
-        )
+        # Sent inline or queued in the outbox depending on settings.ORDER_EMAIL_MODE
+        send_order_confirmation(instance)
+
+
+class OrderBatchCreateView(generics.GenericAPIView):
+    queryset = Order.objects.all()
+    serializer_class = OrderSerializer
+
+    permission_classes = [(IsAuthenticated&IsCustomer)|ReadOnly]
+
+    def post(self, request, *args, **kwargs):
+        orders_data = request.data
+        max_size = settings.ORDER_BATCH_MAX_SIZE
+        if not isinstance(orders_data, list) or not orders_data:
+            return Response(
+                {'non_field_errors': ['Expected a non-empty list of orders.']}, 
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if len(orders_data) > max_size:
+            return Response(
+                {'non_field_errors': [f'Ensure this list has no more than {max_size} orders.']}, 
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        # Resolve products referenced by all orders with a single query, shared by every serializer
+        context = self.get_serializer_context()
+        prefetch_products(context, [
+            item.get('product')
+            for order in orders_data if isinstance(order, dict) and isinstance(order.get('products'), list)
+            for item in order['products'] if isinstance(item, dict)
+        ])
+
+        # Validate every order on its own, so one invalid order does not reject the whole batch
+        serializers = [self.get_serializer(data=order, context=context) for order in orders_data]
+        valid = [serializer for serializer in serializers if serializer.is_valid()]
+
+        # Insert all valid orders with bulk operations
+        orders = create_orders(request.user, [serializer.validated_data for serializer in valid])
+        for serializer, order in zip(valid, orders):
+            serializer.instance = order
+        send_order_confirmations(orders)
 
+        # Response data - result or errors for each order in request order
+        results = [
+            {'index': index, **order_response_data(serializer.instance)}
+            if serializer.instance is not None else
+            {'index': index, 'errors': serializer.errors}
+            for index, serializer in enumerate(serializers)
+        ]
 
-class OrderStatisticsView(generics.ListCreateAPIView):
+        if not orders:
+            response_status = status.HTTP_400_BAD_REQUEST
+        elif len(orders) < len(serializers):
+            response_status = status.HTTP_207_MULTI_STATUS
+        else:
+            response_status = status.HTTP_201_CREATED
+        return Response({'results': results}, status=response_status)
+
+
+class OrderStatisticsView(generics.GenericAPIView):
     serializer_class = OrderStatisticsSerializer
     permission_classes = [IsAuthenticated&IsVendor]
 
-    def create(self, request, *args, **kwargs):
-        serializer = self.get_serializer(data=request.data)
+    def get(self, request, *args, **kwargs):
+        response = self.statistics_response(request.query_params, status.HTTP_200_OK)
+        if response.status_code == status.HTTP_200_OK:
+            # Past periods do not change, the present one is cached briefly
+            max_age = settings.STATISTICS_CLOSED_MAX_AGE if self.closed else settings.STATISTICS_OPEN_CACHE_TIMEOUT
+            patch_cache_control(response, private=True, max_age=max_age)
+        return response
+
+
+    def post(self, request, *args, **kwargs):
+        # Former form of the endpoint, kept for existing clients
+        return self.statistics_response(request.data, status.HTTP_201_CREATED)
+
+
+    def statistics_response(self, data, response_status):
+        serializer = self.get_serializer(data=data)
         serializer.is_valid(raise_exception=True)
 
         start_date = serializer.validated_data['start_date']
         end_date = serializer.validated_data['end_date']
         num_products = serializer.validated_data['num_products']
+        metric = serializer.validated_data['metric']
 
-        # Filter orders based on the specified date range
-        ordered_products = OrderProducts.objects.filter(order__order_date__range=[start_date, end_date])
+        # Group, sort and limit in the database, memoized in the cache
+        top_products, self.closed = cached_most_ordered_products(start_date, end_date, num_products, metric)
 
-        # Count the occurrences of each product
-        product_counts = defaultdict(int)
-        for order in ordered_products:
-            product_id = order.product.id
-            product_counts[product_id] += 1 # most frequently ordered, not the most ordered
-            
+        # Response data
+        response_data = {
+            METRIC_TITLES[metric]: top_products
+        }
+        return Response(response_data, status=response_status)
 
-        # Sort products by order count
-        sorted_products = sorted(product_counts.items(), key=lambda x: x[1], reverse=True)
 
-        # Extract only selected number of products
-        top_products = [
-            {
-                "id": product_id,
-                "name": Product.objects.get(id=product_id).name,
-                "count": count
-            } 
-            for product_id, count in sorted_products[:num_products]]
+class OrderStatisticsSeriesView(generics.GenericAPIView):
+    serializer_class = OrderStatisticsSeriesSerializer
+    permission_classes = [IsAuthenticated&IsVendor]
+
+    def get(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
 
+        bucket = serializer.validated_data['bucket']
+        group_by = serializer.validated_data['group_by']
+
+        # One grouped query for the buckets which are not cached
+        series = sales_series(
+            serializer.validated_data['start_date'], 
+            serializer.validated_data['end_date'], 
+            bucket, 
+            group_by
+        )
 
         # Response data
         response_data = {
-            'Most frequently ordered products': top_products
+            'bucket': bucket,
+            'group by': group_by,
+            'series': series,
         }
+        return Response(response_data, status=status.HTTP_200_OK)
 
-        headers = self.get_success_headers(serializer.data)
-        return Response(response_data, status=status.HTTP_201_CREATED, headers=headers)
+
+class MetricsView(views.APIView):
+    '''
+    Performance metrics of this process for Prometheus (recorded by api.middleware.PerformanceMiddleware)
+    '''
+    permission_classes = [IsAdminUser]
+    renderer_classes = [PrometheusRenderer]
+
+    def get(self, request, *args, **kwargs):
+        return Response(metrics.expose(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -1,7 +1,9 @@
 from django.contrib import admin
-from .models import ProductCategory, Product, Order, OrderProducts
+from .models import ProductCategory, Product, Order, OrderProducts, DailyProductSales, OutgoingEmail
 
 admin.site.register(ProductCategory)
 admin.site.register(Product)
 admin.site.register(Order)
 admin.site.register(OrderProducts)
+admin.site.register(DailyProductSales)
+admin.site.register(OutgoingEmail)
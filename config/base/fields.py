@@ -0,0 +1,21 @@
+from django.conf import settings
+from django_advance_thumbnail import AdvanceThumbnailField
+
+
+THUMBNAIL_MODE_INLINE = 'inline'
+THUMBNAIL_MODE_DEFERRED = 'deferred'
+
+
+def thumbnails_deferred():
+    return getattr(settings, 'THUMBNAIL_MODE', THUMBNAIL_MODE_INLINE) == THUMBNAIL_MODE_DEFERRED
+
+
+class DeferredThumbnailField(AdvanceThumbnailField):
+    '''
+    AdvanceThumbnailField which leaves thumbnail generation to the generate_thumbnails worker
+    when settings.THUMBNAIL_MODE is "deferred" (see base.thumbnails)
+    '''
+    def create_thumbnail(self, instance, **kwargs):
+        if thumbnails_deferred():
+            return
+        super().create_thumbnail(instance, **kwargs)
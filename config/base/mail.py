@@ -0,0 +1,164 @@
+import logging
+from contextlib import nullcontext
+from asgiref.sync import sync_to_async
+from datetime import timedelta
+from functools import lru_cache
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.mail import EmailMessage, get_connection
+from django.db import connection, transaction
+from django.template.loader import render_to_string
+from django.utils import timezone
+from django.utils.html import strip_tags
+from .models import OutgoingEmail
+
+
+logger = logging.getLogger(__name__)
+
+EMAIL_MODE_INLINE = 'inline'
+EMAIL_MODE_QUEUED = 'queued'
+
+# Delay before the first retry, doubled after every failed attempt
+RETRY_DELAY = timedelta(seconds=30)
+MAX_RETRY_DELAY = timedelta(hours=1)
+
+
+@lru_cache(maxsize=None)
+def get_sender_email():
+    '''
+    Address of the admin account used as sender. Cached until the admin user changes (see signals).
+    '''
+    admin = User.objects.filter(username="admin").only('email').first()
+    if admin is None or not admin.email:
+        return settings.DEFAULT_FROM_EMAIL
+    return admin.email
+
+
+def order_confirmation(order):
+    '''
+    Subject, plain text body, sender and recipient of the order confirmation
+    '''
+    subject = 'Order Confirmation'
+    message = render_to_string('base/order_confirmation_email.html', {'order': order})
+    plain_message = strip_tags(message)
+    from_email = get_sender_email()
+    to_email = order.user.email
+    return subject, plain_message, from_email, to_email
+
+
+def emails_queued():
+    return getattr(settings, 'ORDER_EMAIL_MODE', EMAIL_MODE_INLINE) == EMAIL_MODE_QUEUED
+
+
+def queue_order_confirmations(orders):
+    '''
+    Put confirmations into the outbox if settings.ORDER_EMAIL_MODE is queued.
+    Called in the transaction inserting the orders, so no order is committed without its email.
+    '''
+    if not emails_queued():
+        return
+    OutgoingEmail.objects.bulk_create([
+        OutgoingEmail(subject=subject, body=body, from_email=from_email, to=to_email)
+        for subject, body, from_email, to_email in map(order_confirmation, orders)
+    ])
+
+
+def send_order_confirmations(orders):
+    '''
+    Send confirmations right away over one connection. In queued mode they are
+    already in the outbox (see queue_order_confirmations).
+    Failures are logged - the orders are committed already, an error response would make clients
+    place them again. Queued mode retries failed emails instead.
+    '''
+    if emails_queued():
+        return
+
+    try:
+        get_connection(fail_silently=False).send_messages([
+            EmailMessage(subject, body, from_email, [to_email])
+            for subject, body, from_email, to_email in map(order_confirmation, orders)
+        ])
+    except Exception:
+        logger.exception('Sending confirmations of orders %s failed', ', '.join(str(order.id) for order in orders))
+
+
+def send_order_confirmation(order):
+    send_order_confirmations([order])
+
+
+async def asend_order_confirmations(orders):
+    '''
+    send_order_confirmations for async views. SMTP traffic runs in a worker thread,
+    so the event loop keeps serving other requests meanwhile.
+    '''
+    await sync_to_async(send_order_confirmations)(orders)
+
+
+def retry_delay(attempts):
+    return min(RETRY_DELAY * 2 ** (attempts - 1), MAX_RETRY_DELAY)
+
+
+def record_failure(email, error, max_attempts):
+    email.attempts += 1
+    email.last_error = f'{type(error).__name__}: {error}'
+    if email.attempts >= max_attempts:
+        email.status = OutgoingEmail.STATUS_FAILED
+    else:
+        email.next_attempt_at = timezone.now() + retry_delay(email.attempts)
+
+
+def send_queued_emails(batch_size=50, max_attempts=5):
+    '''
+    Send one batch of due emails from the outbox over a single SMTP connection.
+    Failed emails are retried with exponential backoff until max_attempts is reached,
+    the whole batch if the connection could not be opened.
+    Returns a tuple (sent, failed).
+    '''
+    # Lock the batch where the database allows it, so several workers never send the same email.
+    # Elsewhere (SQLite) the batch is read without holding a transaction during SMTP traffic.
+    locking = connection.features.has_select_for_update_skip_locked
+    with transaction.atomic() if locking else nullcontext():
+        queryset = OutgoingEmail.objects.filter(
+            status=OutgoingEmail.STATUS_PENDING,
+            next_attempt_at__lte=timezone.now(),
+        ).order_by('next_attempt_at', 'id')
+        if locking:
+            queryset = queryset.select_for_update(skip_locked=True)
+        emails = list(queryset[:batch_size])
+        if not emails:
+            return 0, 0
+
+        sent = failed = handled = 0
+        try:
+            with get_connection(fail_silently=False) as smtp:
+                for email in emails:
+                    message = EmailMessage(
+                        email.subject, 
+                        email.body, 
+                        email.from_email, 
+                        email.recipients(), 
+                        connection=smtp
+                    )
+                    try:
+                        smtp.send_messages([message])
+                    except Exception as error:
+                        failed += 1
+                        record_failure(email, error, max_attempts)
+                    else:
+                        sent += 1
+                        email.attempts += 1
+                        email.status = OutgoingEmail.STATUS_SENT
+                        email.sent_at = timezone.now()
+                        email.last_error = ''
+                    handled += 1
+        except Exception as error:
+            # Server unreachable - emails not tried yet back off like failed ones, the worker keeps running
+            for email in emails[handled:]:
+                failed += 1
+                record_failure(email, error, max_attempts)
+
+        OutgoingEmail.objects.bulk_update(
+            emails, 
+            ['status', 'attempts', 'last_error', 'next_attempt_at', 'sent_at']
+        )
+    return sent, failed
@@ -0,0 +1,147 @@
+import random
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+from pathlib import Path
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, DEFAULT_DB_ALIAS
+from django.utils import timezone
+from base.models import Product, ProductCategory, Order, OrderProducts
+
+
+# Settings compared by the benchmark: name -> pragmas (SQLite defaults: rollback journal, full sync)
+PROFILES = {
+    'default': {},
+    'production': settings.SQLITE_PRODUCTION_PRAGMAS,
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare concurrent catalog reads and order writes on a copy of the database '
+        'with default SQLite settings and with the production pragmas (WAL)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--readers', type=int, default=8)
+        parser.add_argument('--writers', type=int, default=4)
+        parser.add_argument('--duration', type=float, default=5, help='Seconds per profile')
+
+    def handle(self, *args, **options):
+        connection = connections[DEFAULT_DB_ALIAS]
+        if connection.vendor != 'sqlite':
+            raise CommandError('The benchmark compares SQLite settings')
+        self.user_id = User.objects.order_by('id').values_list('id', flat=True).first()
+        # Prices as text, the sqlite3 module does not adapt Decimal
+        self.products = [(product_id, str(price)) for product_id, price in Product.objects.values_list('id', 'price')]
+        if self.user_id is None or not self.products:
+            raise CommandError('The database needs at least one user and one product')
+        self.queries = self.build_queries()
+
+        with tempfile.TemporaryDirectory() as directory:
+            for name, pragmas in PROFILES.items():
+                # Each profile starts from a fresh copy of the database
+                path = Path(directory) / f'{name}.sqlite3'
+                shutil.copyfile(connection.settings_dict['NAME'], path)
+                results = self.run(path, pragmas, options)
+                self.report(name, results, options['duration'])
+
+    def build_queries(self):
+        product, category = Product._meta, ProductCategory._meta
+        order, line = Order._meta, OrderProducts._meta
+        return {
+            # Catalog page and a statistics aggregate
+            'reads': [
+                f'SELECT p.id, p.name, p.price, c.name FROM {product.db_table} p '
+                f'JOIN {category.db_table} c ON c.id = p.category_id ORDER BY p.id DESC LIMIT 20',
+                f'SELECT product_id, COUNT(*), SUM(quantity) FROM {line.db_table} '
+                f'GROUP BY product_id ORDER BY 2 DESC LIMIT 5',
+            ],
+            'order': (
+                f'INSERT INTO {order.db_table} (customer_name, delivery_address, payment_status, '
+                f'order_date, payment_date, user_id, total_price) VALUES (?, ?, ?, ?, ?, ?, ?)'
+            ),
+            'line': (
+                f'INSERT INTO {line.db_table} (order_id, product_id, quantity, unit_price, line_total) '
+                f'VALUES (?, ?, ?, ?, ?)'
+            ),
+        }
+
+    def connect(self, path, pragmas):
+        # Autocommit, transactions are opened explicitly with BEGIN like Django does
+        db = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        for name, value in pragmas.items():
+            db.execute(f'PRAGMA {name} = {value}')
+        return db
+
+    def run(self, path, pragmas, options):
+        self.connect(path, pragmas).close()
+        counts = {'reads': 0, 'writes': 0, 'errors': 0}
+        latencies = {'reads': [], 'writes': []}
+        lock = threading.Lock()
+        deadline = time.monotonic() + options['duration']
+
+        def reader():
+            db = self.connect(path, pragmas)
+            while time.monotonic() < deadline:
+                self.measure(lambda: self.read_catalog(db), 'reads', counts, latencies, lock)
+            db.close()
+
+        def writer():
+            db = self.connect(path, pragmas)
+            while time.monotonic() < deadline:
+                self.measure(lambda: self.place_order(db), 'writes', counts, latencies, lock)
+            db.close()
+
+        threads = (
+            [threading.Thread(target=reader) for _ in range(options['readers'])]
+            + [threading.Thread(target=writer) for _ in range(options['writers'])]
+        )
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return counts, latencies
+
+    def read_catalog(self, db):
+        for sql in self.queries['reads']:
+            db.execute(sql).fetchall()
+
+    def place_order(self, db):
+        now = timezone.now().isoformat(sep=' ')
+        db.execute('BEGIN')
+        try:
+            cursor = db.execute(self.queries['order'], ('Benchmark', 'Street 1', 'Pending', now, now, self.user_id, 100))
+            for product_id, price in random.sample(self.products, min(2, len(self.products))):
+                db.execute(self.queries['line'], (cursor.lastrowid, product_id, 1, price, price))
+            db.execute('COMMIT')
+        except sqlite3.Error:
+            db.execute('ROLLBACK')
+            raise
+
+    def measure(self, operation, kind, counts, latencies, lock):
+        start = time.perf_counter()
+        try:
+            operation()
+        except sqlite3.OperationalError:
+            # "database is locked"
+            with lock:
+                counts['errors'] += 1
+            return
+        elapsed = time.perf_counter() - start
+        with lock:
+            counts[kind] += 1
+            latencies[kind].append(elapsed)
+
+    def report(self, name, results, duration):
+        counts, latencies = results
+        self.stdout.write(f'{name}:')
+        for kind in ('reads', 'writes'):
+            values = sorted(latencies[kind])
+            p95 = values[int(len(values) * 0.95)] * 1000 if values else 0
+            self.stdout.write(f'  {kind}/s: {counts[kind] / duration:.1f} (p95 {p95:.1f} ms)')
+        self.stdout.write(f'  failed ("database is locked"): {counts["errors"]}')
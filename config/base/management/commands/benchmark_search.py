@@ -0,0 +1,34 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+from base.models import Product
+from base import search
+
+
+class Command(BaseCommand):
+    help = 'Compare product search through the FTS5 index with icontains scanning'
+
+    def add_arguments(self, parser):
+        parser.add_argument('queries', nargs='+', help='Search texts, e.g. "apple imac" laptop')
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, *args, **options):
+        if not search.search_available():
+            raise CommandError('Product search index is missing, run migrate or rebuild_product_search')
+
+        queryset = Product.objects.all()
+        for text in options['queries']:
+            words = search.terms(text)
+            indexed = self.measure(lambda: search.search_products(queryset, text), options['repeat'])
+            scanned = self.measure(lambda: search.scan_products(queryset, words), options['repeat'])
+            self.stdout.write(
+                f'{text!r}: fts5 {indexed[0]:.2f} ms ({indexed[1]} results), '
+                f'icontains {scanned[0]:.2f} ms ({scanned[1]} results)'
+            )
+
+    def measure(self, build_queryset, repeat):
+        # Average time of evaluating the query (ids only, rendering is not measured)
+        start = time.perf_counter()
+        for _ in range(repeat):
+            ids = list(build_queryset().values_list('id', flat=True))
+        elapsed = (time.perf_counter() - start) / repeat * 1000
+        return elapsed, len(ids)
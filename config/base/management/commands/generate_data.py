@@ -0,0 +1,220 @@
+import random
+import time
+from datetime import timedelta
+from decimal import Decimal
+from itertools import accumulate
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User, Group
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+from base.models import Product, ProductCategory, Order, OrderProducts, DailyProductSales
+
+
+BRANDS = ['Apple', 'Lenovo', 'HP', 'Dell', 'Asus', 'Acer', 'Samsung', 'Sony', 'LG', 'Xiaomi', 'Canon', 'Epson']
+KINDS = ['Laptop', 'Monitor', 'Printer', 'Tablet', 'Phone', 'Keyboard', 'Mouse', 'Headphones', 'Camera', 'Router']
+SERIES = ['Pro', 'Air', 'Plus', 'Ultra', 'Mini', 'Max', 'Lite', 'Neo', 'Prime', 'Studio']
+WORDS = [
+    'fast', 'light', 'durable', 'wireless', 'compact', 'silent', 'bright', 'portable', 'ergonomic', 'premium',
+    'display', 'battery', 'storage', 'memory', 'design', 'warranty', 'performance', 'connectivity', 'quality', 'sound',
+]
+STREETS = ['Elm Street', 'Oak Avenue', 'Main Street', 'Maple Road', 'Pine Lane', 'Cedar Court']
+
+# Popularity of the n-th product is proportional to 1 / n ** POPULARITY_EXPONENT (Zipf-like),
+# quantity of an order line is 1 in most cases
+POPULARITY_EXPONENT = 0.8
+QUANTITIES = [1, 2, 3, 4, 5]
+QUANTITY_WEIGHTS = list(accumulate([60, 20, 10, 5, 5]))
+
+
+def insert_rows(model, fields, rows, upsert=None):
+    '''
+    INSERT rows (tuples of database values in the order of fields) with executemany.
+    Much faster than bulk_create for millions of rows, as no model instances are built.
+    upsert - (unique fields, fields incremented by the new values) of INSERT ... ON CONFLICT DO UPDATE
+    '''
+    quote = connection.ops.quote_name
+    opts = model._meta
+    columns = [quote(opts.get_field(name).column) for name in fields]
+    sql = (
+        f'INSERT INTO {quote(opts.db_table)} ({", ".join(columns)}) '
+        f'VALUES ({", ".join(["%s"] * len(columns))})'
+    )
+    if upsert is not None:
+        unique, incremented = upsert
+        targets = [quote(opts.get_field(name).column) for name in unique]
+        updates = [quote(opts.get_field(name).column) for name in incremented]
+        sql += (
+            f' ON CONFLICT ({", ".join(targets)}) DO UPDATE SET '
+            + ', '.join(f'{column} = {column} + excluded.{column}' for column in updates)
+        )
+    with connection.cursor() as cursor:
+        cursor.executemany(sql, rows)
+
+
+class Command(BaseCommand):
+    help = (
+        'Add a synthetic dataset to the database using bulk inserts: categories, products, '
+        'vendor and customer accounts and orders spread over the past days. Use it with SQLITE_PATH '
+        'to build databases of several sizes for benchmark_api.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=10000)
+        parser.add_argument('--orders', type=int, default=30000)
+        parser.add_argument('--max-lines', type=int, default=6, help='Maximum number of lines of an order')
+        parser.add_argument('--categories', type=int, default=20)
+        parser.add_argument('--vendors', type=int, default=50)
+        parser.add_argument('--customers', type=int, default=1000)
+        parser.add_argument('--days', type=int, default=365, help='Orders are placed over this many past days')
+        parser.add_argument('--password', default='testing321', help='Password of the generated accounts')
+        parser.add_argument('--batch-size', type=int, default=10000)
+        parser.add_argument('--seed', type=int, default=0, help='Same seed, same dataset')
+
+    def handle(self, *args, **options):
+        for name in ('products', 'orders', 'categories', 'vendors', 'customers'):
+            if options[name] < 0:
+                raise CommandError(f'--{name} must not be negative')
+        if options['max_lines'] < 1 or options['days'] < 1 or options['batch_size'] < 1:
+            raise CommandError('--max-lines, --days and --batch-size must be positive')
+
+        self.random = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        # Generated names continue after existing rows, so the command can be run repeatedly
+        self.suffix = (User.objects.aggregate(last=Max('id'))['last'] or 0) + 1
+
+        start = time.perf_counter()
+        categories = self.create_categories(options['categories'])
+        self.create_products(options['products'], categories)
+        self.create_users('vendor', 'Vendors', options['vendors'], options['password'])
+        customers = self.create_users('customer', 'Customers', options['customers'], options['password'])
+        self.create_orders(options['orders'], options['max_lines'], options['days'], customers)
+
+        self.stdout.write(self.style.SUCCESS(f'Generated data in {time.perf_counter() - start:.1f} s'))
+
+    def batches(self, items):
+        batch = []
+        for item in items:
+            batch.append(item)
+            if len(batch) == self.batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def create_categories(self, count):
+        names = [f'Generated category {self.suffix + number}' for number in range(count)]
+        ProductCategory.objects.bulk_create([ProductCategory(name=name) for name in names], ignore_conflicts=True)
+        categories = list(ProductCategory.objects.values_list('id', flat=True))
+        if not categories:
+            raise CommandError('Products need at least one category')
+        return categories
+
+    def create_products(self, count, categories):
+        rand = self.random
+        image = Product._meta.get_field('image').default
+
+        def products():
+            for _ in range(count):
+                brand, kind, series = rand.choice(BRANDS), rand.choice(KINDS), rand.choice(SERIES)
+                yield (
+                    f'{brand} {kind} {series} {rand.randint(100, 9999)}',
+                    f'{brand} {kind.lower()}: ' + ' '.join(rand.choices(WORDS, k=12)),
+                    Decimal(rand.randint(999, 999999)) / 100,
+                    rand.choice(categories),
+                    image,
+                    settings.THUMBNAIL_PLACEHOLDER,
+                    False,
+                )
+
+        # The search index is filled by its triggers
+        fields = ['name', 'description', 'price', 'category', 'image', 'thumbnail', 'thumbnail_pending']
+        for batch in self.batches(products()):
+            with transaction.atomic():
+                insert_rows(Product, fields, batch)
+        self.stdout.write(f'Products: {count}')
+
+    def create_users(self, role, group_name, count, password):
+        # Hashing is slow on purpose, all accounts share one hash
+        password = make_password(password)
+        users = []
+        for batch in self.batches(
+            User(username=f'generated-{role}{self.suffix + number}', password=password) for number in range(count)
+        ):
+            with transaction.atomic():
+                users += User.objects.bulk_create(batch)
+
+        group, _ = Group.objects.get_or_create(name=group_name)
+        Membership = User.groups.through
+        for batch in self.batches(Membership(user_id=user.id, group_id=group.id) for user in users):
+            Membership.objects.bulk_create(batch)
+        self.stdout.write(f'{group_name}: {count}')
+        return [(user.id, user.username) for user in users]
+
+    def create_orders(self, count, max_lines, days, customers):
+        if not count:
+            return
+        if not customers:
+            customers = list(User.objects.filter(groups__name='Customers').values_list('id', 'username'))
+        products = list(Product.objects.values_list('id', 'price'))
+        if not customers or not products:
+            raise CommandError('Orders need at least one customer and one product')
+
+        rand = self.random
+        popularity = list(accumulate(1 / rank ** POPULARITY_EXPONENT for rank in range(1, len(products) + 1)))
+        rand.shuffle(products)
+        end = timezone.now()
+        start = end - timedelta(days=days)
+        step = (end - start) / count
+        # Ids are assigned here, order lines reference them without reading them back
+        first_id = (Order.objects.aggregate(last=Max('id'))['last'] or 0) + 1
+
+        def orders():
+            # Dates grow with ids like in a live database
+            for number in range(count):
+                user_id, username = rand.choice(customers)
+                lines = {}
+                for product_id, price in rand.choices(products, cum_weights=popularity, k=rand.randint(1, max_lines)):
+                    lines[product_id] = (price, rand.choices(QUANTITIES, cum_weights=QUANTITY_WEIGHTS)[0])
+                order_date = start + step * number
+                yield first_id + number, user_id, username, order_date, lines
+
+        adapt_datetime = connection.ops.adapt_datetimefield_value
+        adapt_date = connection.ops.adapt_datefield_value
+        for batch in self.batches(orders()):
+            order_rows, line_rows, sales = [], [], {}
+            for order_id, user_id, username, order_date, lines in batch:
+                order_rows.append((
+                    order_id,
+                    user_id,
+                    username,
+                    f'{rand.randint(1, 9999)} {rand.choice(STREETS)}',
+                    Order.PAYMENT_STATUS_COMPLETE,
+                    adapt_datetime(order_date),
+                    adapt_datetime(order_date + timedelta(days=5)),
+                    sum(price * quantity for price, quantity in lines.values()),
+                ))
+                day = timezone.localdate(order_date)
+                for product_id, (price, quantity) in lines.items():
+                    line_rows.append((order_id, product_id, quantity, price, price * quantity))
+                    # Daily statistics rollup of the batch
+                    order_count, total_quantity, revenue = sales.get((day, product_id), (0, 0, 0))
+                    sales[(day, product_id)] = (order_count + 1, total_quantity + quantity, revenue + price * quantity)
+
+            with transaction.atomic():
+                insert_rows(
+                    Order,
+                    ['id', 'user', 'customer_name', 'delivery_address', 'payment_status', 'order_date', 'payment_date', 'total_price'],
+                    order_rows,
+                )
+                insert_rows(OrderProducts, ['order', 'product', 'quantity', 'unit_price', 'line_total'], line_rows)
+                # Rows of days already in the rollup are incremented
+                insert_rows(
+                    DailyProductSales,
+                    ['date', 'product', 'order_count', 'quantity', 'revenue'],
+                    [(adapt_date(day), product_id, *totals) for (day, product_id), totals in sales.items()],
+                    upsert=(['date', 'product'], ['order_count', 'quantity', 'revenue']),
+                )
+        self.stdout.write(f'Orders: {count}')
@@ -0,0 +1,48 @@
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+from django.core.management.base import BaseCommand
+from base.models import Product
+from base.thumbnails import generate_thumbnails
+
+
+class Command(BaseCommand):
+    help = (
+        'Generate product thumbnails in parallel worker processes. '
+        'By default only pending products are processed (settings.THUMBNAIL_MODE = "deferred"), '
+        'use --all to regenerate thumbnails of the whole catalog.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help='Regenerate thumbnails of all products')
+        parser.add_argument('--workers', type=int, default=None, help='Worker processes, default: number of CPUs, 0: no pool')
+        parser.add_argument('--batch-size', type=int, default=100, help='Products processed at once')
+        parser.add_argument('--loop', action='store_true', help='Keep waiting for new pending products')
+        parser.add_argument('--interval', type=float, default=5, help='Seconds between polls when nothing is pending')
+
+    def handle(self, *args, **options):
+        queryset = Product.objects.only('id', 'image').order_by('id')
+        if not options['all']:
+            queryset = queryset.filter(thumbnail_pending=True)
+
+        last_id = 0
+        total_generated = total_failed = 0
+        workers = options['workers']
+        with ProcessPoolExecutor(max_workers=workers) if workers != 0 else nullcontext() as pool:
+            while True:
+                # Keyset pagination, so failed products are not picked up again in this run
+                batch = list(queryset.filter(id__gt=last_id)[:options['batch_size']])
+                if batch:
+                    last_id = batch[-1].id
+                    generated, failed = generate_thumbnails(batch, pool=pool)
+                    total_generated += generated
+                    total_failed += failed
+                    self.stdout.write(f'Generated {generated} thumbnails, {failed} failed')
+                elif options['loop']:
+                    # Start again from the beginning to pick up products pending in the meantime
+                    last_id = 0
+                    time.sleep(options['interval'])
+                else:
+                    break
+
+        self.stdout.write(self.style.SUCCESS(f'Done: {total_generated} generated, {total_failed} failed'))
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, DEFAULT_DB_ALIAS
+from base import search
+
+
+class Command(BaseCommand):
+    help = 'Create (if missing) and refill the SQLite FTS5 product search index with its triggers'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+
+    def handle(self, *args, **options):
+        connection = connections[options['database']]
+        if not search.fts5_supported(connection):
+            raise CommandError('Full-text search needs SQLite with FTS5, other databases use scanning')
+
+        search.install(connection)
+        self.stdout.write(self.style.SUCCESS('Product search index rebuilt'))
@@ -0,0 +1,32 @@
+from datetime import date
+from django.core.management.base import BaseCommand, CommandError
+from base.models import DailyProductSales
+
+
+class Command(BaseCommand):
+    help = (
+        'Backfill or rebuild the daily product sales rollup from raw order lines. '
+        'Run it after orders were changed outside the API (e.g. in the admin panel).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start', help='First day to rebuild (YYYY-MM-DD), default: oldest order')
+        parser.add_argument('--end', help='Last day to rebuild (YYYY-MM-DD), default: newest order')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        start_date = self.parse_date(options['start'])
+        end_date = self.parse_date(options['end'])
+        if start_date and end_date and start_date > end_date:
+            raise CommandError('--start must not be after --end')
+
+        written = DailyProductSales.objects.rebuild(start_date, end_date, batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt daily product sales rollup: {written} rows'))
+
+    def parse_date(self, value):
+        if value is None:
+            return None
+        try:
+            return date.fromisoformat(value)
+        except ValueError:
+            raise CommandError(f'Invalid date: {value}')
@@ -0,0 +1,27 @@
+import time
+from django.core.management.base import BaseCommand
+from base.mail import send_queued_emails
+
+
+class Command(BaseCommand):
+    help = 'Send emails waiting in the outbox (settings.ORDER_EMAIL_MODE = "queued")'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=50, help='Emails sent over one SMTP connection')
+        parser.add_argument('--max-attempts', type=int, default=5, help='Attempts before an email is marked as failed')
+        parser.add_argument('--loop', action='store_true', help='Keep polling the outbox instead of exiting')
+        parser.add_argument('--interval', type=float, default=5, help='Seconds between polls of an empty outbox')
+
+    def handle(self, *args, **options):
+        while True:
+            sent, failed = send_queued_emails(options['batch_size'], options['max_attempts'])
+            if sent or failed:
+                self.stdout.write(f'Sent {sent} emails, {failed} failed')
+
+            if not options['loop']:
+                # Drain the outbox before exiting
+                if sent or failed:
+                    continue
+                break
+            if not (sent or failed):
+                time.sleep(options['interval'])
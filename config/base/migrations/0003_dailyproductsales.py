@@ -0,0 +1,61 @@
+# Generated by Django 5.0.1 on 2026-10-18 08:04
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Sum, F, DecimalField
+from django.db.models.functions import TruncDate
+
+
+def backfill_daily_product_sales(apps, schema_editor):
+    OrderProducts = apps.get_model('base', 'OrderProducts')
+    DailyProductSales = apps.get_model('base', 'DailyProductSales')
+
+    rows = (
+        OrderProducts.objects
+        .annotate(day=TruncDate('order__order_date'))
+        .values('day', 'product_id')
+        .annotate(
+            order_count=Count('id'),
+            total_quantity=Sum('quantity'),
+            revenue=Sum(F('quantity') * F('product__price'), output_field=DecimalField(max_digits=12, decimal_places=2)),
+        )
+    )
+    DailyProductSales.objects.bulk_create(
+        [
+            DailyProductSales(
+                date=row['day'],
+                product_id=row['product_id'],
+                order_count=row['order_count'],
+                quantity=row['total_quantity'],
+                revenue=row['revenue'],
+            )
+            for row in rows
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0002_order_orderproducts'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyProductSales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('order_count', models.PositiveIntegerField(default=0)),
+                ('quantity', models.PositiveIntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='base.product')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='dailyproductsales',
+            constraint=models.UniqueConstraint(fields=('date', 'product'), name='unique_daily_product_sales'),
+        ),
+        migrations.RunPython(backfill_daily_product_sales, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.0.1 on 2026-10-18 08:13
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def merge_duplicate_categories(apps, schema_editor):
+    # Products of duplicated categories are moved to the oldest category with the same name
+    ProductCategory = apps.get_model('base', 'ProductCategory')
+    Product = apps.get_model('base', 'Product')
+
+    duplicates = (
+        ProductCategory.objects
+        .values('name')
+        .annotate(count=Count('id'), keep_id=Min('id'))
+        .filter(count__gt=1)
+    )
+    for duplicate in duplicates:
+        others = ProductCategory.objects.filter(name=duplicate['name']).exclude(id=duplicate['keep_id'])
+        Product.objects.filter(category__in=others).update(category_id=duplicate['keep_id'])
+        others.delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0004_outgoingemail'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_categories, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='productcategory',
+            name='name',
+            field=models.CharField(max_length=100, unique=True),
+        ),
+    ]
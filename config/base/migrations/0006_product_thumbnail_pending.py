@@ -0,0 +1,24 @@
+# Generated by Django 5.0.1 on 2026-10-18 08:15
+
+import base.fields
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0005_productcategory_unique_name'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='thumbnail_pending',
+            field=models.BooleanField(db_index=True, default=False),
+        ),
+        migrations.AlterField(
+            model_name='product',
+            name='thumbnail',
+            field=base.fields.DeferredThumbnailField(blank=True, null=True, upload_to='thumbnails/'),
+        ),
+    ]
@@ -0,0 +1,24 @@
+from django.db import migrations
+from base import search
+
+
+def install_product_search(apps, schema_editor):
+    # Full-text search is SQLite specific, other databases fall back to scanning (see base.search)
+    if search.fts5_supported(schema_editor.connection):
+        search.install(schema_editor.connection)
+
+
+def uninstall_product_search(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        search.uninstall(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0007_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(install_product_search, uninstall_product_search),
+    ]
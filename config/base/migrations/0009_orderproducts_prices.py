@@ -0,0 +1,43 @@
+from django.db import migrations, models
+from django.db.models import F, OuterRef, Subquery
+
+
+def backfill_prices(apps, schema_editor):
+    # Prices of the time existing orders were placed are not known, the current ones are the best guess.
+    # Order totals are left as they were computed when the orders were placed.
+    Product = apps.get_model('base', 'Product')
+    OrderProducts = apps.get_model('base', 'OrderProducts')
+    lines = OrderProducts.objects.using(schema_editor.connection.alias)
+    lines.update(unit_price=Subquery(Product.objects.filter(pk=OuterRef('product_id')).values('price')[:1]))
+    lines.update(line_total=F('unit_price') * F('quantity'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0008_product_search'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='orderproducts',
+            name='unit_price',
+            field=models.DecimalField(blank=True, decimal_places=2, default=0, max_digits=10),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='orderproducts',
+            name='line_total',
+            field=models.DecimalField(blank=True, decimal_places=2, default=0, max_digits=12),
+            preserve_default=False,
+        ),
+        migrations.RunPython(backfill_prices, migrations.RunPython.noop),
+        migrations.RemoveIndex(
+            model_name='orderproducts',
+            name='order_products_covering_idx',
+        ),
+        migrations.AddIndex(
+            model_name='orderproducts',
+            index=models.Index(fields=['order', 'product', 'quantity', 'line_total'], name='order_products_covering_idx'),
+        ),
+    ]
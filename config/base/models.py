@@ -1,13 +1,18 @@
-from django.db import models
-from django_advance_thumbnail import AdvanceThumbnailField
+from django.db import models, transaction
+from django.db.models import F, Q, Case, When, Value, Count, Sum, OuterRef, Subquery
+from django.db.models.functions import TruncDate, Coalesce, Greatest
+from django.conf import settings
+from .fields import DeferredThumbnailField, thumbnails_deferred
 from django.contrib.auth.models import User
-from datetime import timedelta
+from datetime import timedelta, datetime, time
+from functools import reduce
+import operator
 from django.utils import timezone
 
 
 # --- Product Models ---
 class ProductCategory(models.Model):
-    name = models.CharField(max_length=100)
+    name = models.CharField(max_length=100, unique=True)
 
     def __str__(self) -> str:
         return self.name
@@ -19,17 +24,72 @@ class Product(models.Model):
     price = models.DecimalField(max_digits=10, decimal_places=2)
     category = models.ForeignKey("base.ProductCategory", on_delete=models.CASCADE)
     image = models.ImageField(default='default.jpg', upload_to='products_pics/')
-    thumbnail = AdvanceThumbnailField(source_field='image', 
-                                      upload_to='thumbnails/', 
-                                      null=True, 
-                                      blank=True, 
-                                      size=(200, 200))
+    thumbnail = DeferredThumbnailField(source_field='image', 
+                                       upload_to='thumbnails/', 
+                                       null=True, 
+                                       blank=True, 
+                                       size=(200, 200))
+    # Thumbnail waits for the generate_thumbnails worker
+    thumbnail_pending = models.BooleanField(default=False, db_index=True)
+
+    class Meta:
+        # Filters and ordering of the product list, id makes keyset pagination index-only
+        indexes = [
+            models.Index(fields=['name', 'id'], name='product_name_idx'),
+            models.Index(fields=['price', 'id'], name='product_price_idx'),
+            models.Index(fields=['description'], name='product_description_idx'),
+        ]
+
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Image name as loaded from the database, so save() can tell whether the image changed and needs a new thumbnail
+        instance._stored_image = instance.image.name if 'image' in field_names else None
+        return instance
+
+
+    def image_changed(self):
+        return self._state.adding or self.image.name != getattr(self, '_stored_image', None)
+
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        # Saves of the thumbnail itself or of other fields do not need a new one
+        if thumbnails_deferred() and (update_fields is None or 'image' in update_fields) and self.image_changed():
+            # Serve a placeholder until the worker generates the thumbnail
+            if not self.thumbnail:
+                self.thumbnail = settings.THUMBNAIL_PLACEHOLDER
+            self.thumbnail_pending = True
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, 'thumbnail', 'thumbnail_pending'}
+
+        super().save(*args, **kwargs)
+        self._stored_image = self.image.name
+
 
     def __str__(self) -> str:
         return self.name
 
 
 # --- Order Models ---
+class OrderQuerySet(models.QuerySet):
+    def update_totals(self):
+        '''
+        Set total_price of the orders to the sum of their line totals with a single UPDATE
+        '''
+        totals = (
+            OrderProducts.objects
+            .filter(order=OuterRef('pk'))
+            .order_by()
+            .values('order')
+            .annotate(total=Sum('line_total'))
+            .values('total')
+        )
+        total_price = self.model._meta.get_field('total_price')
+        return self.update(total_price=Coalesce(Subquery(totals), Value(0), output_field=total_price))
+
+
 class Order(models.Model):
     PAYMENT_STATUS_PENDING = 'P'
     PAYMENT_STATUS_COMPLETE = 'C'
@@ -51,14 +111,26 @@ class Order(models.Model):
     payment_date = models.DateTimeField(null=True, blank=True)
     total_price = models.DecimalField(max_digits=10, decimal_places=2, default=0, null=True, blank=True)
 
+    objects = OrderQuerySet.as_manager()
 
-    def save(self, *args, **kwargs):
+    class Meta:
+        # Date range scans of the order statistics
+        indexes = [
+            models.Index(fields=['order_date'], name='order_date_idx'),
+        ]
+
+
+    def set_dates(self):
         # Set order_date if not already set
         if not self.order_date:
             self.order_date = timezone.now()
         # Set payment_date to order_date + 5 days
         self.payment_date = self.order_date + timedelta(days=5)
 
+
+    def save(self, *args, **kwargs):
+        self.set_dates()
+
         super().save(*args, **kwargs)
 
 
@@ -70,6 +142,219 @@ class OrderProducts(models.Model):
     product = models.ForeignKey("base.Product", on_delete=models.CASCADE)
     order = models.ForeignKey("base.Order", on_delete=models.CASCADE)
     quantity = models.PositiveIntegerField(default = 1)
+    # Price of the product when the order was placed - later price changes do not alter past orders
+    unit_price = models.DecimalField(max_digits=10, decimal_places=2, blank=True)
+    line_total = models.DecimalField(max_digits=12, decimal_places=2, blank=True)
+
+    class Meta:
+        # Covers the raw statistics queries - lines of orders are grouped by product without reading the table
+        indexes = [
+            models.Index(fields=['order', 'product', 'quantity', 'line_total'], name='order_products_covering_idx'),
+        ]
+
+
+    def set_prices(self):
+        # Current price of the product for new lines
+        if self.unit_price is None:
+            self.unit_price = self.product.price
+        self.line_total = self.unit_price * self.quantity
+
+
+    def save(self, *args, **kwargs):
+        self.set_prices()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            kwargs['update_fields'] = {*update_fields, 'unit_price', 'line_total'}
+
+        super().save(*args, **kwargs)
+
+
+    def __str__(self) -> str:
+        return f"Order nr {self.order.id}, Products nr {self.product.id}, quantity: {self.quantity}"
+
+
+# --- Statistics Models ---
+def day_start(day):
+    # Aware datetime of midnight starting the given day in the current time zone
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+# Rows incremented by one UPDATE of the rollup - every row binds 9 parameters,
+# SQLite limits the number of parameters of a statement
+ROLLUP_BATCH_SIZE = 100
+
+
+class DailyProductSalesManager(models.Manager):
+    def record_orders(self, orders):
+        '''
+        Add lines of orders (list of (Order, [OrderProducts])) to the rollup of the order days.
+        '''
+        # Sum up lines per day and product
+        totals = {}
+        for order, lines in orders:
+            day = timezone.localdate(order.order_date)
+            for line in lines:
+                count, quantity, revenue = totals.get((day, line.product_id), (0, 0, 0))
+                totals[(day, line.product_id)] = (
+                    count + 1,
+                    quantity + line.quantity,
+                    revenue + line.line_total,
+                )
+        self.add_totals(totals)
+
+
+    def add_totals(self, totals):
+        '''
+        Add totals ({(day, product_id): (order lines, quantity, revenue)}) to the rollup, negative values
+        remove edited or deleted lines. Existing rows are incremented with one UPDATE per ROLLUP_BATCH_SIZE rows,
+        missing ones are bulk inserted and rows left without lines are deleted.
+        '''
+        totals = {key: values for key, values in totals.items() if any(values)}
+        keys = list(totals)
+        with transaction.atomic():
+            for start in range(0, len(keys), ROLLUP_BATCH_SIZE):
+                self._add_batch({key: totals[key] for key in keys[start:start + ROLLUP_BATCH_SIZE]})
+
+
+    def _add_batch(self, totals):
+        products_per_day = {}
+        for day, product_id in totals:
+            products_per_day.setdefault(day, []).append(product_id)
+
+        rows = self.filter(reduce(operator.or_, (
+            Q(date=day, product_id__in=product_ids) for day, product_ids in products_per_day.items()
+        )))
+        existing = set(rows.values_list('date', 'product_id'))
+
+        if existing:
+            def increment(field, index):
+                output_field = self.model._meta.get_field(field)
+                added = Case(
+                    *[
+                        When(date=day, product_id=product_id, then=Value(totals[(day, product_id)][index]))
+                        for day, product_id in existing
+                    ],
+                    default=Value(0),
+                    output_field=output_field,
+                )
+                # Never below zero, even if the rollup was out of date
+                return Greatest(F(field) + added, Value(0), output_field=output_field)
+
+            rows.update(
+                order_count=increment('order_count', 0),
+                quantity=increment('quantity', 1),
+                revenue=increment('revenue', 2),
+            )
+            if any(totals[key][0] < 0 for key in existing):
+                rows.filter(order_count=0).delete()
+
+        self.bulk_create([
+            self.model(
+                date=day,
+                product_id=product_id,
+                order_count=count,
+                quantity=quantity,
+                revenue=revenue,
+            )
+            for (day, product_id), (count, quantity, revenue) in totals.items()
+            if (day, product_id) not in existing and count > 0
+        ])
+
+
+    def rebuild(self, start_date=None, end_date=None, batch_size=1000):
+        '''
+        Recompute the rollup from raw order lines for days between start_date and end_date (inclusive).
+        Without dates the whole table is rebuilt. Returns number of written rows.
+        '''
+        rows = self.all()
+        lines = OrderProducts.objects.all()
+        if start_date is not None:
+            rows = rows.filter(date__gte=start_date)
+            lines = lines.filter(order__order_date__gte=day_start(start_date))
+        if end_date is not None:
+            rows = rows.filter(date__lte=end_date)
+            lines = lines.filter(order__order_date__lt=day_start(end_date + timedelta(days=1)))
+
+        aggregated = (
+            lines
+            .annotate(day=TruncDate('order__order_date'))
+            .values('day', 'product_id')
+            .annotate(
+                total_count=Count('id'),
+                total_quantity=Sum('quantity'),
+                total_revenue=Sum('line_total'),
+            )
+            .order_by()
+        )
+
+        with transaction.atomic():
+            rows.delete()
+            created = self.bulk_create(
+                [
+                    self.model(
+                        date=row['day'],
+                        product_id=row['product_id'],
+                        order_count=row['total_count'],
+                        quantity=row['total_quantity'],
+                        revenue=row['total_revenue'],
+                    )
+                    for row in aggregated.iterator()
+                ],
+                batch_size=batch_size,
+            )
+        return len(created)
+
+
+class DailyProductSales(models.Model):
+    date = models.DateField()
+    product = models.ForeignKey("base.Product", on_delete=models.CASCADE)
+    order_count = models.PositiveIntegerField(default=0)
+    quantity = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+
+    objects = DailyProductSalesManager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'product'], name='unique_daily_product_sales'),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.date}, Products nr {self.product_id}, quantity: {self.quantity}"
+
+
+
+# --- Email Models ---
+class OutgoingEmail(models.Model):
+    STATUS_PENDING = 'P'
+    STATUS_SENT = 'S'
+    STATUS_FAILED = 'F'
+
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Pending'),
+        (STATUS_SENT, 'Sent'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    from_email = models.EmailField()
+    # Comma separated list of recipients
+    to = models.TextField()
+    status = models.CharField(max_length=1, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='outgoing_email_queue_idx'),
+        ]
+
+    def recipients(self):
+        return [address for address in self.to.split(',') if address]
 
     def __str__(self) -> str:
-        return f"Order nr {self.order.id}, Products nr {self.product.id}, quantity: {self.quantity}"
\ No newline at end of file
+        return f"{self.subject} to {self.to} ({self.get_status_display()})"
@@ -0,0 +1,38 @@
+from django.db import connections, DEFAULT_DB_ALIAS
+
+
+class ReadReplicaRouter:
+    '''
+    Sends reads of the product catalog and of order statistics to the read-only 'replica' connection,
+    all writes (and every other read) go to the primary connection.
+    '''
+    replica = 'replica'
+    # (app label, model name) of models read from the replica
+    replica_models = {
+        ('base', 'product'),
+        ('base', 'productcategory'),
+        ('base', 'order'),
+        ('base', 'orderproducts'),
+        ('base', 'dailyproductsales'),
+    }
+
+    def db_for_read(self, model, **hints):
+        if (model._meta.app_label, model._meta.model_name) not in self.replica_models:
+            return None
+        # Reads inside a transaction of the primary must see its uncommitted writes
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return self.replica
+
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Both connections use the same database
+        return True
+
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
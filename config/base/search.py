@@ -0,0 +1,126 @@
+import re
+from django.db import connections, DEFAULT_DB_ALIAS
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+
+# SQLite FTS5 index over Product.name and Product.description.
+# The external content table is base_product, triggers keep the index in sync with every write
+# (including bulk operations and raw SQL).
+FTS_TABLE = 'base_product_fts'
+
+INSTALL_SQL = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        name, description, content='base_product', content_rowid='id'
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_insert AFTER INSERT ON base_product BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, name, description) VALUES (new.id, new.name, new.description);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_delete AFTER DELETE ON base_product BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, description) VALUES ('delete', old.id, old.name, old.description);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_update AFTER UPDATE OF name, description ON base_product BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, description) VALUES ('delete', old.id, old.name, old.description);
+        INSERT INTO {FTS_TABLE}(rowid, name, description) VALUES (new.id, new.name, new.description);
+    END""",
+]
+
+UNINSTALL_SQL = [
+    f'DROP TRIGGER IF EXISTS {FTS_TABLE}_insert',
+    f'DROP TRIGGER IF EXISTS {FTS_TABLE}_delete',
+    f'DROP TRIGGER IF EXISTS {FTS_TABLE}_update',
+    f'DROP TABLE IF EXISTS {FTS_TABLE}',
+]
+
+MATCH_SQL = f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s'
+# bm25 is lower for better matches
+RANK_SQL = f'SELECT bm25({FTS_TABLE}) FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s AND rowid = base_product.id'
+
+
+def fts5_supported(connection):
+    if connection.vendor != 'sqlite':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT sqlite_compileoption_used('ENABLE_FTS5')")
+        if cursor.fetchone()[0]:
+            return True
+        # Builds may ship FTS5 without reporting the compile option
+        try:
+            cursor.execute('CREATE VIRTUAL TABLE temp.fts5_probe USING fts5(value)')
+            cursor.execute('DROP TABLE temp.fts5_probe')
+            return True
+        except Exception:
+            return False
+
+
+def install(connection, rebuild=True):
+    '''
+    Create the index with its triggers (idempotent) and optionally refill it from base_product.
+    Run again after migrations which rebuild base_product on SQLite, as that drops the triggers.
+    '''
+    with connection.cursor() as cursor:
+        for sql in INSTALL_SQL:
+            cursor.execute(sql)
+        if rebuild:
+            cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+    _available.clear()
+
+
+def uninstall(connection):
+    with connection.cursor() as cursor:
+        for sql in UNINSTALL_SQL:
+            cursor.execute(sql)
+    _available.clear()
+
+
+# Database alias -> whether the index exists, checked once per process
+_available = {}
+
+
+def search_available(using=DEFAULT_DB_ALIAS):
+    if using not in _available:
+        connection = connections[using]
+        _available[using] = connection.vendor == 'sqlite' and FTS_TABLE in connection.introspection.table_names()
+    return _available[using]
+
+
+def terms(text):
+    # Words of the query - punctuation is dropped, so user input cannot inject FTS5 syntax
+    return re.findall(r'\w+', text)
+
+
+def match_expression(text):
+    '''
+    FTS5 query matching products containing all words, the last one as a prefix ("lapt" -> laptop)
+    '''
+    words = terms(text)
+    phrases = [f'"{word}"' for word in words]
+    if phrases:
+        phrases[-1] += '*'
+    return ' '.join(phrases)
+
+
+def search_products(queryset, text, rank=True):
+    '''
+    Filter products by keywords in name and description.
+    Uses the FTS5 index ordered by bm25 when available, otherwise case-insensitive scanning.
+    '''
+    words = terms(text)
+    if not words:
+        return queryset.none()
+
+    if search_available(queryset.db):
+        match = match_expression(text)
+        queryset = queryset.filter(id__in=RawSQL(MATCH_SQL, (match,)))
+        if rank:
+            queryset = queryset.annotate(search_rank=RawSQL(RANK_SQL, (match,))).order_by('search_rank', '-id')
+        return queryset
+
+    return scan_products(queryset, words)
+
+
+def scan_products(queryset, words):
+    # Fallback for other databases - every word in name or description
+    for word in words:
+        queryset = queryset.filter(Q(name__icontains=word) | Q(description__icontains=word))
+    return queryset
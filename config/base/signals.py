@@ -0,0 +1,109 @@
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db.backends.signals import connection_created
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+from django.utils import timezone
+from .mail import get_sender_email
+from .models import Order, OrderProducts, DailyProductSales
+
+
+@receiver([post_save, post_delete], sender=User)
+def clear_sender_email(sender, instance, **kwargs):
+    # The confirmation sender address is taken from the admin account
+    if instance.username == "admin":
+        get_sender_email.cache_clear()
+
+
+@receiver([post_save, post_delete], sender=OrderProducts)
+def update_order_total(sender, instance, **kwargs):
+    # Lines edited after the order was placed (e.g. in the admin panel)
+    Order.objects.filter(pk=instance.order_id).update_totals()
+
+
+# --- Daily sales rollup of edited orders ---
+# Orders placed through the API are bulk inserted and recorded by DailyProductSales.objects.record_orders,
+# lines and orders saved or deleted one by one (e.g. in the admin panel) are applied as deltas here
+def add_line(totals, order_date, product_id, quantity, line_total, sign):
+    key = (timezone.localdate(order_date), product_id)
+    count, total_quantity, revenue = totals.get(key, (0, 0, 0))
+    totals[key] = (count + sign, total_quantity + sign * quantity, revenue + sign * line_total)
+
+
+def order_date_of(line):
+    return Order.objects.filter(pk=line.order_id).values_list('order_date', flat=True).first()
+
+
+@receiver(pre_save, sender=OrderProducts)
+def remember_order_line(sender, instance, raw=False, **kwargs):
+    # Stored line, replaced in the rollup after saving
+    instance._stored_line = None
+    if instance.pk is not None and not raw:
+        instance._stored_line = (
+            sender.objects.filter(pk=instance.pk)
+            .values_list('order_id', 'order__order_date', 'product_id', 'quantity', 'line_total')
+            .first()
+        )
+
+
+@receiver(post_save, sender=OrderProducts)
+def update_line_sales(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    totals = {}
+    stored = getattr(instance, '_stored_line', None)
+    if stored is not None:
+        order_id, order_date, *line = stored
+        add_line(totals, order_date, *line, -1)
+    if stored is None or order_id != instance.order_id:
+        order_date = order_date_of(instance)
+    add_line(totals, order_date, instance.product_id, instance.quantity, instance.line_total, 1)
+    DailyProductSales.objects.add_totals(totals)
+
+
+@receiver(post_delete, sender=OrderProducts)
+def remove_line_sales(sender, instance, **kwargs):
+    # Lines of a deleted order are deleted before the order itself
+    order_date = order_date_of(instance)
+    if order_date is None:
+        return
+    totals = {}
+    add_line(totals, order_date, instance.product_id, instance.quantity, instance.line_total, -1)
+    DailyProductSales.objects.add_totals(totals)
+
+
+@receiver(pre_save, sender=Order)
+def remember_order_date(sender, instance, raw=False, update_fields=None, **kwargs):
+    instance._stored_order_date = None
+    if instance.pk is not None and not raw and (update_fields is None or 'order_date' in update_fields):
+        instance._stored_order_date = sender.objects.filter(pk=instance.pk).values_list('order_date', flat=True).first()
+
+
+@receiver(post_save, sender=Order)
+def move_order_sales(sender, instance, raw=False, **kwargs):
+    # Lines of an order moved to another day are moved in the rollup too
+    stored = getattr(instance, '_stored_order_date', None)
+    if raw or stored is None or timezone.localdate(stored) == timezone.localdate(instance.order_date):
+        return
+    totals = {}
+    for product_id, quantity, line_total in instance.orderproducts_set.values_list('product_id', 'quantity', 'line_total'):
+        add_line(totals, stored, product_id, quantity, line_total, -1)
+        add_line(totals, instance.order_date, product_id, quantity, line_total, 1)
+    DailyProductSales.objects.add_totals(totals)
+
+
+def read_only(connection):
+    return 'mode=ro' in str(connection.settings_dict['NAME'])
+
+
+@receiver(connection_created)
+def configure_sqlite(sender, connection, **kwargs):
+    # Tuning pragmas of settings.SQLITE_PRAGMAS on every new connection
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for name, value in getattr(settings, 'SQLITE_PRAGMAS', {}).items():
+            # Journal mode is stored in the database file, only the primary connection can set it
+            if name == 'journal_mode' and read_only(connection):
+                continue
+            cursor.execute(f'PRAGMA {name} = {value}')
@@ -0,0 +1,109 @@
+import io
+import os
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.dispatch import Signal
+from PIL import Image
+from .models import Product
+
+
+# Formats which cannot store an alpha channel
+RGB_FORMATS = {'JPEG', 'BMP'}
+
+# Sent once per batch with saved thumbnails, which bypass Product.save() and its signals
+thumbnails_saved = Signal()
+
+
+def render_thumbnail(source, sizes, image_format=None):
+    '''
+    Resize image bytes to every (width, height) in sizes, keeping the aspect ratio.
+    Pure function run in worker processes. Returns (format, [bytes for each size]).
+    '''
+    with Image.open(io.BytesIO(source)) as image:
+        image.load()
+        image_format = (image_format or image.format or 'JPEG').upper()
+        if image_format in RGB_FORMATS and image.mode not in ('RGB', 'L'):
+            image = image.convert('RGB')
+
+        thumbnails = []
+        for size in sizes:
+            thumbnail = image.copy()
+            thumbnail.thumbnail(size)
+            output = io.BytesIO()
+            thumbnail.save(output, format=image_format)
+            thumbnails.append(output.getvalue())
+    return image_format, thumbnails
+
+
+def thumbnail_names(image_name, image_format, sizes):
+    '''
+    Storage names of thumbnails of an image: thumbnails/<name>_<width>x<height>.<ext>
+    '''
+    name = os.path.splitext(os.path.basename(image_name))[0]
+    extension = 'jpg' if image_format == 'JPEG' else image_format.lower()
+    return [f'thumbnails/{name}_{width}x{height}.{extension}' for width, height in sizes]
+
+
+def read_image(product):
+    with default_storage.open(product.image.name, 'rb') as file:
+        return file.read()
+
+
+def save_thumbnails(product, image_format, thumbnails, sizes):
+    names = thumbnail_names(product.image.name, image_format, sizes)
+    for name, content in zip(names, thumbnails):
+        # Regenerated thumbnails replace the previous files
+        if default_storage.exists(name):
+            default_storage.delete(name)
+        default_storage.save(name, ContentFile(content))
+
+    # Update only the thumbnail columns - bypasses save() and the catalog signals
+    updated = Product.objects.filter(pk=product.pk, image=product.image.name).update(
+        thumbnail=names[0],
+        thumbnail_pending=False,
+    )
+    return updated
+
+
+def generate_thumbnails(products, pool=None, sizes=None, image_format=None):
+    '''
+    Generate thumbnails of products, in a ProcessPoolExecutor when given, otherwise in this process.
+    Products whose image changed in the meantime stay pending. Returns (generated, failed).
+    '''
+    sizes = sizes or settings.THUMBNAIL_SIZES
+    image_format = image_format or settings.THUMBNAIL_FORMAT
+
+    # Images are read and thumbnails stored here, worker processes only run Pillow
+    jobs = []
+    failed = 0
+    for product in products:
+        try:
+            jobs.append((product, read_image(product)))
+        except OSError:
+            failed += 1
+
+    sources = [source for _, source in jobs]
+    if pool is None:
+        results = map(run_job, sources, [sizes] * len(jobs), [image_format] * len(jobs))
+    else:
+        results = pool.map(run_job, sources, [sizes] * len(jobs), [image_format] * len(jobs))
+
+    generated = 0
+    for (product, _), result in zip(jobs, results):
+        if result is None:
+            failed += 1
+            continue
+        result_format, thumbnails = result
+        generated += save_thumbnails(product, result_format, thumbnails, sizes)
+    if generated:
+        thumbnails_saved.send(sender=Product, count=generated)
+    return generated, failed
+
+
+def run_job(source, sizes, image_format):
+    # Invalid images are reported instead of stopping the whole batch
+    try:
+        return render_thumbnail(source, sizes, image_format)
+    except (OSError, ValueError, Image.DecompressionBombError):
+        return None
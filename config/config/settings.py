@@ -57,11 +57,54 @@ INSTALLED_APPS = [
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework.authentication.TokenAuthentication',
+        'api.authentication.CachedTokenAuthentication',
     ),
+    # Uses orjson when it is installed (optional)
+    'DEFAULT_RENDERER_CLASSES': (
+        'api.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
+}
+
+# Token -> user cache of api.authentication.CachedTokenAuthentication
+TOKEN_AUTH_CACHE = {
+    'MAX_SIZE': 10000,
+    'TIMEOUT': 60,
+    'USE_DJANGO_CACHE': False,
+}
+
+# Cache of API responses, statistics, group names and the version keys invalidating them (api.caching).
+# The default local memory cache is private to every worker process: a change clears only the cache of the
+# worker handling it, the other workers serve their entries until they expire. Set CACHE_BACKEND and
+# CACHE_LOCATION to share one cache between the workers, e.g. django.core.cache.backends.redis.RedisCache
+# (needs the redis package) with redis://127.0.0.1:6379 or django.core.cache.backends.filebased.FileBasedCache
+# with a directory - cached entries are then kept longer.
+LOCAL_CACHE_BACKEND = 'django.core.cache.backends.locmem.LocMemCache'
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv("CACHE_BACKEND", LOCAL_CACHE_BACKEND),
+        'LOCATION': os.getenv("CACHE_LOCATION", ""),
+    }
 }
+CACHE_SHARED = CACHES['default']['BACKEND'] != LOCAL_CACHE_BACKEND
+
+# Seconds cached product/category responses and statistics of past periods may be served by other workers
+# after a change, when the cache is not shared
+RESPONSE_CACHE_TIMEOUT = 60 * 60 if CACHE_SHARED else 60
+STATISTICS_CLOSED_CACHE_TIMEOUT = 7 * 24 * 60 * 60 if CACHE_SHARED else 60
+
+# Category name -> category cache of product serializers and filters (api.serializers.category_cache).
+# Entries belong to a catalog version, without a shared cache other workers may resolve a renamed or deleted
+# category from their own entries for at most this many seconds
+CATEGORY_CACHE_TIMEOUT = 5 * 60 if CACHE_SHARED else 60
+
+# Group names of a user are cached for permission checks. Without a shared cache, other workers
+# keep the old groups of a changed membership for at most this many seconds
+GROUPS_CACHE_TIMEOUT = 60 * 60 if CACHE_SHARED else 5
 
 MIDDLEWARE = [
+    # First, so the time of the other middleware is measured too
+    'api.middleware.PerformanceMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -98,13 +141,52 @@ WSGI_APPLICATION = 'config.wsgi.application'
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        # SQLITE_PATH selects another database file, e.g. a generated dataset (generate_data)
+        'NAME': os.getenv("SQLITE_PATH", BASE_DIR / 'db.sqlite3'),
         'TEST': {
             'NAME': 'testdb.sqlite3',
         },
     },
 }
 
+# PRAGMA name -> value set on every new SQLite connection (see base.signals)
+SQLITE_PRAGMAS = {}
+
+# Tuning of the production profile
+SQLITE_PRODUCTION_PRAGMAS = {
+    # Readers do not block the writer and the writer does not block readers
+    'journal_mode': 'WAL',
+    # Durable at checkpoints, no fsync on every commit (safe with WAL)
+    'synchronous': 'NORMAL',
+    # Wait for the write lock (ms) instead of failing with "database is locked"
+    'busy_timeout': 5000,
+    'mmap_size': 256 * 1024 * 1024,
+    # Negative - size in KiB
+    'cache_size': -64 * 1024,
+    'temp_store': 'MEMORY',
+}
+
+# Database profile: 'default' or 'production' - WAL with tuned pragmas, persistent connections
+# and a read-only connection for catalog and statistics reads (base.routers.ReadReplicaRouter)
+DB_PROFILE = os.getenv("DB_PROFILE", "default")
+assert DB_PROFILE in ("default", "production"), "DB_PROFILE must be 'default' or 'production'"
+
+if DB_PROFILE == "production":
+    SQLITE_PRAGMAS = SQLITE_PRODUCTION_PRAGMAS
+    DATABASES['default'].update({
+        'CONN_MAX_AGE': 600,
+        'CONN_HEALTH_CHECKS': True,
+    })
+    # The same file opened read-only, WAL readers always see the last committed data
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'NAME': f"file:{DATABASES['default']['NAME']}?mode=ro",
+        'TEST': {
+            'MIRROR': 'default',
+        },
+    }
+    DATABASE_ROUTERS = ['base.routers.ReadReplicaRouter']
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
@@ -150,4 +232,38 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 MEDIA_URL = '/media/'
 
+# Product thumbnails: 'inline' generates them while saving the product,
+# 'deferred' saves a placeholder and leaves the work to the generate_thumbnails worker
+THUMBNAIL_MODE = os.getenv("THUMBNAIL_MODE", "inline")
+assert THUMBNAIL_MODE in ("inline", "deferred"), "THUMBNAIL_MODE must be 'inline' or 'deferred'"
+THUMBNAIL_PLACEHOLDER = 'default.jpg'
+# Sizes generated by the worker - the first one is stored in Product.thumbnail
+THUMBNAIL_SIZES = [(200, 200)]
+# Output format of the worker (e.g. 'WEBP'), None keeps the format of the source image
+THUMBNAIL_FORMAT = None
+
+# Maximum number of orders accepted by the batch order endpoint
+ORDER_BATCH_MAX_SIZE = 100
+
+# Async views for product list / details and order placement, for deployments under ASGI
+# (e.g. uvicorn config.asgi:application)
+ASYNC_VIEWS = os.getenv("ASYNC_VIEWS", "FALSE") == "TRUE"
+
+# Order statistics of periods including the present are cached for this many seconds
+# (and until a new order is placed), statistics of past periods until orders are edited
+STATISTICS_OPEN_CACHE_TIMEOUT = 30
+# Cache-Control max-age of statistics responses for past periods
+STATISTICS_CLOSED_MAX_AGE = 60 * 60
+
+# Server-Timing header (db, render, app, total) on every response of api.middleware.PerformanceMiddleware
+PERFORMANCE_SERVER_TIMING = True
+# Requests slower than this many seconds are logged with their SQL to the 'api.performance' logger,
+# None turns the log (and collecting the SQL of every request) off
+SLOW_REQUEST_THRESHOLD = float(os.environ["SLOW_REQUEST_THRESHOLD"]) if os.getenv("SLOW_REQUEST_THRESHOLD") else None
+
 EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
+
+# Order confirmation emails: 'inline' sends during the request,
+# 'queued' stores them in the outbox for the send_queued_emails worker
+ORDER_EMAIL_MODE = os.getenv("ORDER_EMAIL_MODE", "inline")
+assert ORDER_EMAIL_MODE in ("inline", "queued"), "ORDER_EMAIL_MODE must be 'inline' or 'queued'"
@@ -1,18 +1,57 @@
-from rest_framework.test import APITestCase, override_settings
+from rest_framework.test import APITestCase, APIRequestFactory, override_settings
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import AuthenticationFailed
 from django.urls import reverse
+from django.conf import settings
+from django.core import mail
+from django.core.mail.backends.base import BaseEmailBackend
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.cache import cache
+from django.contrib.auth.models import User, Group
+from django.core.management import call_command
+from django.utils import timezone
 from rest_framework import status
 from collections import defaultdict
+import base64
+import csv
 import json
+from io import StringIO
 import tempfile
+from smtplib import SMTPException
+import time
 from pathlib import Path
+from PIL import Image
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
+from base.mail import send_queued_emails
+from base.models import Product, ProductCategory, Order, OrderProducts, DailyProductSales, OutgoingEmail
+from api.permissions import IsVendor, IsCustomer
+from api.authentication import CachedTokenAuthentication, token_cache
+from api.serializers import ProductSerializer, ProductCompactSerializer, category_cache
+from api.values import ValuesSerializer
+from api.caching import bump_catalog_version
+from api.renderers import FastJSONRenderer
 
 
 
+class FailingEmailBackend(BaseEmailBackend):
+    # Unreachable SMTP server
+    def send_messages(self, email_messages):
+        raise SMTPException('Connection unexpectedly closed')
+
+
 class ProductTestCase(APITestCase):
     def setUp(self):
         '''
         Load credentials for Users and get authentication tokens to check permissions
         '''
+        # Start without cached responses
+        cache.clear()
+        self.addCleanup(cache.clear)
+
         # Load credentials for users
         with open('credentials.json', 'r') as file:
             credentials = json.loads(file.read())["Credentials"]
@@ -43,6 +82,56 @@ class ProductTestCase(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
 
 
+    def test_list_product_cursor_pagination(self):
+        '''
+        Keyset (cursor) pagination walks every ordering forwards and backwards without gaps or duplicates
+        - Access: all users, even not logged in
+        '''
+        url = reverse('product-list')
+        expected = {
+            'price': list(Product.objects.order_by('price', 'id').values_list('id', flat=True)),
+            '-name': list(Product.objects.order_by('-name', '-id').values_list('id', flat=True)),
+            'category': list(Product.objects.order_by('category', 'id').values_list('id', flat=True)),
+            None: list(Product.objects.order_by('-id').values_list('id', flat=True)),
+        }
+        for ordering, ids in expected.items():
+            params = {'pagination': 'cursor', 'page_size': 4}
+            if ordering:
+                params['ordering'] = ordering
+            response = self.client.get(url, params)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertNotIn('count', response.json())
+            self.assertIsNone(response.json()['previous'])
+
+            pages = [response.json()]
+            while pages[-1]['next']:
+                pages.append(self.client.get(pages[-1]['next']).json())
+            self.assertEqual([product['id'] for page in pages for product in page['results']], ids)
+
+            # Going back from the last page returns the previous one
+            previous = self.client.get(pages[-1]['previous']).json()
+            self.assertEqual(previous['results'], pages[-2]['results'])
+
+        response = self.client.get(url, {'cursor': 'invalid'})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+        # Tampered cursor values are rejected
+        def cursor(value):
+            data = json.dumps({'v': value, 'id': 1, 'r': False})
+            return base64.urlsafe_b64encode(data.encode()).decode()
+
+        for ordering, value in [('price', None), ('price', 'abc'), ('category', 'abc'), ('price', [1]), ('name', None)]:
+            with self.subTest(ordering=ordering, value=value):
+                response = self.client.get(url, {'ordering': ordering, 'cursor': cursor(value)})
+                self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+        # Relevance order of search results has no cursor position
+        response = self.client.get(url, {'pagination': 'cursor', 'search': 'laptop'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.get(url, {'pagination': 'cursor', 'search': 'laptop', 'ordering': 'price'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+
     def test_retrieve_product(self):
         '''
         Display the details of the indicated product (pk/id)
@@ -54,6 +143,41 @@ class ProductTestCase(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
 
 
+    def test_product_response_cache(self):
+        '''
+        Product list and details are served from cache, revalidated with ETag/Last-Modified
+        and invalidated by product changes
+        - Access: all users, even not logged in
+        '''
+        url = reverse('product-list')
+        response = self.client.get(url, {'ordering': 'price', 'page_size': 3})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        etag = response['ETag']
+        self.assertTrue(response.has_header('Last-Modified'))
+
+        # Same URL is answered without touching the database
+        with self.assertNumQueries(0):
+            cached = self.client.get(url, {'page_size': 3, 'ordering': 'price'})
+        self.assertEqual(cached.content, response.content)
+
+        # Bodies hold absolute links - other hosts are cached separately
+        with override_settings(ALLOWED_HOSTS=['testserver', 'shop.example.com']):
+            other = self.client.get(url, {'ordering': 'price', 'page_size': 3}, HTTP_HOST='shop.example.com')
+        self.assertTrue(other.json()['next'].startswith('http://shop.example.com/'))
+
+        # Conditional request
+        response = self.client.get(url, {'ordering': 'price', 'page_size': 3}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        # Changing a category invalidates cached responses
+        category = ProductCategory.objects.get(name='Laptops')
+        category.name = 'Notebooks'
+        category.save()
+        response = self.client.get(url, {'ordering': 'price', 'page_size': 3}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()['results'][0]['category'], 'Notebooks')
+
+
     @override_settings(MEDIA_ROOT=Path(tempfile.gettempdir()))
     def test_create_product(self):
         '''
@@ -94,6 +218,61 @@ class ProductTestCase(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
 
 
+    def test_deferred_thumbnails(self):
+        '''
+        In deferred mode a product is saved with a placeholder thumbnail,
+        generated later in worker processes in all configured sizes
+        - Access: vendor
+        '''
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        thumbnail_settings = self.settings(
+            MEDIA_ROOT=media_root.name,
+            THUMBNAIL_MODE='deferred',
+            THUMBNAIL_SIZES=[(200, 200), (64, 64)],
+            THUMBNAIL_FORMAT='WEBP',
+        )
+        thumbnail_settings.enable()
+        self.addCleanup(thumbnail_settings.disable)
+
+        headers = {
+            'Authorization': f'Token {self.users.get("vendor")}'
+        }
+        with open('media/default.jpg', 'rb') as image:
+            data = {
+                'name': 'Laptop Asus',
+                'description': 'Laptop specification',
+                'price': 2500,
+                'category': "Laptops",
+                'image': image
+            }
+            response = self.client.post(reverse('product-list'), data, headers=headers)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        product = Product.objects.get(id=response.json()['id'])
+        self.assertEqual((product.thumbnail.name, product.thumbnail_pending), ('default.jpg', True))
+
+        list_params = {'representation': 'compact', 'ordering': '-id', 'page_size': 1}
+        self.client.get(reverse('product-list'), list_params)
+
+        call_command('generate_thumbnails', '--workers', '2', stdout=StringIO())
+        product.refresh_from_db()
+        self.assertFalse(product.thumbnail_pending)
+        self.assertTrue(product.thumbnail.name.endswith('_200x200.webp'))
+        # Cached responses are invalidated by the batch
+        response = self.client.get(reverse('product-list'), list_params)
+        self.assertTrue(response.json()['results'][0]['thumbnail'].endswith('_200x200.webp'))
+
+        # Saves keeping the image keep the thumbnail
+        product.price = 2600
+        product.save()
+        product.refresh_from_db()
+        self.assertFalse(product.thumbnail_pending)
+        for name in (product.thumbnail.name, product.thumbnail.name.replace('200x200', '64x64')):
+            with Image.open(Path(media_root.name) / name) as thumbnail:
+                self.assertEqual(thumbnail.format, 'WEBP')
+                self.assertLessEqual(max(thumbnail.size), 200)
+
+
     @override_settings(MEDIA_ROOT=Path(tempfile.gettempdir()))
     def test_update_product(self):
         '''
@@ -134,6 +313,256 @@ class ProductTestCase(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
 
     
+    def test_category_resolution_cache(self):
+        '''
+        Category names are resolved from the cache after the first lookup, until the category changes
+        '''
+        field = ProductSerializer().fields['category']
+        category_cache.clear()
+        self.addCleanup(category_cache.clear)
+
+        with self.assertNumQueries(1):
+            laptops = field.to_internal_value('Laptops')
+        with self.assertNumQueries(0):
+            self.assertEqual(field.to_internal_value('Laptops'), laptops)
+
+        # Catalog changed by another worker (version bumped in a shared cache) - looked up again
+        bump_catalog_version()
+        with self.assertNumQueries(1):
+            self.assertEqual(field.to_internal_value('Laptops'), laptops)
+
+        # Renamed category is looked up (and created) again
+        laptops.name = 'Notebooks'
+        laptops.save()
+        category = field.to_internal_value('Laptops')
+        self.assertNotEqual(category.id, laptops.id)
+        self.assertEqual(ProductCategory.objects.filter(name='Laptops').count(), 1)
+
+
+    def test_sparse_fieldsets(self):
+        '''
+        fields= / omit= restrict the returned fields and the loaded columns, compact list representation
+        - Access: all users, even not logged in
+        '''
+        url = reverse('product-list')
+        with self.assertNumQueries(2):
+            response = self.client.get(url, {'fields': 'id,name,price', 'ordering': 'category'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        for product in response.json()['results']:
+            self.assertEqual(set(product), {'id', 'name', 'price'})
+
+        response = self.client.get(reverse('product-detail', args=[13]), {'omit': 'description,image'})
+        self.assertEqual(response.json(), {'id': 13, 'name': 'HP Pavilion x360', 'price': '3669.00', 'category': 'Laptops'})
+
+        # Columns of unused fields are not read
+        products = ProductSerializer.restrict_queryset(
+            Product.objects.select_related('category'), 
+            Request(APIRequestFactory().get(url, {'fields': 'name'}))
+        )
+        self.assertEqual(products.query.deferred_loading, ({'id', 'name'}, False))
+        self.assertFalse(products.query.select_related)
+
+        # Ordering columns are loaded for the cursor, no query per product
+        with self.assertNumQueries(1):
+            response = self.client.get(url, {'representation': 'compact', 'pagination': 'cursor', 'ordering': 'category'})
+        product = response.json()['results'][0]
+        self.assertEqual(set(product), {'id', 'name', 'price', 'thumbnail'})
+        self.assertTrue(product['thumbnail'].startswith('http://testserver/'))
+
+        response = self.client.get(url, {'fields': 'name,secret'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('fields', response.json())
+
+
+    def test_fast_serialization(self):
+        '''
+        List pages built from .values() rows and rendered by FastJSONRenderer
+        are byte for byte the same as ModelSerializer output rendered by JSONRenderer
+        '''
+        url = reverse('product-list')
+        products = Product.objects.select_related('category').order_by('id')
+        for serializer_class, params in (
+            (ProductSerializer, {}),
+            (ProductSerializer, {'omit': 'description'}),
+            (ProductCompactSerializer, {}),
+        ):
+            with self.subTest(serializer=serializer_class.__name__, params=params):
+                context = {'request': Request(APIRequestFactory().get(url, params))}
+                expected = serializer_class(products, many=True, context=context).data
+
+                values_serializer = ValuesSerializer(serializer_class(context=context))
+                data = values_serializer.serialize(products.values(*values_serializer.lookups))
+                self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(expected))
+
+        data = {
+            'price': Decimal('8232.00'),
+            'date': timezone.now(),
+            'name': 'Zażółć\u2028',
+            1: [True, None, 0.1],
+        }
+        self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
+        # Values orjson cannot encode use the stdlib renderer
+        self.assertEqual(FastJSONRenderer().render({'id': 2 ** 70}), b'{"id":1180591620717411303424}')
+        self.assertEqual(
+            FastJSONRenderer().render(data, 'application/json; indent=4'), 
+            JSONRenderer().render(data, 'application/json; indent=4')
+        )
+
+
+    def test_filter_products(self):
+        '''
+        Price range, multi-value category (ids or names) and id filters, name prefix
+        - Access: all users, even not logged in
+        '''
+        url = reverse('product-list')
+
+        def ids(params):
+            response = self.client.get(url, {**params, 'page_size': 100})
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            return {product['id'] for product in response.json()['results']}
+
+        self.assertEqual(ids({'price__gte': 2500, 'price__lte': 3669}), {10, 13, 17})
+        self.assertEqual(ids({'category__in': 'Printers,4'}), {9, 10, 11, 12, 18, 19})
+        self.assertEqual(ids({'category__in': 'Printers,Unknown'}), {18, 19})
+        # Numeric names are matched by name as well as by id
+        # (deferred thumbnail, so no file is written to media/)
+        with self.settings(THUMBNAIL_MODE='deferred'):
+            product = Product.objects.create(
+                name='Calendar printer', description='-', price=10, category=ProductCategory.objects.create(name='2024')
+            )
+        self.assertEqual(ids({'category__in': '2024'}), {product.id})
+        self.assertEqual(ids({'category__in': '2024,4'}), {product.id, 9, 10, 11, 12})
+        self.assertEqual(ids({'id__in': '9,13,15,1000'}), {9, 13, 15})
+        self.assertEqual(ids({'name__startswith': 'Apple iMac'}), {9, 12})
+        self.assertEqual(ids({'name__startswith': 'Lenovo', 'price__lte': 2000}), {14})
+
+        # Category names are resolved from the cache after the first request
+        category_cache.clear()
+        self.addCleanup(category_cache.clear)
+        ids({'category__in': 'Laptops', 'price__gte': 2000})
+        with self.assertNumQueries(2):
+            self.assertEqual(ids({'category__in': 'Laptops', 'price__gte': 2500}), {13, 17})
+
+        response = self.client.get(url, {'id__in': ','.join(str(i) for i in range(101))})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.get(url, {'price__gte': 'cheap'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+    def test_search_products(self):
+        '''
+        Full-text search in names and descriptions, ranked by relevance, the last word matches as a prefix
+        - Access: all users, even not logged in
+        '''
+        url = reverse('product-list')
+        response = self.client.get(url, {'search': 'thinkpad'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual({product['id'] for product in response.json()['results']}, {14, 17})
+
+        # Every word has to match, closer matches come first
+        response = self.client.get(url, {'search': 'apple ima'})
+        self.assertEqual([product['id'] for product in response.json()['results']], [9, 12])
+
+        # Explicit ordering wins over relevance
+        response = self.client.get(url, {'search': 'apple ima', 'ordering': '-price'})
+        expected = Product.objects.filter(id__in=[9, 12]).order_by('-price').values_list('id', flat=True)
+        self.assertEqual([product['id'] for product in response.json()['results']], list(expected))
+
+        # The index follows every write, bulk updates included
+        Product.objects.filter(id=17).update(name='Lenovo Yoga', description='Convertible')
+        # Bulk updates do not send signals, drop cached responses by hand
+        cache.clear()
+        response = self.client.get(url, {'search': 'thinkpad'})
+        self.assertEqual([product['id'] for product in response.json()['results']], [14])
+        response = self.client.get(url, {'search': 'yoga'})
+        self.assertEqual([product['id'] for product in response.json()['results']], [17])
+
+        # Query syntax is not passed to the index
+        response = self.client.get(url, {'search': 'thinkpad" -(*'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([product['id'] for product in response.json()['results']], [14])
+
+    
+    def test_import_products(self):
+        '''
+        Bulk create and update of products from CSV and JSON Lines files -> per-row error report
+        - Access: vendor
+        '''
+        url = reverse('product-import')
+        vendor_token, customer_token = self.users.get('vendor'), self.users.get('customer')
+        headers = {
+            'Authorization': f'Token {vendor_token}'
+        }
+
+        # Perform valid POST with vendor token (with permission)
+        csv_file = SimpleUploadedFile('products.csv', (
+            'id,name,description,price,category\n'
+            ',Dell XPS 13,Ultrabook,4999.99,Laptops\n'
+            ',Canon PIXMA,Inkjet printer,399,Scanners and printers\n'
+            '13,HP Pavilion x360,Updated description,3100,Laptops\n'
+            ',No price,Missing price,,Laptops\n'
+        ).encode())
+        response = self.client.post(url, {'file': csv_file}, headers=headers)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        report = response.json()
+        self.assertEqual((report['created'], report['updated'], report['failed']), (2, 1, 1))
+        self.assertEqual(report['errors'], [{'row': 4, 'errors': {'price': ['This field is required.']}}])
+        self.assertEqual(Product.objects.get(name='Canon PIXMA').category.name, 'Scanners and printers')
+        self.assertEqual(Product.objects.get(id=13).description, 'Updated description')
+
+        jsonl_file = SimpleUploadedFile('products.jsonl', (
+            '{"name": "Epson L3250", "description": "Ink tank", "price": "799.00", "category": "Printers"}\n'
+            'not json\n'
+            '{"id": 9999, "name": "Missing", "description": "-", "price": "1", "category": "Printers"}\n'
+        ).encode())
+        response = self.client.post(url, {'file': jsonl_file}, headers=headers)
+        report = response.json()
+        self.assertEqual((report['created'], report['updated'], report['failed']), (1, 0, 2))
+        self.assertEqual([error['row'] for error in report['errors']], [2, 3])
+
+        # Files which cannot be read further are reported at the first unreadable row
+        for name, content, row in (
+            ('latin1.csv', 'name,description,price,category\nZebra,Label printer,99,Printers\nCaf\xe9,-,1,Printers\n'.encode('latin-1'), 2),
+            ('binary.csv', b'name,description,price,category\n\x00\xff\x00', 1),
+            ('large.csv', b'name,description,price,category\nLarge,"' + b'x' * (csv.field_size_limit() + 1) + b'",1,Printers\n', 1),
+            ('latin1.jsonl', '{"name": "Caf\xe9"}\n'.encode('latin-1'), 1),
+        ):
+            with self.subTest(name=name):
+                response = self.client.post(url, {'file': SimpleUploadedFile(name, content)}, headers=headers)
+                self.assertEqual(response.status_code, status.HTTP_200_OK)
+                report = response.json()
+                self.assertEqual(report['failed'], 1)
+                self.assertEqual(report['errors'][0]['row'], row)
+                self.assertIn('Following rows were not read', report['errors'][0]['errors']['non_field_errors'][0])
+        self.assertTrue(Product.objects.filter(name='Zebra').exists())
+
+        # Perform invalid POST with customer token (without permission)
+        headers['Authorization'] = f'Token {customer_token}'
+        response = self.client.post(url, {'file': SimpleUploadedFile('products.csv', b'')}, headers=headers)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+    def test_export_products(self):
+        '''
+        Stream the catalog as CSV or JSON Lines
+        - Access: all users, even not logged in
+        '''
+        url = reverse('product-export')
+
+        response = self.client.get(url, {'category': 6})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0], 'id,name,description,price,category')
+        self.assertEqual(len(lines), 3)
+
+        response = self.client.get(url, {'type': 'jsonl', 'ordering': 'price'})
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual(len(rows), 11)
+        self.assertEqual(rows[0]['name'], 'Samsung Galaxy Book Flex')
+        self.assertEqual(rows[0]['price'], '1159.00')
+
+
     def test_delete_product(self):
         '''
         Delete a Product(name, description, price, category, image)
@@ -163,6 +592,10 @@ class OrderTestCase(APITestCase):
         '''
         Load credentials for Users and get authentication tokens to check permissions
         '''
+        # Start without cached statistics
+        cache.clear()
+        self.addCleanup(cache.clear)
+
         # Load credentials for users
         with open('credentials.json', 'r') as file:
             credentials = json.loads(file.read())["Credentials"]
@@ -214,6 +647,133 @@ class OrderTestCase(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
 
     
+    def test_order_confirmation_email(self):
+        '''
+        Confirmation email is sent inline or queued in the outbox and sent by the worker
+        - Access: customer
+        '''
+        url = reverse('order-product')
+        headers = {
+            'Authorization': f'Token {self.users.get("customer")}',
+        }
+        data = {
+            'customer_name': 'Jan Kowalski',
+            'delivery_address': '1234 Elm Street',
+            'products': [
+                {"product": 18, "quantity": 1}
+            ]
+        }
+
+        # Inline mode sends during the request
+        with self.settings(ORDER_EMAIL_MODE='inline'):
+            response = self.client.post(url, data, headers=headers, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].from_email, 'admin@domain.com')
+        self.assertEqual(mail.outbox[0].to, ['customer01@domain.com'])
+
+        # Queued mode only stores the email
+        with self.settings(ORDER_EMAIL_MODE='queued'):
+            response = self.client.post(url, data, headers=headers, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(mail.outbox), 1)
+        email = OutgoingEmail.objects.get()
+        self.assertEqual(email.status, OutgoingEmail.STATUS_PENDING)
+
+        # Worker sends the outbox
+        call_command('send_queued_emails', stdout=StringIO())
+        self.assertEqual(len(mail.outbox), 2)
+        self.assertEqual(mail.outbox[1].subject, 'Order Confirmation')
+        email.refresh_from_db()
+        self.assertEqual((email.status, email.attempts), (OutgoingEmail.STATUS_SENT, 1))
+
+        # Unreachable server - the batch backs off and the worker keeps running
+        with self.settings(ORDER_EMAIL_MODE='queued'):
+            response = self.client.post(url, data, headers=headers, format='json')
+        with mock.patch('base.mail.get_connection', side_effect=ConnectionRefusedError('refused')):
+            self.assertEqual(send_queued_emails(), (0, 1))
+        email = OutgoingEmail.objects.latest('id')
+        self.assertEqual((email.status, email.attempts), (OutgoingEmail.STATUS_PENDING, 1))
+        self.assertEqual(email.last_error, 'ConnectionRefusedError: refused')
+        self.assertGreater(email.next_attempt_at, timezone.now())
+
+
+    def test_create_order_batch(self):
+        '''
+        Create many Orders in one request -> total price, payment date or errors for every order
+        - Access: customer
+        '''
+        url = reverse('order-batch')
+        vendor_token, customer_token = self.users.get('vendor'), self.users.get('customer')
+
+        # Perform valid POST with customer token (with permission)
+        headers = {
+            'Authorization': f'Token {customer_token}',
+        }
+        order = {
+            'customer_name': 'Jan Kowalski',
+            'delivery_address': '1234 Elm Street',
+            'products': [
+                {"product": 18, "quantity": 1}, 
+                {"product": 11, "quantity": 2}
+            ]
+        }
+        invalid_order = {**order, 'products': [{"product": 9999, "quantity": 1}]}
+        orders = Order.objects.count()
+        response = self.client.post(url, [order, invalid_order, order], headers=headers, format='json')
+        self.assertEqual(response.status_code, status.HTTP_207_MULTI_STATUS)
+        results = response.json()['results']
+        self.assertEqual([result['index'] for result in results], [0, 1, 2])
+        self.assertEqual(results[0]['total price'], 8232.0)
+        self.assertEqual(results[1]['errors'], {'products': [{'product': ['Invalid pk "9999" - object does not exist.']}]})
+        self.assertEqual(Order.objects.count(), orders + 2)
+        self.assertEqual(len(mail.outbox), 2)
+
+        # Orders are committed before the confirmations are sent, an SMTP error is only logged
+        orders = Order.objects.count()
+        with self.settings(EMAIL_BACKEND='tests.test_api.FailingEmailBackend'), self.assertLogs('base.mail', 'ERROR'):
+            response = self.client.post(url, [order, order], headers=headers, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Order.objects.count(), orders + 2)
+
+        # Batch larger than the configured limit is rejected
+        with self.settings(ORDER_BATCH_MAX_SIZE=2):
+            response = self.client.post(url, [order, order, order], headers=headers, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        # Perform invalid POST with vendor token (without permission)
+        headers['Authorization'] = f'Token {vendor_token}'
+        response = self.client.post(url, [order], headers=headers, format='json')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+    def test_create_order_invalid_product(self):
+        '''
+        Order referencing a non-existing product is rejected and nothing is saved
+        - Access: customer
+        '''
+        url = reverse('order-product')
+        headers = {
+            'Authorization': f'Token {self.users.get("customer")}',
+        }
+        data = {
+            'customer_name': 'Jan Kowalski',
+            'delivery_address': '1234 Elm Street',
+            'products': [
+                {"product": 18, "quantity": 1}, 
+                {"product": 9999, "quantity": 2}
+            ]
+        }
+        orders = Order.objects.count()
+        response = self.client.post(url, data, headers=headers, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(
+            response.json(), 
+            {'products': [{}, {'product': ['Invalid pk "9999" - object does not exist.']}]}
+        )
+        self.assertEqual(Order.objects.count(), orders)
+
+    
     def test_order_statistics(self):
         '''
         Statistics of the most frequently ordered products
@@ -247,4 +807,356 @@ class OrderTestCase(APITestCase):
         # Perform invalid POST with customer token (without permission)
         headers['Authorization'] = f'Token {customer_token}'
         response = self.client.post(url, data, headers=headers, format='json')
-        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
\ No newline at end of file
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_order_statistics_get(self):
+        '''
+        Statistics as a GET with query parameters, memoized in the cache
+        - Access: vendor
+        '''
+        url = reverse('statistics-most-ordered')
+        vendor_headers = {
+            'Authorization': f'Token {self.users.get("vendor")}',
+        }
+        params = {
+            'start_date': '2024-01-11 00:00:00',
+            'end_date': '2024-01-12 00:00:00',
+            'num_products': 1,
+        }
+        response = self.client.get(url, params, headers=vendor_headers)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        expected = {'Most frequently ordered products': [{'id': 15, 'name': 'Samsung Galaxy Book Flex', 'count': 3}]}
+        self.assertEqual(response.json(), expected)
+        self.assertIn('max-age=3600', response['Cache-Control'])
+
+        # Past periods are served from the cache
+        with self.assertNumQueries(0):
+            response = self.client.get(url, params, headers=vendor_headers)
+        self.assertEqual(response.json(), expected)
+
+        # Periods including the present are cached until a new order is placed
+        params['end_date'] = (timezone.now() + timedelta(days=1)).strftime('%Y-%m-%d %H:%M:%S')
+        params['metric'] = 'quantity'
+        response = self.client.get(url, params, headers=vendor_headers)
+        self.assertIn('max-age=30', response['Cache-Control'])
+        with self.assertNumQueries(0):
+            self.client.get(url, params, headers=vendor_headers)
+
+        order = {
+            'customer_name': 'Jan Kowalski',
+            'delivery_address': '1234 Elm Street',
+            'products': [{'product': 18, 'quantity': 10}],
+        }
+        customer_headers = {'Authorization': f'Token {self.users.get("customer")}'}
+        response = self.client.post(reverse('order-product'), order, headers=customer_headers, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        response = self.client.get(url, params, headers=vendor_headers)
+        self.assertEqual(response.json(), {'Most ordered products': [{'id': 18, 'name': 'Epson EcoTank ET-2720', 'quantity': 10}]})
+
+        response = self.client.get(url, {'start_date': 'yesterday'}, headers=vendor_headers)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+    def test_order_statistics_metrics(self):
+        '''
+        Statistics ranked by the selected metric (frequency, quantity, revenue)
+        - Access: vendor
+        '''
+        url = reverse('statistics-most-ordered')
+        headers = {
+            'Authorization': f'Token {self.users.get("vendor")}',
+        }
+        data = {
+            'start_date': '2024-01-11 00:00:00',
+            'end_date': '2024-01-12 00:00:00',
+            'num_products': 1,
+        }
+        expected = {
+            'frequency': ('Most frequently ordered products', {'id': 15, 'name': 'Samsung Galaxy Book Flex', 'count': 3}),
+            'quantity': ('Most ordered products', {'id': 19, 'name': 'Brother DCP-L5600DN', 'quantity': 5}),
+            'revenue': ('Highest revenue products', {'id': 19, 'name': 'Brother DCP-L5600DN', 'revenue': '10945.00'}),
+        }
+        for metric, (title, product) in expected.items():
+            response = self.client.post(url, {**data, 'metric': metric}, headers=headers, format='json')
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+            self.assertEqual(response.json(), {title: [product]})
+
+        # Unknown metric is rejected
+        response = self.client.post(url, {**data, 'metric': 'unknown'}, headers=headers, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+    def test_order_statistics_series(self):
+        '''
+        Count, quantity and revenue per bucket and product or category, closed buckets are cached
+        - Access: vendor
+        '''
+        url = reverse('statistics-series')
+        headers = {
+            'Authorization': f'Token {self.users.get("vendor")}',
+        }
+        params = {
+            'start_date': '2024-01-11 09:30:00',
+            'end_date': '2024-01-11 11:30:00',
+            'bucket': 'hour',
+            'group_by': 'category',
+        }
+        response = self.client.get(url, params, headers=headers)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json(), {
+            'bucket': 'hour',
+            'group by': 'category',
+            'series': [
+                {'start': '2024-01-11T09:00:00Z', 'categories': []},
+                {'start': '2024-01-11T10:00:00Z', 'categories': [
+                    {'id': 4, 'name': 'Computers', 'count': 1, 'quantity': 2, 'revenue': '5528.00'},
+                    {'id': 5, 'name': 'Laptops', 'count': 5, 'quantity': 5, 'revenue': '7313.00'},
+                    {'id': 6, 'name': 'Printers', 'count': 1, 'quantity': 5, 'revenue': '10945.00'},
+                ]},
+                {'start': '2024-01-11T11:00:00Z', 'categories': []},
+            ],
+        })
+
+        # Closed buckets are served from the cache
+        params = {'start_date': '2024-01-10 00:00:00', 'end_date': '2024-01-12 23:59:59.999999'}
+        response = self.client.get(url, params, headers=headers)
+        self.assertEqual(len(response.json()['series']), 3)
+        self.assertEqual(response.json()['series'][1]['products'][0], {
+            'id': 10, 'name': 'Apple Mac Mini', 'count': 1, 'quantity': 2, 'revenue': '5528.00'
+        })
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(url, params, headers=headers).json(), response.json())
+
+        # Orders edited after the fact invalidate them
+        order_line = OrderProducts.objects.get(order_id=29)
+        order_line.quantity = 3
+        order_line.save()
+        response = self.client.get(url, params, headers=headers)
+        self.assertEqual(response.json()['series'][1]['products'][0]['quantity'], 3)
+
+        # Too many buckets
+        response = self.client.get(url, {**params, 'start_date': '2020-01-01 00:00:00', 'bucket': 'hour'}, headers=headers)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.get(url, params, headers={'Authorization': f'Token {self.users.get("customer")}'})
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+    def test_order_statistics_sales_rollup(self):
+        '''
+        Placed orders are added to the daily rollup and counted together with the raw tail
+        - Access: vendor
+        '''
+        # Two orders of the same product on the same day share one rollup row
+        headers = {
+            'Authorization': f'Token {self.users.get("customer")}',
+        }
+        data = {
+            'customer_name': 'Jan Kowalski',
+            'delivery_address': '1234 Elm Street',
+            'products': [
+                {"product": 18, "quantity": 1},
+                {"product": 11, "quantity": 2}
+            ]
+        }
+        for _ in range(2):
+            response = self.client.post(reverse('order-product'), data, headers=headers, format='json')
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        rollup = DailyProductSales.objects.get(date=timezone.localdate(), product_id=11)
+        self.assertEqual((rollup.order_count, rollup.quantity), (2, 4))
+
+        # Range mixing whole days from the rollup (2024-01-11) with today's raw orders
+        headers['Authorization'] = f'Token {self.users.get("vendor")}'
+        data = {
+            'start_date': '2024-01-10 12:00:00',
+            'end_date': (timezone.now() + timedelta(days=1)).strftime('%Y-%m-%d %H:%M:%S'),
+            'num_products': 2,
+            'metric': 'quantity',
+        }
+        response = self.client.post(reverse('statistics-most-ordered'), data, headers=headers, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.json(), {'Most ordered products': [
+            {'id': 19, 'name': 'Brother DCP-L5600DN', 'quantity': 5},
+            {'id': 11, 'name': 'Acer Predator Orion 9000', 'quantity': 4},
+        ]})
+
+
+    def test_order_statistics_rollup_edits(self):
+        '''
+        Order lines and orders edited or deleted one by one keep the daily rollup equal to a rebuilt one
+        '''
+        def rollup():
+            return set(DailyProductSales.objects.values_list('date', 'product_id', 'order_count', 'quantity', 'revenue'))
+
+        DailyProductSales.objects.rebuild()
+        order = Order.objects.create(user=Token.objects.get(key=self.users.get('customer')).user, customer_name='Jan Kowalski',
+                                     delivery_address='1234 Elm Street')
+        line = OrderProducts.objects.create(order=order, product_id=11, quantity=2)
+        OrderProducts.objects.create(order=order, product_id=18, quantity=1)
+        line.quantity = 5
+        line.save()
+        line.product_id = 19
+        line.unit_price = None
+        line.save()
+        order.order_date -= timedelta(days=3)
+        order.save()
+        edited = rollup()
+        DailyProductSales.objects.rebuild()
+        self.assertEqual(edited, rollup())
+
+        # Deleted lines and orders are removed, rows without lines are deleted
+        line.delete()
+        order.delete()
+        edited = rollup()
+        DailyProductSales.objects.rebuild()
+        self.assertEqual(edited, rollup())
+        self.assertFalse(DailyProductSales.objects.filter(date=timezone.localdate(order.order_date)).exists())
+
+
+    def test_order_statistics_rollup_batches(self):
+        '''
+        Rollups of many products are incremented in batches
+        '''
+        day = timezone.localdate()
+        products = list(Product.objects.values_list('id', flat=True))
+        DailyProductSales.objects.add_totals({(day, product_id): (1, 1, Decimal('1.00')) for product_id in products})
+        # More rows than ROLLUP_BATCH_SIZE are incremented together
+        totals = {(day + timedelta(days=number), product_id): (1, 2, Decimal('3.00'))
+                  for number in range(1, 61) for product_id in products[:4]}
+        totals.update({(day, product_id): (1, 2, Decimal('3.00')) for product_id in products})
+        DailyProductSales.objects.add_totals(totals)
+        self.assertEqual(
+            set(DailyProductSales.objects.filter(date=day).values_list('order_count', 'quantity', 'revenue')),
+            {(2, 3, Decimal('4.00'))},
+        )
+        self.assertEqual(DailyProductSales.objects.filter(date__gt=day).count(), 60 * 4)
+
+
+    def test_order_line_prices(self):
+        '''
+        Order lines keep the prices of the order time, the order total follows edited lines
+        - Access: customer, vendor
+        '''
+        headers = {
+            'Authorization': f'Token {self.users.get("customer")}',
+        }
+        data = {
+            'customer_name': 'Jan Kowalski',
+            'delivery_address': '1234 Elm Street',
+            'products': [
+                {"product": 18, "quantity": 1},
+                {"product": 11, "quantity": 2}
+            ]
+        }
+        response = self.client.post(reverse('order-product'), data, headers=headers, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        order = Order.objects.latest('id')
+        line = order.orderproducts_set.get(product_id=11)
+        price = Product.objects.get(id=11).price
+        self.assertEqual((line.unit_price, line.line_total), (price, price * 2))
+        self.assertEqual(order.total_price, sum(order.orderproducts_set.values_list('line_total', flat=True)))
+
+        # Later price changes do not alter the order or its revenue
+        Product.objects.filter(id=11).update(price=price * 10)
+        headers['Authorization'] = f'Token {self.users.get("vendor")}'
+        statistics = {
+            'start_date': (timezone.now() - timedelta(hours=1)).strftime('%Y-%m-%d %H:%M:%S'),
+            'end_date': (timezone.now() + timedelta(hours=1)).strftime('%Y-%m-%d %H:%M:%S'),
+            'num_products': 2,
+            'metric': 'revenue',
+        }
+        response = self.client.post(reverse('statistics-most-ordered'), statistics, headers=headers, format='json')
+        self.assertIn(
+            {'id': 11, 'name': 'Acer Predator Orion 9000', 'revenue': str(price * 2)},
+            response.json()['Highest revenue products']
+        )
+
+        # Edited and deleted lines update the total with one aggregate UPDATE,
+        # the daily rollup row with one more (stored line, line, total, rollup rows, rollup and savepoints)
+        line.quantity = 3
+        with self.assertNumQueries(7):
+            line.save()
+        order.refresh_from_db()
+        self.assertEqual(order.total_price, order.orderproducts_set.get(product_id=18).line_total + price * 3)
+        line.delete()
+        order.refresh_from_db()
+        self.assertEqual(order.total_price, order.orderproducts_set.get(product_id=18).line_total)
+
+
+
+class AuthCacheTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        token_cache.clear()
+        self.addCleanup(cache.clear)
+        self.addCleanup(token_cache.clear)
+        self.factory = APIRequestFactory()
+
+
+    def get_request(self, user):
+        request = Request(self.factory.get('/'))
+        request.user = user
+        return request
+
+
+    def test_group_membership_cache(self):
+        '''
+        Group membership is queried once per request and cached across requests until the groups change
+        '''
+        user = User.objects.get(username='vendor01')
+
+        # Cold cache - one query for both permission checks
+        request = self.get_request(user)
+        with self.assertNumQueries(1):
+            self.assertTrue(IsVendor().has_permission(request, None))
+            self.assertFalse(IsCustomer().has_permission(request, None))
+
+        # Warm cache - no queries
+        with self.assertNumQueries(0):
+            self.assertTrue(IsVendor().has_permission(self.get_request(user), None))
+
+        # Changing membership (from both sides of the relation) invalidates the cache
+        user.groups.add(Group.objects.get(name='Customers'))
+        self.assertTrue(IsCustomer().has_permission(self.get_request(user), None))
+
+        Group.objects.get(name='Vendors').user_set.remove(user)
+        self.assertFalse(IsVendor().has_permission(self.get_request(user), None))
+
+        # Memberships changed elsewhere (e.g. by another worker process) expire with GROUPS_CACHE_TIMEOUT
+        with mock.patch('api.signals.clear_group_names'):
+            user.groups.clear()
+        self.assertTrue(IsCustomer().has_permission(self.get_request(user), None))
+        later = time.time() + settings.GROUPS_CACHE_TIMEOUT + 1
+        with mock.patch('django.core.cache.backends.locmem.time.time', return_value=later):
+            self.assertFalse(IsCustomer().has_permission(self.get_request(user), None))
+
+
+    def test_token_authentication_cache(self):
+        '''
+        Token and user are cached after the first request and invalidated on user or token changes
+        '''
+        user = User.objects.get(username='customer01')
+        token, _ = Token.objects.get_or_create(user=user)
+        authentication = CachedTokenAuthentication()
+
+        # Cold cache - one query for Token with User
+        with self.assertNumQueries(1):
+            self.assertEqual(authentication.authenticate_credentials(token.key)[0], user)
+
+        # Warm cache - no queries
+        with self.assertNumQueries(0):
+            self.assertEqual(authentication.authenticate_credentials(token.key)[0], user)
+
+        # Deactivated user is rejected
+        user.is_active = False
+        user.save()
+        with self.assertRaises(AuthenticationFailed):
+            authentication.authenticate_credentials(token.key)
+
+        # Deleted token is rejected
+        user.is_active = True
+        user.save()
+        authentication.authenticate_credentials(token.key)
+        token.delete()
+        with self.assertRaises(AuthenticationFailed):
+            authentication.authenticate_credentials(token.key)
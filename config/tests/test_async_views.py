@@ -0,0 +1,98 @@
+from rest_framework import status
+from rest_framework.test import APITestCase, APIRequestFactory
+from django.core import mail
+from django.core.cache import cache
+from django.urls import reverse
+from api.async_views import AsyncProductViewSet, AsyncOrderCreateView
+from base.models import Order
+import json
+
+
+class AsyncViewsTestCase(APITestCase):
+    '''
+    Async product and order views answer like the synchronous ones
+    '''
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+
+        with open('credentials.json', 'r') as file:
+            credentials = json.loads(file.read())["Credentials"]
+        self.headers = {}
+        for user, cred in credentials.items():
+            response = self.client.post(reverse('api_token_auth'), data=cred)
+            self.headers[user] = f'Token {response.json()["token"]}'
+
+        self.factory = APIRequestFactory()
+        self.product_list = AsyncProductViewSet.as_view({'get': 'list', 'post': 'create'})
+        self.product_detail = AsyncProductViewSet.as_view({'get': 'retrieve', 'delete': 'destroy'})
+        self.order_create = AsyncOrderCreateView.as_view()
+
+
+    async def test_product_list(self):
+        url = reverse('product-list')
+        for params in (
+            {},
+            {'page_size': 3, 'p': 2, 'ordering': 'price'},
+            {'pagination': 'cursor', 'ordering': '-name'},
+            {'category__in': 'Laptops', 'fields': 'id,name'},
+            {'search': 'apple', 'representation': 'compact'},
+        ):
+            with self.subTest(params=params):
+                response = await self.product_list(self.factory.get(url, params))
+                self.assertEqual(response.status_code, status.HTTP_200_OK)
+                await cache.aclear()
+                expected = await self.async_client.get(url, params)
+                await cache.aclear()
+                self.assertEqual(response.content, expected.content)
+
+        response = await self.product_list(self.factory.get(url, {'p': 100}))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+    async def test_product_retrieve(self):
+        url = reverse('product-detail', args=[13])
+        response = await self.product_detail(self.factory.get(url), pk='13')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(json.loads(response.content)['name'], 'HP Pavilion x360')
+
+        # Served from the response cache
+        cached = await self.product_detail(self.factory.get(url, HTTP_IF_NONE_MATCH=response['ETag']), pk='13')
+        self.assertEqual(cached.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        response = await self.product_detail(self.factory.get(reverse('product-detail', args=[1000])), pk='1000')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+        # Other actions are synchronous and keep their permissions
+        request = self.factory.delete(url, HTTP_AUTHORIZATION=self.headers['customer'])
+        response = await self.product_detail(request, pk='13')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+    async def test_create_order(self):
+        url = reverse('order-product')
+        order = {
+            'customer_name': 'Jan Kowalski',
+            'delivery_address': '1234 Elm Street',
+            'products': [
+                {"product": 18, "quantity": 1},
+                {"product": 11, "quantity": 2}
+            ]
+        }
+        request = self.factory.post(url, order, format='json', HTTP_AUTHORIZATION=self.headers['customer'])
+        response = await self.order_create(request)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        response.render()
+        self.assertEqual(json.loads(response.content)['total price'], 8232.0)
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertTrue(await Order.objects.filter(total_price=8232).aexists())
+
+        # Unknown products are rejected without extra lookups
+        order['products'][0]['product'] = 1000
+        request = self.factory.post(url, order, format='json', HTTP_AUTHORIZATION=self.headers['customer'])
+        response = await self.order_create(request)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        request = self.factory.post(url, order, format='json', HTTP_AUTHORIZATION=self.headers['vendor'])
+        response = await self.order_create(request)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
@@ -0,0 +1,83 @@
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db.models import Sum, F
+from django.test import TestCase
+from django.urls import reverse
+from io import StringIO
+from base.models import Product, Order, OrderProducts, DailyProductSales
+import json
+import os
+import tempfile
+
+
+class GenerateDataTestCase(TestCase):
+    '''
+    Synthetic datasets of the generate_data command
+    '''
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+
+
+    def test_generate_data(self):
+        products, orders = Product.objects.count(), Order.objects.count()
+        call_command(
+            'generate_data', '--products', '50', '--orders', '40', '--customers', '5', '--vendors', '2',
+            '--categories', '3', '--batch-size', '15', stdout=StringIO()
+        )
+        self.assertEqual(Product.objects.count(), products + 50)
+        self.assertEqual(Order.objects.count(), orders + 40)
+        self.assertEqual(User.objects.filter(groups__name='Customers', username__startswith='generated-').count(), 5)
+        self.assertEqual(User.objects.filter(groups__name='Vendors', username__startswith='generated-').count(), 2)
+
+        # Totals match the order lines
+        order = Order.objects.order_by('-id').first()
+        lines = OrderProducts.objects.filter(order=order)
+        self.assertTrue(lines.exists())
+        self.assertEqual(order.total_price, lines.aggregate(total=Sum(F('quantity') * F('unit_price')))['total'])
+
+        # Incremented rollup is the same as a rebuilt one
+        incremented = set(DailyProductSales.objects.values_list('date', 'product_id', 'order_count', 'quantity'))
+        DailyProductSales.objects.rebuild()
+        self.assertEqual(
+            incremented, set(DailyProductSales.objects.values_list('date', 'product_id', 'order_count', 'quantity'))
+        )
+
+        # Generated products are found by the search index
+        product = Product.objects.latest('id')
+        response = self.client.get(reverse('product-list'), {'search': product.name, 'page_size': 100})
+        self.assertIn(product.id, [item['id'] for item in response.json()['results']])
+
+
+class BenchmarkApiTestCase(TestCase):
+    '''
+    Every endpoint of api/urls.py is benchmarked, results are written as JSON
+    '''
+    def test_benchmark_api(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        output = os.path.join(directory.name, 'results.json')
+        products = Product.objects.count()
+
+        stderr = StringIO()
+        call_command(
+            'benchmark_api', '--requests', '2', '--warmup', '0', '--output', output, stdout=StringIO(), stderr=stderr
+        )
+        self.assertEqual(stderr.getvalue(), '')
+        # Writes are rolled back
+        self.assertEqual(Product.objects.count(), products)
+
+        with open(output) as file:
+            results = json.load(file)
+        self.assertEqual(len(results['databases']), 1)
+        self.assertEqual(results['databases'][0]['sizes']['products'], products)
+        for endpoint in results['databases'][0]['endpoints']:
+            with self.subTest(endpoint=endpoint['name']):
+                self.assertTrue(all(int(status) < 400 for status in endpoint['statuses']), endpoint['statuses'])
+                self.assertEqual(set(endpoint['latency ms']), {'p50', 'p90', 'p95', 'p99', 'mean', 'max'})
+                self.assertGreaterEqual(endpoint['queries'], 0)
+
+        # Comparing with the same results passes
+        call_command('benchmark_api', '--requests', '2', '--only', 'product detail', '--compare', output,
+                     '--tolerance', '1000', stdout=StringIO())
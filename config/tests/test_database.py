@@ -0,0 +1,40 @@
+from django.db import connection, connections, DEFAULT_DB_ALIAS
+from django.test import TestCase, override_settings
+from base.models import Product, Order, OutgoingEmail
+from base.routers import ReadReplicaRouter
+from rest_framework.authtoken.models import Token
+from unittest import mock
+
+
+class DatabaseProfileTestCase(TestCase):
+    '''
+    Production database profile: pragmas of new connections and the read replica router
+    '''
+    @override_settings(SQLITE_PRAGMAS={'busy_timeout': 1234, 'cache_size': -2048, 'temp_store': 'MEMORY'})
+    def test_sqlite_pragmas(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('SQLite pragmas')
+        new_connection = connections.create_connection(DEFAULT_DB_ALIAS)
+        self.addCleanup(new_connection.close)
+        with new_connection.cursor() as cursor:
+            self.assertEqual(cursor.execute('PRAGMA busy_timeout').fetchone(), (1234,))
+            self.assertEqual(cursor.execute('PRAGMA cache_size').fetchone(), (-2048,))
+            # MEMORY
+            self.assertEqual(cursor.execute('PRAGMA temp_store').fetchone(), (2,))
+
+
+    def test_read_replica_router(self):
+        router = ReadReplicaRouter()
+        # Test cases run inside a transaction
+        with mock.patch.object(connections[DEFAULT_DB_ALIAS], 'in_atomic_block', False):
+            self.assertEqual(router.db_for_read(Product), 'replica')
+            self.assertEqual(router.db_for_read(Order), 'replica')
+            self.assertIsNone(router.db_for_read(Token))
+            self.assertIsNone(router.db_for_read(OutgoingEmail))
+
+        # Reads inside a transaction see its own writes
+        self.assertEqual(router.db_for_read(Product), DEFAULT_DB_ALIAS)
+
+        self.assertEqual(router.db_for_write(Product), DEFAULT_DB_ALIAS)
+        self.assertTrue(router.allow_migrate(DEFAULT_DB_ALIAS, 'base'))
+        self.assertFalse(router.allow_migrate('replica', 'base'))
@@ -0,0 +1,103 @@
+from rest_framework import status
+from rest_framework.test import APITestCase
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from api import metrics
+from api.middleware import PerformanceMiddleware
+import re
+
+
+SERVER_TIMING = re.compile(
+    r'^db;dur=[\d.]+;desc="(\d+) queries", serialize;dur=([\d.]+), render;dur=[\d.]+, app;dur=[\d.]+, total;dur=[\d.]+$'
+)
+
+
+class PerformanceMetricsTestCase(APITestCase):
+    '''
+    Per-request instrumentation of api.middleware.PerformanceMiddleware and the metrics endpoint
+    '''
+    def setUp(self):
+        cache.clear()
+        metrics.clear()
+        self.addCleanup(cache.clear)
+        self.addCleanup(metrics.clear)
+
+
+    def sample(self, name, **labels):
+        # Value of one sample line of the exposition
+        selector = ','.join(f'{key}="{value}"' for key, value in labels.items())
+        match = re.search(rf'^{re.escape(name)}\{{{re.escape(selector)}\}} (\S+)$', metrics.expose(), re.MULTILINE)
+        return match and float(match.group(1))
+
+
+    def test_server_timing(self):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(reverse('product-list'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        match = SERVER_TIMING.match(response['Server-Timing'])
+        self.assertIsNotNone(match, response['Server-Timing'])
+        self.assertEqual(int(match.group(1)), len(context.captured_queries))
+
+        # Served from the response cache without a query
+        response = self.client.get(reverse('product-list'))
+        self.assertEqual(SERVER_TIMING.match(response['Server-Timing']).group(1), '0')
+
+
+    def test_histograms(self):
+        url = reverse('product-list')
+        for _ in range(3):
+            response = self.client.get(url)
+        self.client.get('/api/missing/')
+
+        labels = {'view': 'product-list', 'method': 'GET', 'status': '200'}
+        self.assertEqual(self.sample('http_request_duration_seconds_count', **labels), 3)
+        self.assertEqual(self.sample('http_response_size_bytes_sum', **labels), 3 * len(response.content))
+        self.assertEqual(self.sample('http_request_db_queries_bucket', **labels, le='0'), 2)
+        self.assertEqual(self.sample('http_request_db_queries_bucket', **labels, le='+Inf'), 3)
+        # Observed for every response, cached ones record ~0 (only the first one serializes rows)
+        self.assertEqual(self.sample('http_request_serialization_duration_seconds_count', **labels), 3)
+        self.assertGreater(self.sample('http_request_serialization_duration_seconds_sum', **labels), 0)
+        self.assertEqual(
+            self.sample('http_request_duration_seconds_count', view='unmatched', method='GET', status='404'), 1
+        )
+
+
+    async def test_async_requests(self):
+        # Queries run in sync_to_async threads are counted for the request too
+        response = await self.async_client.get(reverse('product-detail', args=[13]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(SERVER_TIMING.match(response['Server-Timing']).group(1), '0')
+
+
+    @override_settings(SLOW_REQUEST_THRESHOLD=0)
+    def test_slow_request_log(self):
+        # Settings are read when the middleware chain is built
+        self.assertEqual(PerformanceMiddleware(lambda request: None).slow_threshold, 0)
+        self.client.handler.load_middleware()
+        self.addCleanup(self.client.handler.load_middleware)
+
+        with self.assertLogs('api.performance', 'WARNING') as logs:
+            self.client.get(reverse('product-detail', args=[13]))
+        self.assertIn('product-detail', logs.output[0])
+        self.assertIn('FROM "base_product"', logs.output[0])
+
+
+    def test_metrics_endpoint(self):
+        url = reverse('metrics')
+        self.client.get(reverse('product-list'))
+
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+        admin = User.objects.create_user('metrics-admin', is_staff=True)
+        self.client.force_authenticate(admin)
+        response = self.client.get(url, HTTP_ACCEPT='text/plain;version=0.0.4;q=0.5,*/*;q=0.1')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        self.assertIn('# TYPE http_request_duration_seconds histogram', response.content.decode())
+        self.assertIn('view="product-list",method="GET",status="200"', response.content.decode())
@@ -0,0 +1,70 @@
+from rest_framework.test import APITestCase
+from django.core.cache import cache
+from django.urls import reverse
+from rest_framework import status
+
+
+class ProductQueryCountTestCase(APITestCase):
+    '''
+    Number of queries of the product read path must not depend on the number of returned products
+    '''
+    def setUp(self):
+        self.addCleanup(cache.clear)
+
+
+    def get(self, url, params, queries):
+        # Responses are cached, every request has to hit the database
+        cache.clear()
+        with self.assertNumQueries(queries):
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response
+
+
+    def test_list_product(self):
+        '''
+        COUNT + SELECT with joined category for any page size
+        '''
+        url = reverse('product-list')
+        for page_size in (1, 5, 11, 100):
+            response = self.get(url, {'page_size': page_size}, 2)
+            self.assertEqual(len(response.json()['results']), min(page_size, 11))
+
+
+    def test_retrieve_product(self):
+        '''
+        Single SELECT with joined category
+        '''
+        self.get(reverse('product-detail', args=[13]), {}, 1)
+
+
+    def test_filter_product(self):
+        '''
+        Filters do not add per-row queries (category filter validates the category once)
+        '''
+        url = reverse('product-list')
+        self.get(url, {'price': '1859.00', 'page_size': 50}, 2)
+        self.get(url, {'name': 'Apple iMac', 'page_size': 50}, 2)
+        response = self.get(url, {'category': 5, 'page_size': 50}, 3)
+        self.assertEqual(response.json()['count'], 5)
+
+
+    def test_ordering_product(self):
+        '''
+        Every ordering field with and without filters and pagination
+        '''
+        url = reverse('product-list')
+        for ordering in ('name', '-name', 'price', '-price', 'category', '-category'):
+            for page_size in (1, 50):
+                self.get(url, {'ordering': ordering, 'page_size': page_size}, 2)
+                self.get(url, {'ordering': ordering, 'page_size': page_size, 'category': 4, 'p': 1}, 3)
+
+
+
+    def test_list_product_cursor_pagination(self):
+        '''
+        Cursor pages skip the COUNT query - single SELECT on every page
+        '''
+        url = reverse('product-list')
+        response = self.get(url, {'pagination': 'cursor', 'ordering': 'name', 'page_size': 2}, 1)
+        self.get(response.json()['next'], {}, 1)
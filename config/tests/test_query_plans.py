@@ -0,0 +1,170 @@
+from rest_framework.test import APITestCase
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from datetime import timedelta
+from unittest import skipUnless
+from api.authentication import token_cache
+from base.search import search_available
+import json
+import re
+
+
+# Plan line of a table or an index read from the first to the last entry - the scanned name is the index,
+# or the table for scans in primary key order (full-text index lookups are VIRTUAL TABLE INDEX)
+FULL_SCAN = re.compile(r'^SCAN (?!.*\bVIRTUAL TABLE INDEX\b)(?P<table>\w+)(?: USING (?:COVERING )?INDEX (?P<index>\w+))?')
+# Statements without a query plan worth checking
+SKIPPED = re.compile(r'^\s*(INSERT|SAVEPOINT|RELEASE|ROLLBACK|BEGIN|COMMIT)\b', re.IGNORECASE)
+
+
+@skipUnless(connection.vendor == 'sqlite', 'EXPLAIN QUERY PLAN output is SQLite specific')
+class QueryPlanTestCase(APITestCase):
+    '''
+    Every query of every endpoint has to be answered from an index.
+    Plans are captured with SQLite EXPLAIN QUERY PLAN, a full table or index scan fails the test
+    unless the request allows it explicitly.
+    '''
+    def setUp(self):
+        # Cold caches, so authentication and permission queries are checked too
+        cache.clear()
+        token_cache.clear()
+        self.addCleanup(cache.clear)
+        self.addCleanup(token_cache.clear)
+
+        with open('credentials.json', 'r') as file:
+            credentials = json.loads(file.read())["Credentials"]
+        self.headers = {}
+        for user, cred in credentials.items():
+            response = self.client.post(reverse('api_token_auth'), data=cred)
+            self.headers[user] = {'Authorization': f'Token {response.json()["token"]}'}
+        cache.clear()
+        token_cache.clear()
+        # Presence of the search index is looked up once per process, not per request
+        search_available()
+
+
+    def query_plan(self, sql, params):
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+            return [row[-1] for row in cursor.fetchall()]
+
+
+    def index_on(self, table, columns):
+        # Name of the index Django created for columns (e.g. of a foreign key)
+        with connection.cursor() as cursor:
+            constraints = connection.introspection.get_constraints(cursor, table)
+        return next(
+            name for name, constraint in constraints.items()
+            if constraint['index'] and not constraint['unique'] and constraint['columns'] == columns
+        )
+
+
+    def assertIndexedQueries(self, request, *args, allowed_scans=(), **kwargs):
+        '''
+        Send the request and check the plans of its queries. allowed_scans - indexes (or tables, in primary
+        key order) the queries of this request may read in whole, e.g. the ordering index of an unfiltered page
+        '''
+        with CaptureQueriesContext(connection) as context:
+            response = request(*args, **kwargs)
+            # Streamed responses query the database while they are consumed
+            if response.streaming:
+                b''.join(response.streaming_content)
+        self.assertLess(response.status_code, 400)
+
+        for query in context.captured_queries:
+            sql = query['sql']
+            if SKIPPED.match(sql):
+                continue
+            # Plans are taken for the SQL Django sent, params are inlined in captured queries
+            plan = self.query_plan(sql, ())
+            scans = [
+                line for line in plan
+                if (match := FULL_SCAN.match(line)) and (match['index'] or match['table']) not in allowed_scans
+            ]
+            if scans:
+                self.fail(f'Full table scan {scans} in query:\n{sql}\nPlan: {plan}')
+        return response
+
+
+    def test_product_endpoints(self):
+        list_url = reverse('product-list')
+        # Count of the unfiltered catalog reads the smallest index, unfiltered pages read
+        # their ordering index (or the table in id order) up to LIMIT
+        count_index = self.index_on('base_product', ['category_id'])
+        for params, allowed_scans in (
+            ({}, {count_index, 'base_product'}),
+            ({'name': 'Apple iMac'}, ()),
+            ({'description': 'Random description'}, ()),
+            ({'price': '1859.00'}, ()),
+            ({'category': 5}, ()),
+            ({'ordering': 'name'}, {count_index, 'product_name_idx'}),
+            ({'ordering': '-price'}, {count_index, 'product_price_idx'}),
+            ({'ordering': 'category'}, {count_index}),
+            ({'category': 5, 'ordering': 'price'}, ()),
+            ({'pagination': 'cursor', 'ordering': 'price'}, {'product_price_idx'}),
+            ({'price__gte': '1500', 'price__lte': '2500'}, ()),
+            ({'category__in': '4,Printers'}, ()),
+            ({'id__in': '9,13,15'}, ()),
+            ({'name__startswith': 'Apple', 'ordering': 'name'}, ()),
+            ({'search': 'apple imac'}, ()),
+            ({'search': 'thinkpad', 'ordering': 'price'}, ()),
+        ):
+            with self.subTest(params=params):
+                self.assertIndexedQueries(self.client.get, list_url, params, allowed_scans=allowed_scans)
+                cache.clear()
+
+        response = self.client.get(list_url, {'pagination': 'cursor', 'ordering': 'name', 'page_size': 2})
+        self.assertIndexedQueries(self.client.get, response.json()['next'])
+
+        self.assertIndexedQueries(self.client.get, reverse('product-detail', args=[13]))
+        self.assertIndexedQueries(self.client.get, reverse('product-export'), {'category': 6})
+
+
+    def test_order_endpoints(self):
+        order = {
+            'customer_name': 'Jan Kowalski',
+            'delivery_address': '1234 Elm Street',
+            'products': [
+                {"product": 18, "quantity": 1}, 
+                {"product": 11, "quantity": 2}
+            ]
+        }
+        headers = self.headers['customer']
+        self.assertIndexedQueries(self.client.post, reverse('order-product'), order, headers=headers, format='json')
+        self.assertIndexedQueries(self.client.post, reverse('order-batch'), [order, order], headers=headers, format='json')
+
+
+    def test_order_statistics(self):
+        url = reverse('statistics-most-ordered')
+        now = timezone.now()
+        for start_date, end_date in (
+            # Raw order lines only
+            ('2024-01-11 10:00:00', '2024-01-11 11:00:00'),
+            # Daily rollup only
+            ('2024-01-01 00:00:00', '2024-02-01 00:00:00'),
+            # Rollup and raw tail
+            ('2024-01-10 12:00:00', (now + timedelta(days=1)).strftime('%Y-%m-%d %H:%M:%S')),
+        ):
+            for metric in ('frequency', 'quantity', 'revenue'):
+                data = {
+                    'start_date': start_date,
+                    'end_date': end_date,
+                    'num_products': 5,
+                    'metric': metric,
+                }
+                with self.subTest(data=data):
+                    self.assertIndexedQueries(self.client.post, url, data, headers=self.headers['vendor'], format='json')
+
+        url = reverse('statistics-series')
+        for bucket in ('hour', 'day', 'week', 'month'):
+            for group_by in ('product', 'category'):
+                params = {
+                    'start_date': '2024-01-01 00:00:00',
+                    'end_date': '2024-01-20 00:00:00',
+                    'bucket': bucket,
+                    'group_by': group_by,
+                }
+                with self.subTest(params=params):
+                    self.assertIndexedQueries(self.client.get, url, params, headers=self.headers['vendor'])